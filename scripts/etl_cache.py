@@ -0,0 +1,156 @@
+# etl_cache.py
+"""
+Cache em disco das respostas brutas dos provedores de mercado.
+
+Cada resposta é gravada em Parquet sob uma chave derivada do conteúdo da
+requisição (ticker, intervalo e janela), com um .json ao lado guardando os
+metadados. Entradas valem por `ttl_seconds`; quando o diretório passa de
+`max_bytes`, as expiradas saem primeiro e depois as menos usadas (LRU).
+O modo replay do ETL lê daqui sem tocar na rede.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "raw_cache"
+)
+
+
+class RawCache:
+    """Cache de respostas brutas (DataFrames do provedor) em Parquet."""
+
+    def __init__(self, root: str = DEFAULT_CACHE_DIR, ttl_seconds: float = 3600,
+                 max_bytes: int = 512 * 1024 * 1024):
+        self.root = root
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    # -----------------------------
+    # Chaves e caminhos
+    # -----------------------------
+    @staticmethod
+    def key(ticker: str, interval: str, start, end) -> str:
+        """Chave de conteúdo: sha256 da descrição canônica da requisição."""
+        payload = json.dumps(
+            {"ticker": ticker, "interval": interval, "start": str(start), "end": str(end)},
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _paths(self, key: str) -> tuple[str, str]:
+        base = os.path.join(self.root, key[:2], key)
+        return base + ".parquet", base + ".json"
+
+    # -----------------------------
+    # Leitura / escrita
+    # -----------------------------
+    def get(self, ticker: str, interval: str, start, end) -> pd.DataFrame | None:
+        """Resposta em cache para exatamente essa janela, se ainda dentro do TTL."""
+        data_path, meta_path = self._paths(self.key(ticker, interval, start, end))
+        meta = self._read_meta(meta_path)
+        if meta is None or not os.path.exists(data_path):
+            return None
+        if time.time() - meta["created_at"] > self.ttl_seconds:
+            return None
+        return self._load(data_path)
+
+    def latest(self, ticker: str, interval: str) -> pd.DataFrame | None:
+        """Entrada mais recente do ticker/intervalo, ignorando TTL (usado no replay)."""
+        best = None
+        for meta in self.entries():
+            if meta["ticker"] == ticker and meta["interval"] == interval:
+                if best is None or meta["created_at"] > best["created_at"]:
+                    best = meta
+        if best is None:
+            return None
+        data_path, _ = self._paths(best["key"])
+        return self._load(data_path) if os.path.exists(data_path) else None
+
+    def put(self, ticker: str, interval: str, start, end, raw: pd.DataFrame) -> str:
+        """Grava a resposta bruta (escrita atômica) e aplica a política de tamanho."""
+        key = self.key(ticker, interval, start, end)
+        data_path, meta_path = self._paths(key)
+        os.makedirs(os.path.dirname(data_path), exist_ok=True)
+
+        tmp = f"{data_path}.{threading.get_ident()}.tmp"
+        raw.to_parquet(tmp)
+        os.replace(tmp, data_path)
+
+        meta = {
+            "key": key, "ticker": ticker, "interval": interval,
+            "start": str(start), "end": str(end),
+            "rows": int(len(raw)), "created_at": time.time(),
+        }
+        tmp = f"{meta_path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(meta, fh)
+        os.replace(tmp, meta_path)
+
+        self.evict()
+        return key
+
+    def _load(self, data_path: str) -> pd.DataFrame:
+        df = pd.read_parquet(data_path)
+        # mtime do Parquet marca o último acesso (base do LRU)
+        os.utime(data_path, None)
+        return df
+
+    @staticmethod
+    def _read_meta(meta_path: str) -> dict | None:
+        try:
+            with open(meta_path, encoding="utf-8") as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    # -----------------------------
+    # Inventário e evicção
+    # -----------------------------
+    def entries(self) -> list[dict]:
+        """Metadados de todas as entradas (com tamanho e último acesso)."""
+        out = []
+        for dirpath, _, files in os.walk(self.root):
+            for fname in files:
+                if not fname.endswith(".json"):
+                    continue
+                meta = self._read_meta(os.path.join(dirpath, fname))
+                if meta is None:
+                    continue
+                data_path, _ = self._paths(meta["key"])
+                try:
+                    st = os.stat(data_path)
+                except OSError:
+                    continue
+                meta["bytes"] = st.st_size
+                meta["last_access"] = st.st_mtime
+                out.append(meta)
+        return out
+
+    def evict(self) -> int:
+        """Remove entradas até caber em max_bytes: expiradas primeiro, depois LRU."""
+        with self._lock:
+            entries = self.entries()
+            total = sum(e["bytes"] for e in entries)
+            if total <= self.max_bytes:
+                return 0
+            now = time.time()
+            entries.sort(key=lambda e: (now - e["created_at"] <= self.ttl_seconds, e["last_access"]))
+            removed = 0
+            for e in entries:
+                if total <= self.max_bytes:
+                    break
+                for path in self._paths(e["key"]):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                total -= e["bytes"]
+                removed += 1
+            return removed
@@ -1,12 +1,21 @@
 # etl_coins_ohlc.py
+import io
 import os
-from datetime import timedelta
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
 import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 import pandas as pd
-import yfinance as yf
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, MetaData, Table, Column, Integer, Float, DateTime, text
-from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy import create_engine, inspect, MetaData, Table, Column, Integer, Float, DateTime, String, func, text
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from etl_cache import RawCache, DEFAULT_CACHE_DIR
+from etl_providers import MarketDataProvider, YahooProvider, LocalFileProvider, INTERVAL_STEPS
 
 # -----------------------------
 # Config
@@ -28,8 +37,94 @@ COINS = {
     "SOL": (4, "SOL-USD", "2020-01-01"),
 }
 
-# Limite do Yahoo para intraday
-MAX_LOOKBACK_DAYS_1H = 729
+# Paralelismo do modo em lote (pool de download por ticker e de upserts)
+DEFAULT_WORKERS = int(os.getenv("ETL_WORKERS", "4"))
+
+# Linhas por lote enviado via COPY para a tabela de staging
+COPY_CHUNK_ROWS = int(os.getenv("ETL_COPY_CHUNK_ROWS", "50000"))
+
+# Cache bruto das respostas do Yahoo (Parquet em disco) e modo replay (só cache, sem rede)
+CACHE_ENABLED = os.getenv("ETL_CACHE", "1") not in ("0", "false", "False")
+CACHE_DIR = os.getenv("ETL_CACHE_DIR", DEFAULT_CACHE_DIR)
+CACHE_TTL_SECONDS = float(os.getenv("ETL_CACHE_TTL", "3600"))
+CACHE_MAX_MB = float(os.getenv("ETL_CACHE_MAX_MB", "512"))
+
+# Provedor de dados: "yahoo" (yfinance) ou "local" (dumps CSV/Parquet em ETL_DATA_DIR)
+DEFAULT_PROVIDER = os.getenv("ETL_PROVIDER", "yahoo").lower()
+DATA_DIR = os.getenv(
+    "ETL_DATA_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "ohlc"),
+)
+
+PROVIDER: MarketDataProvider | None = None
+
+# Backfill histórico: tamanho fixo das janelas por intervalo
+BACKFILL_WINDOW = {
+    "1h": pd.Timedelta(days=int(os.getenv("ETL_BACKFILL_DAYS_1H", "30"))),
+    "1d": pd.Timedelta(days=int(os.getenv("ETL_BACKFILL_DAYS_1D", "365"))),
+}
+
+# Rollups OHLC mantidos pelo ETL: resolução -> (tabela, tamanho do bucket em segundos)
+ROLLUPS = {
+    "4h": ("precos_4h", 4 * 3600),
+    "1d": ("precos_1d", 24 * 3600),
+}
+
+# Retenção: velas horárias mais antigas que N dias (alinhado ao início do mês) viram
+# velas diárias em 'precos_historico'; as partições antigas são desanexadas e, com
+# ETL_RETENTION_DROP=1 (padrão), removidas. Leitores usam a view 'precos_todos'.
+RETENTION_DAYS = int(os.getenv("ETL_RETENTION_DAYS", "400"))
+RETENTION_DROP = os.getenv("ETL_RETENTION_DROP", "1") not in ("0", "false", "False")
+
+# 'precos' é particionada por mês (RANGE em timestamp); as partições nascem na ingestão
+PARTITION_LOCK_KEY = 720_001  # pg_advisory_xact_lock: serializa a criação entre processos
+_known_partitions: set[str] = set()
+_partitions_lock = threading.Lock()
+
+# Índices gerenciados pelo ensure_schema: nome -> (tabela, DDL). Os das tabelas do app
+# (previsoes, alertas_log) só são criados quando a tabela já existe.
+MANAGED_INDEXES = {
+    "pk_precos_moeda_ts": ("precos", "CREATE UNIQUE INDEX pk_precos_moeda_ts ON precos (moeda_id, timestamp)"),
+    # Cobre as leituras de série (timestamp, close) e de volume com index-only scan
+    "ix_precos_cobertura": ("precos", "CREATE INDEX ix_precos_cobertura ON precos (moeda_id, timestamp DESC) INCLUDE (close, volume)"),
+    # Varreduras por faixa de tempo de todas as moedas (partições grandes, inserção em ordem)
+    "brin_precos_ts": ("precos", "CREATE INDEX brin_precos_ts ON precos USING brin (timestamp) WITH (pages_per_range = 32)"),
+    "ix_previsoes_ultima": ("previsoes", "CREATE INDEX ix_previsoes_ultima ON previsoes (moeda_id, horizonte_h, trained_at DESC, ts_previsto DESC)"),
+    "ix_previsoes_moeda_ts": ("previsoes", "CREATE INDEX ix_previsoes_moeda_ts ON previsoes (moeda_id, ts_previsto DESC)"),
+    "ix_alertas_log_disparo": ("alertas_log", "CREATE INDEX ix_alertas_log_disparo ON alertas_log (disparado_em DESC)"),
+    "ix_alertas_log_alerta": ("alertas_log", "CREATE INDEX ix_alertas_log_alerta ON alertas_log (alerta_id, disparado_em DESC)"),
+}
+# Substituídos por um índice gerenciado; removidos depois que o substituto existe
+RETIRED_INDEXES = {"ix_precos_lookup": "ix_precos_cobertura"}
+
+# Consultas quentes conferidas por --verify-indexes: (nome, SQL, índices aceitos, tipo de nó exigido).
+# Sem tipo exigido vale Index Scan ou Index Only Scan; bitmap só onde é o único acesso (BRIN).
+INDEX_SCANS = {"Index Scan", "Index Only Scan"}
+HOT_QUERIES = [
+    ("serie_preco",
+     "SELECT timestamp, close FROM precos WHERE moeda_id = 1 AND timestamp >= now() - interval '30 days' ORDER BY timestamp",
+     {"ix_precos_cobertura"}, "Index Only Scan"),
+    ("ultimo_preco",
+     "SELECT close FROM precos WHERE moeda_id = 1 ORDER BY timestamp DESC LIMIT 1",
+     {"ix_precos_cobertura", "pk_precos_moeda_ts"}, None),
+    ("faixa_todas_moedas",
+     "SELECT moeda_id, MAX(high), MIN(low) FROM precos WHERE timestamp >= now() - interval '7 days' GROUP BY moeda_id",
+     {"brin_precos_ts"}, "Bitmap Index Scan"),
+    ("ultima_previsao",
+     "SELECT valor FROM previsoes WHERE moeda_id = 1 AND horizonte_h = 24 ORDER BY trained_at DESC, ts_previsto DESC LIMIT 1",
+     {"ix_previsoes_ultima"}, None),
+    ("previsoes_moeda",
+     "SELECT ts_previsto, valor FROM previsoes WHERE moeda_id = 1 ORDER BY ts_previsto DESC LIMIT 20",
+     {"ix_previsoes_moeda_ts"}, None),
+    ("historico_alertas",
+     "SELECT disparado_em, origem, valor_atual FROM alertas_log ORDER BY disparado_em DESC LIMIT 100",
+     {"ix_alertas_log_disparo"}, None),
+]
+
+# Daemon: folga após a virada da vela e backoff exponencial das moedas com falha
+DAEMON_GRACE_SECONDS = float(os.getenv("ETL_DAEMON_GRACE", "90"))
+BACKOFF_BASE_SECONDS = float(os.getenv("ETL_BACKOFF_BASE", "60"))
+BACKOFF_MAX_SECONDS = float(os.getenv("ETL_BACKOFF_MAX", "3600"))
 
 # -----------------------------
 # Engine + schema
@@ -50,19 +145,255 @@ def ensure_schema():
         Column("close", Float, nullable=False),
         Column("volume", Float),
         # algumas bases antigas têm coluna 'preco' NOT NULL; não declarar aqui para não colidir
+        postgresql_partition_by="RANGE (timestamp)",
+    )
+    # Janelas do backfill já persistidas (permite retomar um backfill interrompido)
+    Table(
+        "etl_checkpoints", meta,
+        Column("moeda_id", Integer, primary_key=True),
+        Column("intervalo", String(8), primary_key=True),
+        Column("janela_inicio", DateTime(timezone=True), primary_key=True),
+        Column("janela_fim", DateTime(timezone=True), nullable=False),
+        Column("inicio_coberto", DateTime(timezone=True), nullable=False),
+        Column("linhas", Integer, nullable=False, server_default="0"),
+        Column("provedor", String(32)),
+        Column("concluido_em", DateTime(timezone=True), nullable=False, server_default=func.now()),
     )
+    # Saúde do daemon por moeda (último sucesso, falhas consecutivas, próxima tentativa)
+    Table(
+        "etl_status", meta,
+        Column("moeda_id", Integer, primary_key=True),
+        Column("intervalo", String(8), primary_key=True),
+        Column("ultimo_sucesso", DateTime(timezone=True)),
+        Column("ultima_tentativa", DateTime(timezone=True)),
+        Column("linhas_ultima_execucao", Integer),
+        Column("falhas_consecutivas", Integer, nullable=False, server_default="0"),
+        Column("ultimo_erro", String),
+        Column("proxima_tentativa", DateTime(timezone=True)),
+    )
+    # Velas agregadas (4h/1d) por moeda, atualizadas só nos buckets tocados por cada ingestão
+    for table, _ in ROLLUPS.values():
+        Table(
+            table, meta,
+            Column("moeda_id", Integer, primary_key=True),
+            Column("timestamp", DateTime(timezone=True), primary_key=True),
+            Column("open", Float, nullable=False),
+            Column("high", Float, nullable=False),
+            Column("low", Float, nullable=False),
+            Column("close", Float, nullable=False),
+            Column("volume", Float),
+            Column("velas", Integer, nullable=False),
+        )
+    # Camada fria: velas diárias das horas já removidas de 'precos' pela retenção
+    Table(
+        "precos_historico", meta,
+        Column("moeda_id", Integer, primary_key=True),
+        Column("timestamp", DateTime(timezone=True), primary_key=True),
+        Column("open", Float, nullable=False),
+        Column("high", Float, nullable=False),
+        Column("low", Float, nullable=False),
+        Column("close", Float, nullable=False),
+        Column("volume", Float),
+        Column("velas", Integer, nullable=False),
+    )
+    # Estado atual do mercado por moeda (cards do app e alertas), atualizado a cada ingestão
+    Table(
+        "mercado_snapshot", meta,
+        Column("moeda_id", Integer, primary_key=True),
+        Column("ts_ultima", DateTime(timezone=True), nullable=False),
+        Column("preco_atual", Float, nullable=False),
+        Column("preco_24h", Float),
+        Column("variacao_24h", Float),
+        Column("volume_24h", Float),
+        Column("max_24h", Float),
+        Column("min_24h", Float),
+        Column("volatilidade_24h", Float),
+        Column("atualizado_em", DateTime(timezone=True), nullable=False, server_default=func.now()),
+    )
+    new_rollups = not all(inspect(engine).has_table(t) for t, _ in ROLLUPS.values())
+    new_snapshot = not inspect(engine).has_table("mercado_snapshot")
     meta.create_all(engine, checkfirst=True)
     with engine.begin() as conn:
+        ensure_indexes(conn)
+        _ensure_union_view(conn)
+    _precos_table.cache_clear()
+    _precos_partitioned.cache_clear()
+    _known_partitions.clear()
+    if not _precos_partitioned():
+        print("Aviso: 'precos' não é particionada; rode com --migrate-partitions para migrar.")
+    if new_rollups:
+        rebuild_rollups()
+    if new_snapshot:
+        rebuild_snapshot()
+
+
+def ensure_indexes(conn, tables: set[str] | None = None):
+    """
+    Cria os índices de MANAGED_INDEXES que faltam (só das tabelas existentes) e
+    remove os aposentados cujo substituto já existe. Numa tabela particionada,
+    o índice do pai propaga para cada partição.
+    """
+    for name, (table, ddl) in MANAGED_INDEXES.items():
+        if tables is not None and table not in tables:
+            continue
+        if conn.execute(text("SELECT to_regclass(:t) IS NULL"), {"t": table}).scalar():
+            continue
+        if conn.execute(text("SELECT to_regclass(:i) IS NULL"), {"i": name}).scalar():
+            conn.execute(text(ddl))
+    for old, new in RETIRED_INDEXES.items():
+        if conn.execute(text("SELECT to_regclass(:i) IS NOT NULL"), {"i": new}).scalar():
+            conn.execute(text(f"DROP INDEX IF EXISTS {old}"))
+
+
+def _ensure_union_view(conn):
+    """View 'precos_todos': velas horárias de 'precos' mais as diárias de 'precos_historico'."""
+    conn.execute(text("""
+        CREATE OR REPLACE VIEW precos_todos AS
+        SELECT moeda_id, timestamp, open, high, low, close, volume FROM precos
+        UNION ALL
+        SELECT moeda_id, timestamp, open, high, low, close, volume FROM precos_historico
+    """))
+
+
+def _plan_nodes(plan: dict):
+    """(tipo do nó, índice) de todos os nós de um plano EXPLAIN em JSON."""
+    yield plan.get("Node Type"), plan.get("Index Name")
+    for child in plan.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+def verify_indexes(force_index: bool = False) -> bool:
+    """
+    Roda ANALYZE e EXPLAIN nas consultas de HOT_QUERIES, com as configurações
+    reais do planner, e confere se usam os índices esperados: um plano que
+    derivou para seq scan ou bitmap scan falha. Índices de partições contam
+    como o índice do pai. Com force_index (bases de dev com tabelas pequenas,
+    onde seq scan sempre ganha), seq scan fica desligado na sessão e a
+    checagem só diz se o índice ainda serve à consulta.
+    """
+    ok = True
+    with engine.connect() as conn:
+        if force_index:
+            conn.execute(text("SET LOCAL enable_seqscan = off"))
+        parents = dict(conn.execute(text("""
+            WITH RECURSIVE up AS (
+                SELECT c.oid, c.relname AS nome, c.relname AS raiz
+                FROM pg_class c WHERE c.relkind IN ('i', 'I') AND c.relname = ANY(:nomes)
+                UNION ALL
+                SELECT ch.oid, ch.relname, up.raiz
+                FROM up JOIN pg_inherits i ON i.inhparent = up.oid JOIN pg_class ch ON ch.oid = i.inhrelid
+            )
+            SELECT nome, raiz FROM up
+        """), {"nomes": list(MANAGED_INDEXES)}).all())
+        analyzed = set()
+        for name, sql, expected, node_type in HOT_QUERIES:
+            table = sql.split(" FROM ", 1)[1].split()[0]
+            if conn.execute(text("SELECT to_regclass(:t) IS NULL"), {"t": table}).scalar():
+                print(f"[{name}] pulada: tabela '{table}' não existe.")
+                continue
+            if table not in analyzed:
+                conn.execute(text(f"ANALYZE {table}"))
+                analyzed.add(table)
+            plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()[0]["Plan"]
+            nodes = [(t, parents.get(i, i)) for t, i in _plan_nodes(plan)]
+            accepted = {node_type} if node_type else INDEX_SCANS | ({"Bitmap Index Scan"} if force_index else set())
+            hits = [(t, i) for t, i in nodes if i in expected and t in accepted]
+            used = ", ".join(f"{t} ({i})" if i else t for t, i in nodes if t and "Scan" in t) or "-"
+            if hits:
+                print(f"[{name}] OK: {used}")
+            else:
+                ok = False
+                want = " ou ".join(sorted(expected)) + " via " + " ou ".join(sorted(accepted))
+                print(f"[{name}] FALHOU: esperado {want}; plano usa {used}")
+    if not ok:
+        print("Algumas consultas não usam os índices esperados (rode ensure_schema e confira de novo; "
+              "em base de dev pequena, use --force-index-scan).")
+    return ok
+
+
+# -----------------------------
+# Partições mensais de 'precos'
+# -----------------------------
+@lru_cache(maxsize=1)
+def _precos_partitioned() -> bool:
+    with engine.connect() as conn:
+        q = text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass('precos')")
+        return bool(conn.execute(q).scalar())
+
+
+def _month_starts(start: pd.Timestamp, end: pd.Timestamp) -> list[pd.Timestamp]:
+    """Inícios (UTC) de todos os meses que intersectam [start, end]."""
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    start = start.tz_localize("UTC") if start.tzinfo is None else start.tz_convert("UTC")
+    end = end.tz_localize("UTC") if end.tzinfo is None else end.tz_convert("UTC")
+    first = start.normalize().replace(day=1)
+    return list(pd.date_range(first, end, freq="MS"))
+
+
+def _partition_name(month: pd.Timestamp) -> str:
+    return f"precos_p{month:%Y_%m}"
+
+
+def _create_partitions(conn, months: list[pd.Timestamp]):
+    conn.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": PARTITION_LOCK_KEY})
+    for m in months:
+        nxt = m + pd.offsets.MonthBegin(1)
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {_partition_name(m)} PARTITION OF precos "
+            f"FOR VALUES FROM ('{m.isoformat()}') TO ('{nxt.isoformat()}')"
+        ))
+
+
+def ensure_partitions(start: pd.Timestamp, end: pd.Timestamp):
+    """Garante as partições mensais cobrindo [start, end] (no-op se 'precos' não é particionada)."""
+    if not _precos_partitioned():
+        return
+    months = [m for m in _month_starts(start, end) if _partition_name(m) not in _known_partitions]
+    if not months:
+        return
+    with _partitions_lock:
+        with engine.begin() as conn:
+            _create_partitions(conn, months)
+        _known_partitions.update(_partition_name(m) for m in months)
+
+
+def migrate_precos_to_partitioned():
+    """
+    Migra uma 'precos' comum para a versão particionada, numa única transação:
+    renomeia a antiga para 'precos_legado', cria a particionada com as mesmas
+    colunas, as partições do período existente, copia os dados e recria os índices.
+    'precos_legado' fica no banco para conferência e pode ser removida depois.
+    """
+    if _precos_partitioned():
+        print("'precos' já é particionada.")
+        return
+    with engine.begin() as conn:
+        lo, hi, n = conn.execute(text("SELECT MIN(timestamp), MAX(timestamp), COUNT(*) FROM precos")).one()
+        conn.execute(text("ALTER TABLE precos RENAME TO precos_legado"))
+        precos_indexes = [n for n, (t, _) in MANAGED_INDEXES.items() if t == "precos"] + list(RETIRED_INDEXES)
+        for idx in precos_indexes:
+            conn.execute(text(f"ALTER INDEX IF EXISTS {idx} RENAME TO {idx}_legado"))
+        conn.execute(text(
+            "CREATE TABLE precos (LIKE precos_legado INCLUDING DEFAULTS) PARTITION BY RANGE (timestamp)"
+        ))
+        if lo is not None:
+            _create_partitions(conn, _month_starts(lo, hi))
         conn.execute(text(
-            "DO $$ BEGIN "
-            "IF NOT EXISTS (SELECT 1 FROM pg_indexes WHERE indexname='pk_precos_moeda_ts') THEN "
-            "  CREATE UNIQUE INDEX pk_precos_moeda_ts ON precos(moeda_id, timestamp); "
-            "END IF; "
-            "IF NOT EXISTS (SELECT 1 FROM pg_indexes WHERE indexname='ix_precos_lookup') THEN "
-            "  CREATE INDEX ix_precos_lookup ON precos(moeda_id, timestamp DESC); "
-            "END IF; "
-            "END $$;"
+            "INSERT INTO precos SELECT DISTINCT ON (moeda_id, timestamp) * FROM precos_legado "
+            "WHERE timestamp IS NOT NULL ORDER BY moeda_id, timestamp"
         ))
+        ensure_indexes(conn, {"precos"})
+        _ensure_union_view(conn)
+    _precos_table.cache_clear()
+    _precos_partitioned.cache_clear()
+    _known_partitions.clear()
+    print(f"'precos' migrada para partições mensais ({n} linhas). Antiga preservada em 'precos_legado'.")
+
+
+@lru_cache(maxsize=1)
+def _precos_table() -> Table:
+    """Metadados refletidos de 'precos', refletidos uma única vez por processo."""
+    return Table("precos", MetaData(), autoload_with=engine)
 
 
 def last_timestamp(moeda_id: int) -> pd.Timestamp | None:
@@ -75,196 +406,673 @@ def last_timestamp(moeda_id: int) -> pd.Timestamp | None:
     return pd.to_datetime(ts, utc=True) if ts else None
 
 
+def last_timestamps(moeda_ids) -> dict[int, pd.Timestamp | None]:
+    """
+    Último timestamp de várias moedas numa única ida ao banco (UTC).
+    O LATERAL faz um MAX por moeda_id, que o Postgres resolve pelo índice.
+    """
+    ids = sorted({int(m) for m in moeda_ids})
+    out: dict[int, pd.Timestamp | None] = {m: None for m in ids}
+    if not ids:
+        return out
+    with engine.begin() as conn:
+        rows = conn.execute(
+            text(
+                "SELECT m.id, t.ts "
+                "FROM unnest(CAST(:ids AS int[])) AS m(id) "
+                "LEFT JOIN LATERAL (SELECT MAX(timestamp) AS ts FROM precos WHERE moeda_id = m.id) t ON TRUE"
+            ),
+            {"ids": ids}
+        ).all()
+    for mid, ts in rows:
+        if ts is not None:
+            out[int(mid)] = pd.to_datetime(ts, utc=True)
+    return out
+
+
 # -----------------------------
-# Downloaders
+# Upsert
 # -----------------------------
-def _normalize_yf(df: pd.DataFrame) -> pd.DataFrame:
-    """Normaliza dataframe do yfinance para colunas: timestamp, open, high, low, close, volume."""
-    if df.empty:
-        return df
-
-    # MultiIndex => achata para nível OHLC
-    if isinstance(df.columns, pd.MultiIndex):
-        # tenta pegar o nível com OHLC
-        lvl0 = [str(x).lower() for x in df.columns.get_level_values(0)]
-        lvl1 = [str(x).lower() for x in df.columns.get_level_values(1)]
-        ohlc_keys = {"open", "high", "low", "close", "volume", "adj close"}
-        if any(k in lvl0 for k in ohlc_keys):
-            df.columns = df.columns.get_level_values(0)
-        elif any(k in lvl1 for k in ohlc_keys):
-            df.columns = df.columns.get_level_values(1)
-        else:
-            df.columns = ["_".join(str(p).lower() for p in col if p) for col in df.columns]
-
-    df = df.reset_index()
-
-    # Detecta coluna temporal
-    time_col = None
-    for cand in ["Datetime", "Date", "datetime", "date"]:
-        if cand in df.columns:
-            time_col = cand
-            break
-    if time_col is None:
-        for c in df.columns:
-            if pd.api.types.is_datetime64_any_dtype(df[c]):
-                time_col = c
-                break
-    if time_col is None:
-        raise RuntimeError(f"Não encontrei coluna de tempo em: {df.columns.tolist()}")
-
-    # Padroniza nomes
-    df = df.rename(columns={
-        time_col: "timestamp",
-        "Open": "open", "High": "high", "Low": "low", "Close": "close",
-        "Adj Close": "adj close", "Volume": "volume",
-        "open": "open", "high": "high", "low": "low", "close": "close",
-        "adj close": "adj close", "volume": "volume",
-    })
-    df.columns = [str(c).lower() for c in df.columns]
-
-    # Se nomes vierem como 'btc-usd_open', tenta resolver
-    if "open" not in df.columns and any("open" in c for c in df.columns):
-        def pick(colname):
-            cands = [c for c in df.columns if colname in c]
-            for c in cands:
-                if c.endswith(f"_{colname}") or c.startswith(f"{colname}_"):
-                    return c
-            return cands[0] if cands else None
-
-        mapping = {k: pick(k) for k in ["open", "high", "low", "close", "volume"]}
-        missing = [k for k, v in mapping.items() if v is None]
-        if missing:
-            raise RuntimeError(f"Colunas ausentes após normalização: {missing}. Colunas: {df.columns.tolist()}")
-        df = df.rename(columns={mapping[k]: k for k in mapping if mapping[k]})
-
-    df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True, errors="coerce")
-    df = df.dropna(subset=["timestamp"])
-
-    needed = ["timestamp", "open", "high", "low", "close"]
-    opt = ["volume"]
-    missing = [c for c in needed if c not in df.columns]
-    if missing:
-        raise RuntimeError(f"Colunas OHLC ausentes: {missing}. Colunas: {df.columns.tolist()}")
-
-    cols = needed + [c for c in opt if c in df.columns]
-    df = df[cols].dropna(subset=["open", "high", "low", "close"])
-
-    return df
-
-
-def download_intraday_1h(ticker: str, since: pd.Timestamp | None) -> pd.DataFrame:
+def upsert_ohlc(moeda_id: int, df: pd.DataFrame, chunk_rows: int = COPY_CHUNK_ROWS) -> int:
     """
-    Baixa dados em 1h respeitando o limite de ~729 dias do Yahoo.
-    - Se since is None => últimos 729d
-    - Caso contrário, calcula a janela (since -> now) e cap 729d
+    Upsert em massa: envia o frame em lotes via COPY FROM STDIN para uma tabela
+    temporária de staging e faz o merge em 'precos' com ON CONFLICT.
+    O UPDATE só toca linhas cujo OHLCV mudou (IS DISTINCT FROM), então a janela
+    re-ingerida a cada hora não gera escrita/WAL para velas idênticas. Velas de
+    dias que já têm vela diária em 'precos_historico' são descartadas; dias
+    antigos ainda não consolidados (backfill, lacunas) entram normalmente.
+    Na mesma transação, recalcula os rollups 4h/1d apenas dos buckets tocados
+    e a linha da moeda em 'mercado_snapshot'.
+    Retorna o número de linhas efetivamente inseridas ou alteradas.
     """
-    now_utc = pd.Timestamp.now("UTC").floor("h")
-    if since is None:
-        period = f"{MAX_LOOKBACK_DAYS_1H}d"
-    else:
-        delta_days = max(1, int((now_utc - since).days) + 1)
-        period = f"{min(delta_days, MAX_LOOKBACK_DAYS_1H)}d"
-
-    raw = yf.download(
-        ticker,
-        interval="1h",
-        period=period,
-        auto_adjust=False,
-        progress=False,
-        group_by=None,
-        threads=False,
-    )
-    if raw.empty:
-        return raw
+    if df.empty:
+        return 0
+    cols = {c.name for c in _precos_table().columns}
 
-    df = _normalize_yf(raw)
-    # Se since existir, filtra para evitar repetir candles
-    if since is not None:
-        df = df[df["timestamp"] > since]
-    return df
+    # ON CONFLICT não aceita a mesma chave duas vezes no mesmo comando
+    data = df.drop_duplicates(subset=["timestamp"], keep="last").assign(moeda_id=int(moeda_id))
 
+    # Tabelas antigas com 'preco' NOT NULL: povoar com 'close'
+    if "preco" in cols and "preco" not in data.columns:
+        data["preco"] = data["close"]
 
-def download_daily_1d(ticker: str, start_date: str, since: pd.Timestamp | None) -> pd.DataFrame:
-    """
-    Baixa dados diários desde start_date. Se já houver dados, baixa a partir do próximo dia do since.
+    ordered = [c for c in ["moeda_id","timestamp","preco","open","high","low","close","volume"]
+               if c in cols and c in data.columns]
+    updatable = [c for c in ["preco","open","high","low","close","volume"] if c in ordered]
+
+    col_list = ", ".join(f'"{c}"' for c in ordered)
+    set_clause = ", ".join(f'"{c}" = EXCLUDED."{c}"' for c in updatable)
+    changed = " OR ".join(f'p."{c}" IS DISTINCT FROM EXCLUDED."{c}"' for c in updatable)
+
+    ensure_partitions(data["timestamp"].min(), data["timestamp"].max())
+
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        cur.execute(
+            f"CREATE TEMP TABLE _stg_precos ON COMMIT DROP AS "
+            f"SELECT {col_list} FROM precos WITH NO DATA"
+        )
+        copy_sql = f"COPY _stg_precos ({col_list}) FROM STDIN WITH (FORMAT csv)"
+        for start in range(0, len(data), max(1, chunk_rows)):
+            buf = io.StringIO()
+            data.iloc[start:start + chunk_rows].to_csv(buf, columns=ordered, index=False, header=False)
+            buf.seek(0)
+            cur.copy_expert(copy_sql, buf)
+        cur.execute(
+            f"WITH up AS ("
+            f"  INSERT INTO precos AS p ({col_list}) SELECT {col_list} FROM _stg_precos s "
+            f"  WHERE NOT EXISTS ("
+            f"    SELECT 1 FROM precos_historico h WHERE h.moeda_id = {int(moeda_id)} "
+            f"    AND h.timestamp = date_trunc('day', s.timestamp AT TIME ZONE 'UTC') AT TIME ZONE 'UTC'"
+            f"  ) "
+            f"  ON CONFLICT (moeda_id, timestamp) DO UPDATE SET {set_clause} WHERE {changed} "
+            f"  RETURNING p.timestamp"
+            f") SELECT COUNT(*), MIN(timestamp), MAX(timestamp) FROM up"
+        )
+        affected, touched_min, touched_max = cur.fetchone()
+        if affected:
+            _refresh_rollups(cur, moeda_id, pd.Timestamp(touched_min), pd.Timestamp(touched_max))
+            _refresh_snapshot(cur, moeda_id)
+        raw.commit()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+    return affected or 0
+
+
+# -----------------------------
+# Rollups 4h / 1d
+# -----------------------------
+def _rollup_sql(table: str) -> str:
+    """Recalcula os buckets de [ini, fim) a partir de 'precos' (só reescreve os que mudaram)."""
+    return f"""
+        INSERT INTO {table} AS r (moeda_id, timestamp, open, high, low, close, volume, velas)
+        SELECT moeda_id,
+               to_timestamp(floor(extract(epoch FROM timestamp) / %(s)s) * %(s)s) AS bucket,
+               (array_agg(open ORDER BY timestamp))[1],
+               MAX(high),
+               MIN(low),
+               (array_agg(close ORDER BY timestamp DESC))[1],
+               COALESCE(SUM(volume), 0),
+               COUNT(*)
+        FROM precos
+        WHERE moeda_id = %(m)s AND timestamp >= %(ini)s AND timestamp < %(fim)s
+        GROUP BY moeda_id, bucket
+        ON CONFLICT (moeda_id, timestamp) DO UPDATE SET
+          open = EXCLUDED.open, high = EXCLUDED.high, low = EXCLUDED.low,
+          close = EXCLUDED.close, volume = EXCLUDED.volume, velas = EXCLUDED.velas
+        WHERE (r.open, r.high, r.low, r.close, r.volume, r.velas)
+              IS DISTINCT FROM (EXCLUDED.open, EXCLUDED.high, EXCLUDED.low, EXCLUDED.close, EXCLUDED.volume, EXCLUDED.velas)
     """
-    if since is not None:
-        start_date = (since + timedelta(days=1)).date().isoformat()
-
-    raw = yf.download(
-        ticker,
-        interval="1d",
-        start=start_date,
-        auto_adjust=False,
-        progress=False,
-        group_by=None,
-    )
-    if raw.empty:
-        return raw
 
-    df = _normalize_yf(raw)
-    if since is not None:
-        df = df[df["timestamp"] > since]
-    return df
+
+def _refresh_rollups(cur, moeda_id: int, start: pd.Timestamp, end: pd.Timestamp):
+    """Atualiza, no cursor/transação dado, os buckets 4h/1d que contêm velas entre start e end (inclusive)."""
+    for table, secs in ROLLUPS.values():
+        size = f"{secs}s"
+        cur.execute(_rollup_sql(table), {
+            "m": int(moeda_id), "s": secs,
+            "ini": start.floor(size).to_pydatetime(),
+            "fim": (end.floor(size) + pd.Timedelta(seconds=secs)).to_pydatetime(),
+        })
+
+
+def rebuild_rollups(moeda_ids=None):
+    """Reconstrói os rollups de todo o histórico (primeira criação ou --rebuild-rollups)."""
+    with engine.begin() as conn:
+        q = "SELECT moeda_id, MIN(timestamp), MAX(timestamp) FROM precos"
+        if moeda_ids is not None:
+            q += " WHERE moeda_id = ANY(CAST(:ids AS int[]))"
+        rows = conn.execute(text(q + " GROUP BY moeda_id"), {"ids": [int(m) for m in moeda_ids or []]}).all()
+
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        for mid, ts_min, ts_max in rows:
+            _refresh_rollups(cur, mid, pd.Timestamp(ts_min), pd.Timestamp(ts_max))
+            raw.commit()
+            print(f"Rollups 4h/1d reconstruídos para moeda_id={mid}.")
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
 
 
 # -----------------------------
-# Upsert
+# Snapshot do mercado
 # -----------------------------
-def upsert_ohlc(moeda_id: int, df: pd.DataFrame) -> int:
-    if df.empty:
-        return 0
-    df = df.copy()
-    df["moeda_id"] = moeda_id
+# Última vela, preço 24h antes dela, volume/máxima/mínima das últimas 24h e volatilidade
+# (desvio amostral dos retornos vela a vela em 24h). Só buscas curtas pelo índice da moeda.
+SNAPSHOT_SQL = """
+    INSERT INTO mercado_snapshot AS s (moeda_id, ts_ultima, preco_atual, preco_24h, variacao_24h,
+                                       volume_24h, max_24h, min_24h, volatilidade_24h, atualizado_em)
+    SELECT %(m)s, u.timestamp, u.close, a.close, u.close / NULLIF(a.close, 0) - 1,
+           j.volume_24h, j.max_24h, j.min_24h, v.vol, now()
+    FROM (
+        SELECT timestamp, close FROM precos WHERE moeda_id = %(m)s ORDER BY timestamp DESC LIMIT 1
+    ) u
+    LEFT JOIN LATERAL (
+        SELECT close FROM precos
+        WHERE moeda_id = %(m)s AND timestamp <= u.timestamp - INTERVAL '24 hours'
+        ORDER BY timestamp DESC LIMIT 1
+    ) a ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT SUM(volume) AS volume_24h, MAX(high) AS max_24h, MIN(low) AS min_24h
+        FROM precos
+        WHERE moeda_id = %(m)s AND timestamp > u.timestamp - INTERVAL '24 hours'
+    ) j ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT STDDEV_SAMP(r) AS vol FROM (
+            SELECT close / NULLIF(LAG(close) OVER (ORDER BY timestamp), 0) - 1 AS r
+            FROM precos
+            WHERE moeda_id = %(m)s AND timestamp >= u.timestamp - INTERVAL '24 hours'
+        ) x
+    ) v ON TRUE
+    ON CONFLICT (moeda_id) DO UPDATE SET
+      ts_ultima = EXCLUDED.ts_ultima, preco_atual = EXCLUDED.preco_atual, preco_24h = EXCLUDED.preco_24h,
+      variacao_24h = EXCLUDED.variacao_24h, volume_24h = EXCLUDED.volume_24h, max_24h = EXCLUDED.max_24h,
+      min_24h = EXCLUDED.min_24h, volatilidade_24h = EXCLUDED.volatilidade_24h, atualizado_em = EXCLUDED.atualizado_em
+"""
 
-    meta = MetaData()
-    precos = Table("precos", meta, autoload_with=engine)
-    cols = {c.name for c in precos.columns}
 
-    # Tabelas antigas com 'preco' NOT NULL: povoar com 'close'
-    if "preco" in cols and "preco" not in df.columns:
-        df["preco"] = df["close"]
+def _refresh_snapshot(cur, moeda_id: int):
+    """Recalcula, no cursor/transação dado, a linha da moeda em 'mercado_snapshot'."""
+    cur.execute(SNAPSHOT_SQL, {"m": int(moeda_id)})
 
-    ordered = [c for c in ["moeda_id","timestamp","preco","open","high","low","close","volume"] if c in cols]
-    payload = df[ordered].to_dict(orient="records")
 
-    stmt = insert(precos).values(payload)
-    updatable = {c: stmt.excluded[c] for c in ["preco","open","high","low","close","volume"] if c in cols}
-    stmt = stmt.on_conflict_do_update(
-        index_elements=["moeda_id","timestamp"],
-        set_=updatable
-    )
+def rebuild_snapshot(moeda_ids=None):
+    """Recalcula o snapshot de todas as moedas com velas (criação da tabela)."""
+    with engine.begin() as conn:
+        q = "SELECT DISTINCT moeda_id FROM precos"
+        if moeda_ids is not None:
+            q += " WHERE moeda_id = ANY(CAST(:ids AS int[]))"
+        ids = conn.execute(text(q), {"ids": [int(m) for m in moeda_ids or []]}).scalars().all()
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        for mid in ids:
+            _refresh_snapshot(cur, mid)
+        raw.commit()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+    print(f"mercado_snapshot recalculado para {len(ids)} moeda(s).")
+
+
+# -----------------------------
+# Retenção (horário -> diário)
+# -----------------------------
+def retention_cutoff(days: int = RETENTION_DAYS, now: pd.Timestamp | None = None) -> pd.Timestamp:
+    """Início do mês que contém now - days (UTC): partições inteiras ficam de um lado só."""
+    now = pd.Timestamp.now(tz="UTC") if now is None else pd.Timestamp(now)
+    return (now - pd.Timedelta(days=days)).normalize().replace(day=1)
+
 
+def _old_partitions(conn, cutoff: pd.Timestamp) -> list[str]:
+    """Partições mensais de 'precos' inteiramente anteriores ao corte."""
+    names = conn.execute(text("""
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'precos'::regclass
+    """)).scalars().all()
+    old = []
+    for name in names:
+        try:
+            month = pd.Timestamp(pd.to_datetime(name.removeprefix("precos_p"), format="%Y_%m"), tz="UTC")
+        except ValueError:
+            continue
+        if month + pd.offsets.MonthBegin(1) <= cutoff:
+            old.append(name)
+    return sorted(old)
+
+
+def apply_retention(days: int = RETENTION_DAYS, drop: bool = RETENTION_DROP) -> int:
+    """
+    Consolida as velas de 'precos' anteriores ao corte em velas diárias (OHLCV
+    exatos: primeira abertura, máxima, mínima, último fechamento, volume somado)
+    em 'precos_historico' e tira essas horas de 'precos', numa única transação.
+    Partições inteiras são desanexadas e removidas (sem drop, ficam como
+    '<partição>_arquivo'); o resto sai por DELETE.
+    Os rollups 4h/1d não são tocados. Retorna o número de velas diárias gravadas.
+    """
+    cutoff = retention_cutoff(days)
     with engine.begin() as conn:
-        res = conn.execute(stmt)
-    return res.rowcount or 0
+        conn.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": PARTITION_LOCK_KEY})
+        folded = conn.execute(text("""
+            INSERT INTO precos_historico (moeda_id, timestamp, open, high, low, close, volume, velas)
+            SELECT moeda_id,
+                   date_trunc('day', timestamp AT TIME ZONE 'UTC') AT TIME ZONE 'UTC' AS dia,
+                   (array_agg(open ORDER BY timestamp))[1],
+                   MAX(high),
+                   MIN(low),
+                   (array_agg(close ORDER BY timestamp DESC))[1],
+                   SUM(volume),
+                   COUNT(*)
+            FROM precos
+            WHERE timestamp < :corte
+            GROUP BY moeda_id, dia
+        """), {"corte": cutoff.to_pydatetime()}).rowcount
+        detached = _old_partitions(conn, cutoff) if _precos_partitioned() else []
+        for name in detached:
+            conn.execute(text(f"ALTER TABLE precos DETACH PARTITION {name}"))
+            if drop:
+                conn.execute(text(f"DROP TABLE {name}"))
+            else:
+                conn.execute(text(f"ALTER TABLE {name} RENAME TO {name}_arquivo"))
+        deleted = conn.execute(text("DELETE FROM precos WHERE timestamp < :corte"), {"corte": cutoff.to_pydatetime()}).rowcount
+    with _partitions_lock:
+        _known_partitions.difference_update(detached)
+    action = "removida(s)" if drop else "desanexada(s)"
+    print(f"Retenção até {cutoff:%Y-%m-%d}: {folded} vela(s) diária(s) em precos_historico, "
+          f"{len(detached)} partição(ões) {action}, {deleted} linha(s) apagada(s).")
+    return folded
+
+
+# -----------------------------
+# Provedor
+# -----------------------------
+def build_provider(name: str = DEFAULT_PROVIDER, data_dir: str = DATA_DIR, cache_enabled: bool = CACHE_ENABLED,
+                   cache_dir: str = CACHE_DIR, replay: bool = False) -> MarketDataProvider:
+    """Monta o provedor de dados. No Yahoo, replay implica cache e nunca acessa a rede."""
+    if name == "local":
+        return LocalFileProvider(data_dir)
+    if name == "yahoo":
+        cache = None
+        if cache_enabled or replay:
+            cache = RawCache(cache_dir, CACHE_TTL_SECONDS, int(CACHE_MAX_MB * 1024 * 1024))
+        return YahooProvider(cache=cache, replay=replay)
+    raise ValueError(f"Provedor desconhecido: {name}. Use 'yahoo' ou 'local'.")
+
+
+def get_provider() -> MarketDataProvider:
+    """Provedor do processo (montado com os defaults do .env na primeira chamada)."""
+    global PROVIDER
+    if PROVIDER is None:
+        PROVIDER = build_provider()
+    return PROVIDER
 
 
 # -----------------------------
 # Runner
 # -----------------------------
-def run_one(name: str, moeda_id: int, ticker: str, start_daily: str, interval: str) -> int:
+def _log_coin(name: str, inserted: int, since: pd.Timestamp | None, start_daily: str, interval: str):
+    base_since = (since.isoformat() if since is not None else ("(novo) " + start_daily))
+    print(f"[{name}] {inserted} linhas inseridas/atualizadas desde {base_since} (interval={interval})")
+
+
+def run_one(name: str, moeda_id: int, ticker: str, start_daily: str, interval: str,
+            provider: MarketDataProvider | None = None) -> int:
+    provider = provider or get_provider()
     lt = last_timestamp(moeda_id)
+    df = provider.fetch_since(ticker, interval, lt, start_daily)
+    inserted = upsert_ohlc(moeda_id, df)
+    _log_coin(name, inserted, lt, start_daily, interval)
+    return inserted
+
+
+def run_batch(coins: dict, interval: str, workers: int = DEFAULT_WORKERS,
+              provider: MarketDataProvider | None = None) -> int:
+    """
+    Modo em lote: um único lookup de last_timestamp para todas as moedas, busca de
+    todas pelo provedor (no Yahoo, uma chamada multi-ticker) e upserts paralelos por moeda_id.
+    """
+    provider = provider or get_provider()
+    since_map = last_timestamps(mid for (mid, _, _) in coins.values())
+    frames = provider.fetch_many(coins, interval, since_map, workers)
+
+    total = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(upsert_ohlc, coins[name][0], df): name for name, df in frames.items()}
+        for fut in as_completed(futures):
+            name = futures[fut]
+            mid, _, start = coins[name]
+            inserted = fut.result()
+            _log_coin(name, inserted, since_map.get(mid), start, interval)
+            total += inserted
+    return total
 
-    if interval == "1h":
-        df = download_intraday_1h(ticker, lt)
-    elif interval == "1d":
-        df = download_daily_1d(ticker, start_daily, lt)
+
+def run_all(interval: str, symbols: list[str] | None = None, batch: bool = False, workers: int = DEFAULT_WORKERS,
+            provider: MarketDataProvider | None = None):
+    ensure_schema()
+    coins = {k: COINS[k] for k in (COINS.keys() if symbols is None else symbols)}
+    if batch:
+        total = run_batch(coins, interval, workers, provider)
     else:
-        raise ValueError("INTERVAL deve ser '1h' ou '1d'.")
+        total = 0
+        for name, (mid, ticker, start) in coins.items():
+            total += run_one(name, mid, ticker, start, interval, provider)
+    print(f"Total inserido/atualizado: {total}")
+    return total
 
+
+# -----------------------------
+# Backfill histórico com checkpoints
+# -----------------------------
+def completed_windows(moeda_id: int, interval: str) -> dict[pd.Timestamp, pd.Timestamp]:
+    """Janelas já concluídas dessa moeda/intervalo: {janela_inicio: inicio_coberto}."""
+    with engine.begin() as conn:
+        rows = conn.execute(
+            text("SELECT janela_inicio, inicio_coberto FROM etl_checkpoints WHERE moeda_id = :m AND intervalo = :i"),
+            {"m": moeda_id, "i": interval}
+        ).all()
+    return {pd.Timestamp(ws).tz_convert("UTC"): pd.Timestamp(cov).tz_convert("UTC") for ws, cov in rows}
+
+
+def mark_window_done(moeda_id: int, interval: str, window: tuple[pd.Timestamp, pd.Timestamp],
+                     covered_from: pd.Timestamp, rows: int, provider_name: str):
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO etl_checkpoints (moeda_id, intervalo, janela_inicio, janela_fim, inicio_coberto, linhas, provedor)
+            VALUES (:m, :i, :ws, :we, :cov, :n, :p)
+            ON CONFLICT (moeda_id, intervalo, janela_inicio) DO UPDATE
+              SET janela_fim = EXCLUDED.janela_fim, inicio_coberto = EXCLUDED.inicio_coberto,
+                  linhas = EXCLUDED.linhas, provedor = EXCLUDED.provedor, concluido_em = NOW()
+        """), {"m": moeda_id, "i": interval, "ws": window[0], "we": window[1],
+               "cov": covered_from, "n": rows, "p": provider_name})
+
+
+def _backfill_window(provider: MarketDataProvider, name: str, moeda_id: int, ticker: str, interval: str,
+                     window: tuple[pd.Timestamp, pd.Timestamp], lo: pd.Timestamp, hi: pd.Timestamp,
+                     closed_until: pd.Timestamp) -> int:
+    """Busca e persiste uma janela; só grava checkpoint se a janela já fechou (não contém a vela corrente)."""
+    ws, we = window
+    start, end = max(ws, lo), min(we, hi)
+    df = provider.fetch(ticker, interval, start, end)
     inserted = upsert_ohlc(moeda_id, df)
-    base_since = (lt.isoformat() if lt is not None else ("(novo) " + start_daily))
-    print(f"[{name}] {inserted} linhas inseridas/atualizadas desde {base_since} (interval={interval})")
+    if we <= closed_until:
+        mark_window_done(moeda_id, interval, window, start, len(df), provider.name)
+    print(f"[{name}] janela {ws.date()} → {we.date()}: {len(df)} velas, {inserted} inseridas/atualizadas")
     return inserted
 
 
-def run_all(interval: str):
-    ensure_schema()
+def backfill(coins: dict, interval: str, since: pd.Timestamp | None = None, window: pd.Timedelta | None = None,
+             workers: int = DEFAULT_WORKERS, provider: MarketDataProvider | None = None) -> int:
+    """
+    Backfill histórico retomável: divide o histórico de cada moeda em janelas fixas
+    (alinhadas à época Unix), pula as já registradas em etl_checkpoints e busca o
+    restante com concorrência limitada por `workers` e pelo rate limit do provedor.
+    Cada janela é persistida assim que chega, então uma falha perde no máximo as
+    janelas em andamento.
+    """
+    provider = provider or get_provider()
+    step = INTERVAL_STEPS[interval]
+    size = window or BACKFILL_WINDOW[interval]
+    closed_until = pd.Timestamp.now("UTC").floor(step)
+    hi = closed_until + step
+    earliest = provider.earliest(interval)
+
+    tasks = []
+    for name, (mid, ticker, start_daily) in coins.items():
+        lo = since if since is not None else pd.Timestamp(start_daily, tz="UTC")
+        if earliest is not None:
+            lo = max(lo, earliest)
+        done = completed_windows(mid, interval)
+        for ws, we in provider.pages(interval, lo, hi, size=size, clip=False):
+            covered = done.get(ws)
+            if covered is not None and covered <= max(ws, lo):
+                continue
+            tasks.append((name, mid, ticker, (ws, we), lo))
+
+    print(f"Backfill {interval}: {len(tasks)} janela(s) pendente(s) de {size.days}d para {len(coins)} moeda(s).")
+    total, failed = 0, 0
+    n = max(1, min(workers, provider.rate_limit().max_concurrency))
+    with ThreadPoolExecutor(max_workers=n) as pool:
+        futures = {
+            pool.submit(_backfill_window, provider, name, mid, ticker, interval, win, lo, hi, closed_until): (name, win)
+            for name, mid, ticker, win, lo in tasks
+        }
+        for fut in as_completed(futures):
+            name, (ws, we) = futures[fut]
+            try:
+                total += fut.result()
+            except Exception as e:
+                failed += 1
+                print(f"[{name}] janela {ws.date()} → {we.date()} falhou: {e}")
+    print(f"Backfill concluído: {total} linhas inseridas/atualizadas, {failed} janela(s) com falha"
+          + (" (rode de novo para retomar)." if failed else "."))
+    return total
+
+
+# -----------------------------
+# Lacunas (velas faltantes)
+# -----------------------------
+def scan_gaps(moeda_ids, interval: str, since: pd.Timestamp | None = None) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Procura velas faltantes por moeda numa única consulta com LAG(timestamp),
+    sem trazer a série para o pandas: só voltam as linhas que abrem uma lacuna
+    e uma linha-resumo (a primeira) por moeda.
+    Retorna (lacunas, completude):
+    - lacunas: moeda_id, gap_inicio, gap_fim (velas existentes nas pontas), velas_faltantes
+    - completude: moeda_id, primeira, ultima, velas, esperadas, faltantes, completude
+    """
+    step = INTERVAL_STEPS[interval]
+    ids = sorted({int(m) for m in moeda_ids})
+    where = "moeda_id = ANY(CAST(:ids AS int[]))"
+    params = {"ids": ids, "step": step.to_pytimedelta(), "step_s": step.total_seconds()}
+    if since is not None:
+        where += " AND timestamp >= :since"
+        params["since"] = since
+    q = text(f"""
+        SELECT moeda_id, prev_ts, timestamp, rn, n_total, ts_min, ts_max,
+               CASE WHEN prev_ts IS NULL THEN 0
+                    ELSE ROUND(EXTRACT(EPOCH FROM timestamp - prev_ts) / :step_s)::bigint - 1 END AS faltantes
+        FROM (
+            SELECT moeda_id, timestamp,
+                   LAG(timestamp) OVER w AS prev_ts,
+                   ROW_NUMBER() OVER w AS rn,
+                   COUNT(*) OVER (PARTITION BY moeda_id) AS n_total,
+                   MIN(timestamp) OVER (PARTITION BY moeda_id) AS ts_min,
+                   MAX(timestamp) OVER (PARTITION BY moeda_id) AS ts_max
+            FROM precos
+            WHERE {where}
+            WINDOW w AS (PARTITION BY moeda_id ORDER BY timestamp)
+        ) s
+        WHERE rn = 1 OR timestamp - prev_ts > :step
+        ORDER BY moeda_id, timestamp
+    """)
+    with engine.begin() as conn:
+        df = pd.read_sql_query(q, conn, params=params)
+
+    gap_cols = ["moeda_id", "gap_inicio", "gap_fim", "velas_faltantes"]
+    comp_cols = ["moeda_id", "primeira", "ultima", "velas", "esperadas", "faltantes", "completude"]
+    if df.empty:
+        return pd.DataFrame(columns=gap_cols), pd.DataFrame(columns=comp_cols)
+    for c in ("prev_ts", "timestamp", "ts_min", "ts_max"):
+        df[c] = pd.to_datetime(df[c], utc=True)
+
+    gaps = df[df["prev_ts"].notna()].rename(columns={
+        "prev_ts": "gap_inicio", "timestamp": "gap_fim", "faltantes": "velas_faltantes"
+    })[gap_cols].reset_index(drop=True)
+
+    comp = df[df["rn"] == 1][["moeda_id", "ts_min", "ts_max", "n_total"]].rename(columns={
+        "ts_min": "primeira", "ts_max": "ultima", "n_total": "velas"
+    }).reset_index(drop=True)
+    comp["esperadas"] = ((comp["ultima"] - comp["primeira"]) / step).astype("int64") + 1
+    comp["faltantes"] = comp["esperadas"] - comp["velas"]
+    comp["completude"] = comp["velas"] / comp["esperadas"]
+    return gaps, comp[comp_cols]
+
+
+def refetch_gaps(coins: dict, interval: str, gaps: pd.DataFrame, provider: MarketDataProvider | None = None) -> int:
+    """Busca de novo só as janelas faltantes (entre as velas das pontas de cada lacuna)."""
+    provider = provider or get_provider()
+    step = INTERVAL_STEPS[interval]
+    earliest = provider.earliest(interval)
+    by_id = {mid: (name, ticker) for name, (mid, ticker, _) in coins.items()}
     total = 0
-    for name, (mid, ticker, start) in COINS.items():
-        total += run_one(name, mid, ticker, start, interval)
-    print(f"Total inserido/atualizado: {total}")
+    for gap in gaps.itertuples(index=False):
+        name, ticker = by_id[int(gap.moeda_id)]
+        start, end = gap.gap_inicio + step, gap.gap_fim
+        if earliest is not None and end <= earliest:
+            print(f"[{name}] lacuna {start} → {end} anterior ao limite do provedor; ignorada.")
+            continue
+        if earliest is not None:
+            start = max(start, earliest)
+        df = provider.fetch_range(ticker, interval, start, end)
+        inserted = upsert_ohlc(int(gap.moeda_id), df)
+        print(f"[{name}] lacuna {start} → {end}: {len(df)} velas recebidas, {inserted} inseridas")
+        total += inserted
+    return total
+
+
+def report_gaps(coins: dict, interval: str, since: pd.Timestamp | None = None, refetch: bool = False,
+                provider: MarketDataProvider | None = None) -> pd.DataFrame:
+    """Varre lacunas, opcionalmente re-busca as janelas faltantes e imprime a completude por moeda."""
+    ids = [mid for (mid, _, _) in coins.values()]
+    gaps, comp = scan_gaps(ids, interval, since)
+    if refetch and not gaps.empty:
+        refetch_gaps(coins, interval, gaps, provider)
+        gaps, comp = scan_gaps(ids, interval, since)
+
+    names = {mid: name for name, (mid, _, _) in coins.items()}
+    for row in comp.itertuples(index=False):
+        n_gaps = int((gaps["moeda_id"] == row.moeda_id).sum())
+        print(f"[{names.get(int(row.moeda_id), row.moeda_id)}] completude {row.completude:.2%} "
+              f"({row.velas}/{row.esperadas} velas, {row.faltantes} faltantes em {n_gaps} lacuna(s)) "
+              f"de {row.primeira} a {row.ultima}")
+    return comp
+
+
+# -----------------------------
+# Daemon contínuo
+# -----------------------------
+@dataclass
+class CoinHealth:
+    """Estado de agendamento de uma moeda no daemon."""
+    next_run: float = 0.0
+    failures: int = 0
+    last_success: pd.Timestamp | None = None
+
+
+def next_candle_boundary(interval: str, now: pd.Timestamp | None = None) -> pd.Timestamp:
+    """Início da próxima vela do intervalo (UTC)."""
+    step = INTERVAL_STEPS[interval]
+    now = now if now is not None else pd.Timestamp.now("UTC")
+    return now.floor(step) + step
+
+
+def record_status(moeda_id: int, interval: str, rows: int | None = None, error: str | None = None,
+                  next_retry: pd.Timestamp | None = None):
+    """Grava o resultado da última tentativa em etl_status (sucesso zera as falhas)."""
+    ok = error is None
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO etl_status AS s (moeda_id, intervalo, ultimo_sucesso, ultima_tentativa,
+                                         linhas_ultima_execucao, falhas_consecutivas, ultimo_erro, proxima_tentativa)
+            VALUES (:m, :i, CASE WHEN :ok THEN NOW() END, NOW(), :n, CASE WHEN :ok THEN 0 ELSE 1 END, :err, :nxt)
+            ON CONFLICT (moeda_id, intervalo) DO UPDATE SET
+              ultimo_sucesso = COALESCE(EXCLUDED.ultimo_sucesso, s.ultimo_sucesso),
+              ultima_tentativa = EXCLUDED.ultima_tentativa,
+              linhas_ultima_execucao = COALESCE(EXCLUDED.linhas_ultima_execucao, s.linhas_ultima_execucao),
+              falhas_consecutivas = CASE WHEN :ok THEN 0 ELSE s.falhas_consecutivas + 1 END,
+              ultimo_erro = EXCLUDED.ultimo_erro,
+              proxima_tentativa = EXCLUDED.proxima_tentativa
+        """), {"m": moeda_id, "i": interval, "ok": ok, "n": rows, "err": error, "nxt": next_retry})
+
+
+def _safe_record_status(name: str, moeda_id: int, interval: str, **kwargs):
+    """record_status sem derrubar o daemon se o banco estiver fora."""
+    try:
+        record_status(moeda_id, interval, **kwargs)
+    except Exception as e:
+        print(f"[{name}] não foi possível gravar etl_status: {e}")
+
+
+def run_daemon(coins: dict, interval: str, workers: int = DEFAULT_WORKERS, provider: MarketDataProvider | None = None,
+               grace_seconds: float = DAEMON_GRACE_SECONDS, max_cycles: int | None = None):
+    """
+    ETL contínuo: acorda na virada de cada vela (+ folga), busca só o delta desde
+    last_timestamp de cada moeda e registra o resultado em etl_status.
+    Cada moeda roda isolada no pool: uma que falha entra em backoff exponencial
+    (BACKOFF_BASE_SECONDS * 2^(falhas-1), até BACKOFF_MAX_SECONDS) enquanto as
+    saudáveis seguem no horário; uma que trava não segura as demais.
+    `max_cycles` limita as rodadas de agendamento (útil com o provedor local ou replay).
+    """
+    provider = provider or get_provider()
+    ensure_schema()
+    health = {name: CoinHealth() for name in coins}
+    inflight: dict = {}
+    cycles = 0
+    print(f"Daemon ETL ({interval}, provedor={provider.name}) iniciado para {', '.join(coins)}.")
+
+    pool = ThreadPoolExecutor(max_workers=max(1, min(workers, provider.rate_limit().max_concurrency)))
+    try:
+        while True:
+            now = time.time()
+            running = set(inflight.values())
+            due = [name for name, h in health.items() if h.next_run <= now and name not in running]
+            if due and (max_cycles is None or cycles < max_cycles):
+                cycles += 1
+                for name in due:
+                    mid, ticker, start = coins[name]
+                    fut = pool.submit(run_one, name, mid, ticker, start, interval, provider)
+                    inflight[fut] = name
+            elif not inflight and max_cycles is not None and cycles >= max_cycles:
+                break
+
+            idle = [h.next_run for name, h in health.items() if name not in inflight.values()]
+            next_wake = min(idle) if idle else now + 60
+            timeout = max(1.0, next_wake - time.time())
+            if inflight:
+                done, _ = wait(list(inflight), timeout=timeout, return_when=FIRST_COMPLETED)
+            else:
+                time.sleep(timeout)
+                done = set()
+
+            for fut in done:
+                name = inflight.pop(fut)
+                mid = coins[name][0]
+                h = health[name]
+                try:
+                    rows = fut.result()
+                except Exception as e:
+                    h.failures += 1
+                    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (h.failures - 1))
+                    h.next_run = time.time() + delay
+                    retry_at = pd.Timestamp(h.next_run, unit="s", tz="UTC")
+                    print(f"[{name}] falha #{h.failures}: {e}. Nova tentativa às {retry_at:%H:%M:%S} UTC.")
+                    _safe_record_status(name, mid, interval, error=str(e)[:500], next_retry=retry_at)
+                    continue
+                h.failures = 0
+                h.last_success = pd.Timestamp.now("UTC")
+                boundary = next_candle_boundary(interval)
+                h.next_run = boundary.timestamp() + grace_seconds
+                _safe_record_status(name, mid, interval, rows=rows, next_retry=boundary)
+    except KeyboardInterrupt:
+        print("Daemon interrompido.")
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    for name, h in health.items():
+        last = h.last_success.isoformat() if h.last_success is not None else "nunca"
+        print(f"[{name}] último sucesso: {last} (falhas consecutivas: {h.failures})")
+    return {name: h.last_success for name, h in health.items()}
 
 
 def parse_args():
@@ -272,14 +1080,54 @@ def parse_args():
     parser.add_argument("symbols", nargs="*", help="Moedas a atualizar (ex.: BTC ETH). Vazio = todas.")
     parser.add_argument("--interval", "-i", choices=["1h","1d"], default=DEFAULT_INTERVAL,
                         help="Intervalo das velas (default: valor de INTERVAL no .env ou '1h').")
+    parser.add_argument("--batch", "-b", action="store_true",
+                        help="Baixa todas as moedas numa chamada multi-ticker e faz upserts em paralelo.")
+    parser.add_argument("--workers", "-w", type=int, default=DEFAULT_WORKERS,
+                        help="Threads do modo em lote e do backfill (default: ETL_WORKERS ou 4).")
+    parser.add_argument("--backfill", action="store_true",
+                        help="Backfill histórico em janelas fixas, retomável pelos checkpoints em etl_checkpoints.")
+    parser.add_argument("--since", type=lambda v: pd.Timestamp(v, tz="UTC"), default=None,
+                        help="Início do backfill/varredura de lacunas (YYYY-MM-DD). Default: todo o histórico.")
+    parser.add_argument("--daemon", action="store_true",
+                        help="Modo contínuo: acorda a cada vela e busca só o delta, com backoff por moeda.")
+    parser.add_argument("--max-cycles", type=int, default=None,
+                        help="Daemon: encerra após N rodadas de agendamento (default: sem limite).")
+    parser.add_argument("--scan-gaps", action="store_true",
+                        help="Varre lacunas (velas faltantes) em 'precos' e imprime a completude por moeda.")
+    parser.add_argument("--refetch-gaps", action="store_true",
+                        help="Com --scan-gaps: busca de novo só as janelas faltantes.")
+    parser.add_argument("--migrate-partitions", action="store_true",
+                        help="Converte uma 'precos' não particionada em particionada por mês (mantém 'precos_legado').")
+    parser.add_argument("--rebuild-rollups", action="store_true",
+                        help="Reconstrói as tabelas precos_4h/precos_1d a partir de todo o histórico de 'precos'.")
+    parser.add_argument("--retention", action="store_true",
+                        help="Consolida velas horárias antigas em diárias (precos_historico) e as tira de 'precos'.")
+    parser.add_argument("--retention-days", type=int, default=RETENTION_DAYS,
+                        help="Com --retention: idade mínima em dias das velas consolidadas (default: ETL_RETENTION_DAYS ou 400).")
+    parser.add_argument("--verify-indexes", action="store_true",
+                        help="Roda EXPLAIN nas consultas quentes e sai com erro se não usarem os índices gerenciados.")
+    parser.add_argument("--force-index-scan", action="store_true",
+                        help="Com --verify-indexes: desliga seq scan (bases de dev pequenas); só confere se os índices servem.")
+    parser.add_argument("--window-days", type=int, default=None,
+                        help="Tamanho das janelas do backfill em dias (default: 30 para 1h, 365 para 1d).")
+    parser.add_argument("--provider", "-p", choices=["yahoo", "local"], default=DEFAULT_PROVIDER,
+                        help="Fonte das velas (default: ETL_PROVIDER ou 'yahoo').")
+    parser.add_argument("--data-dir", default=DATA_DIR,
+                        help="Diretório dos dumps CSV/Parquet do provedor local (default: ETL_DATA_DIR ou data/ohlc).")
+    parser.add_argument("--replay", action="store_true",
+                        help="Yahoo sem rede: alimenta normalização e upsert só com o cache bruto em disco.")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Desliga o cache bruto das respostas do Yahoo (ETL_CACHE=0).")
+    parser.add_argument("--cache-dir", default=CACHE_DIR,
+                        help="Diretório do cache bruto (default: ETL_CACHE_DIR ou data/raw_cache).")
     return parser.parse_args()
 
 
 if __name__ == "__main__":
     args = parse_args()
-    ensure_schema()
+    PROVIDER = build_provider(args.provider, args.data_dir, cache_enabled=CACHE_ENABLED and not args.no_cache,
+                              cache_dir=args.cache_dir, replay=args.replay)
 
-    interval = args.interval
     symbols = [s.upper() for s in args.symbols] if args.symbols else list(COINS.keys())
 
     unknown = [s for s in symbols if s not in COINS]
@@ -287,8 +1135,25 @@ if __name__ == "__main__":
         print(f"Moedas não mapeadas: {', '.join(unknown)}. Disponíveis: {', '.join(COINS.keys())}")
         symbols = [s for s in symbols if s in COINS]
 
-    total = 0
-    for key in symbols:
-        mid, ticker, start = COINS[key]
-        total += run_one(key, mid, ticker, start, interval)
-    print(f"Total inserido/atualizado: {total}")
+    if args.verify_indexes:
+        sys.exit(0 if verify_indexes(args.force_index_scan) else 1)
+    elif args.retention:
+        ensure_schema()
+        apply_retention(args.retention_days)
+    elif args.migrate_partitions:
+        ensure_schema()
+        migrate_precos_to_partitioned()
+    elif args.rebuild_rollups:
+        ensure_schema()
+        rebuild_rollups([COINS[k][0] for k in symbols])
+    elif args.scan_gaps:
+        ensure_schema()
+        report_gaps({k: COINS[k] for k in symbols}, args.interval, since=args.since, refetch=args.refetch_gaps)
+    elif args.daemon:
+        run_daemon({k: COINS[k] for k in symbols}, args.interval, workers=args.workers, max_cycles=args.max_cycles)
+    elif args.backfill:
+        ensure_schema()
+        window = pd.Timedelta(days=args.window_days) if args.window_days else None
+        backfill({k: COINS[k] for k in symbols}, args.interval, since=args.since, window=window, workers=args.workers)
+    else:
+        run_all(args.interval, symbols, batch=args.batch, workers=args.workers)
@@ -0,0 +1,499 @@
+# etl_providers.py
+"""
+Provedores de dados de mercado para o ETL de OHLC.
+
+Todo provedor entrega velas normalizadas (timestamp, open, high, low, close,
+volume) para um ticker/intervalo/janela, pagina faixas longas em janelas fixas
+e informa os próprios limites de requisição. Acompanham:
+- YahooProvider: yfinance, com cache bruto em disco e modo replay;
+- LocalFileProvider: dumps OHLCV em CSV/Parquet de um diretório local
+  (fonte rápida e determinística para testes de carga e seed de ambientes).
+"""
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+from typing import NamedTuple
+
+import pandas as pd
+
+from etl_cache import RawCache
+
+# Import condicional: o provedor local e o replay não precisam do yfinance
+try:
+    import yfinance as yf
+    HAS_YF = True
+except ImportError:
+    HAS_YF = False
+
+# Passo de cada intervalo suportado
+INTERVAL_STEPS = {"1h": pd.Timedelta(hours=1), "1d": pd.Timedelta(days=1)}
+
+# Limite do Yahoo para intraday
+MAX_LOOKBACK_DAYS_1H = 729
+
+OHLCV_COLUMNS = ["timestamp", "open", "high", "low", "close", "volume"]
+
+
+class RateLimit(NamedTuple):
+    """Limites declarados pelo provedor (None = sem limite de requisições)."""
+    requests_per_minute: float | None
+    max_concurrency: int
+
+
+def _check_interval(interval: str):
+    if interval not in INTERVAL_STEPS:
+        raise ValueError("INTERVAL deve ser '1h' ou '1d'.")
+
+
+def _empty() -> pd.DataFrame:
+    return pd.DataFrame(columns=OHLCV_COLUMNS)
+
+
+# -----------------------------
+# Normalização
+# -----------------------------
+def _normalize_yf(df: pd.DataFrame) -> pd.DataFrame:
+    """Normaliza dataframe do yfinance para colunas: timestamp, open, high, low, close, volume."""
+    if df.empty:
+        return df
+
+    # MultiIndex => achata para nível OHLC
+    if isinstance(df.columns, pd.MultiIndex):
+        # tenta pegar o nível com OHLC
+        lvl0 = [str(x).lower() for x in df.columns.get_level_values(0)]
+        lvl1 = [str(x).lower() for x in df.columns.get_level_values(1)]
+        ohlc_keys = {"open", "high", "low", "close", "volume", "adj close"}
+        if any(k in lvl0 for k in ohlc_keys):
+            df.columns = df.columns.get_level_values(0)
+        elif any(k in lvl1 for k in ohlc_keys):
+            df.columns = df.columns.get_level_values(1)
+        else:
+            df.columns = ["_".join(str(p).lower() for p in col if p) for col in df.columns]
+
+    df = df.reset_index()
+
+    # Detecta coluna temporal
+    time_col = None
+    for cand in ["Datetime", "Date", "datetime", "date", "timestamp", "Timestamp"]:
+        if cand in df.columns:
+            time_col = cand
+            break
+    if time_col is None:
+        for c in df.columns:
+            if pd.api.types.is_datetime64_any_dtype(df[c]):
+                time_col = c
+                break
+    if time_col is None:
+        raise RuntimeError(f"Não encontrei coluna de tempo em: {df.columns.tolist()}")
+
+    # Padroniza nomes
+    df = df.rename(columns={
+        time_col: "timestamp",
+        "Open": "open", "High": "high", "Low": "low", "Close": "close",
+        "Adj Close": "adj close", "Volume": "volume",
+        "open": "open", "high": "high", "low": "low", "close": "close",
+        "adj close": "adj close", "volume": "volume",
+    })
+    df.columns = [str(c).lower() for c in df.columns]
+
+    # Se nomes vierem como 'btc-usd_open', tenta resolver
+    if "open" not in df.columns and any("open" in c for c in df.columns):
+        def pick(colname):
+            cands = [c for c in df.columns if colname in c]
+            for c in cands:
+                if c.endswith(f"_{colname}") or c.startswith(f"{colname}_"):
+                    return c
+            return cands[0] if cands else None
+
+        mapping = {k: pick(k) for k in ["open", "high", "low", "close", "volume"]}
+        missing = [k for k, v in mapping.items() if v is None]
+        if missing:
+            raise RuntimeError(f"Colunas ausentes após normalização: {missing}. Colunas: {df.columns.tolist()}")
+        df = df.rename(columns={mapping[k]: k for k in mapping if mapping[k]})
+
+    df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True, errors="coerce")
+    df = df.dropna(subset=["timestamp"])
+
+    needed = ["timestamp", "open", "high", "low", "close"]
+    opt = ["volume"]
+    missing = [c for c in needed if c not in df.columns]
+    if missing:
+        raise RuntimeError(f"Colunas OHLC ausentes: {missing}. Colunas: {df.columns.tolist()}")
+
+    cols = needed + [c for c in opt if c in df.columns]
+    df = df[cols].dropna(subset=["open", "high", "low", "close"])
+
+    return df
+
+
+# -----------------------------
+# Interface
+# -----------------------------
+class MarketDataProvider(ABC):
+    """Fonte de velas OHLCV usada pelo ETL."""
+
+    name = "base"
+    # Janela máxima por requisição, por intervalo
+    page_size = {"1h": pd.Timedelta(days=60), "1d": pd.Timedelta(days=3650)}
+
+    def __init__(self):
+        self._throttle_lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def rate_limit(self) -> RateLimit:
+        """Limites de requisição do provedor (default: sem limite)."""
+        return RateLimit(None, os.cpu_count() or 4)
+
+    def earliest(self, interval: str) -> pd.Timestamp | None:
+        """Início mais antigo que o provedor consegue servir nesse intervalo (None = sem limite)."""
+        return None
+
+    @abstractmethod
+    def fetch(self, ticker: str, interval: str, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+        """Velas normalizadas com start <= timestamp < end."""
+
+    def pages(self, interval: str, start: pd.Timestamp, end: pd.Timestamp,
+              size: pd.Timedelta | None = None, clip: bool = True) -> list[tuple[pd.Timestamp, pd.Timestamp]]:
+        """
+        Janelas fixas de `size` (default: page_size do intervalo) cobrindo [start, end),
+        alinhadas à época Unix para que a mesma janela tenha sempre os mesmos limites.
+        Com clip=False as pontas não são cortadas em start/end.
+        """
+        _check_interval(interval)
+        size = size or self.page_size[interval]
+        epoch = pd.Timestamp(0, tz="UTC")
+        ws = epoch + ((start - epoch) // size) * size
+        out = []
+        while ws < end:
+            we = ws + size
+            out.append((max(ws, start), min(we, end)) if clip else (ws, we))
+            ws = we
+        return out
+
+    def fetch_range(self, ticker: str, interval: str, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+        """Busca [start, end) página a página e concatena."""
+        frames = [self.fetch(ticker, interval, ws, we) for ws, we in self.pages(interval, start, end)]
+        frames = [f for f in frames if not f.empty]
+        if not frames:
+            return _empty()
+        df = pd.concat(frames, ignore_index=True)
+        return df.drop_duplicates("timestamp", keep="last").sort_values("timestamp").reset_index(drop=True)
+
+    def fetch_since(self, ticker: str, interval: str, since: pd.Timestamp | None, start_daily: str) -> pd.DataFrame:
+        """Delta do ETL: tudo depois de `since` (ou desde start_daily na primeira carga)."""
+        _check_interval(interval)
+        step = INTERVAL_STEPS[interval]
+        start = since + step if since is not None else pd.Timestamp(start_daily, tz="UTC")
+        earliest = self.earliest(interval)
+        if earliest is not None:
+            start = max(start, earliest)
+        # inclui a vela corrente (ainda aberta)
+        end = pd.Timestamp.now("UTC").floor(step) + step
+        return self.fetch_range(ticker, interval, start, end)
+
+    def fetch_many(self, coins: dict, interval: str, since_map: dict, workers: int) -> dict[str, pd.DataFrame]:
+        """Delta de várias moedas num pool limitado por `workers` e pelo rate limit do provedor."""
+        n = max(1, min(workers, self.rate_limit().max_concurrency))
+        frames: dict[str, pd.DataFrame] = {}
+        with ThreadPoolExecutor(max_workers=n) as pool:
+            futures = {
+                pool.submit(self.fetch_since, ticker, interval, since_map.get(mid), start): name
+                for name, (mid, ticker, start) in coins.items()
+            }
+            for fut in as_completed(futures):
+                frames[futures[fut]] = fut.result()
+        return frames
+
+    def _throttle(self):
+        """Espaça as requisições para respeitar requests_per_minute (compartilhado entre threads)."""
+        rpm = self.rate_limit().requests_per_minute
+        if not rpm:
+            return
+        gap = 60.0 / rpm
+        with self._throttle_lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + gap
+        if wait > 0:
+            time.sleep(wait)
+
+
+# -----------------------------
+# Arquivos locais (CSV/Parquet)
+# -----------------------------
+class LocalFileProvider(MarketDataProvider):
+    """
+    Lê dumps OHLCV de um diretório. Para o ticker 'BTC-USD' no intervalo '1h'
+    procura, nessa ordem: BTC-USD_1h, BTC-USD, BTC_1h, BTC (.parquet ou .csv).
+    Cada arquivo é lido e normalizado uma única vez; as janelas saem por busca binária.
+    """
+
+    name = "local"
+    page_size = {"1h": pd.Timedelta(days=365), "1d": pd.Timedelta(days=36500)}
+    EXTENSIONS = (".parquet", ".csv")
+
+    def __init__(self, root: str):
+        super().__init__()
+        self.root = root
+        self._frames: dict[tuple[str, str], pd.DataFrame] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, ticker: str, interval: str) -> str | None:
+        symbol = ticker.split("-")[0]
+        for base in (f"{ticker}_{interval}", ticker, f"{symbol}_{interval}", symbol):
+            for ext in self.EXTENSIONS:
+                path = os.path.join(self.root, base + ext)
+                if os.path.exists(path):
+                    return path
+        return None
+
+    def _load(self, ticker: str, interval: str) -> pd.DataFrame:
+        key = (ticker, interval)
+        with self._lock:
+            if key in self._frames:
+                return self._frames[key]
+        path = self._path(ticker, interval)
+        if path is None:
+            df = _empty()
+        else:
+            raw = pd.read_parquet(path) if path.endswith(".parquet") else pd.read_csv(path)
+            df = _normalize_yf(raw)
+            df = df.drop_duplicates("timestamp", keep="last").sort_values("timestamp").reset_index(drop=True)
+        with self._lock:
+            self._frames[key] = df
+        return df
+
+    def fetch(self, ticker: str, interval: str, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+        _check_interval(interval)
+        df = self._load(ticker, interval)
+        if df.empty:
+            return df
+        lo = df["timestamp"].searchsorted(start, side="left")
+        hi = df["timestamp"].searchsorted(end, side="left")
+        return df.iloc[lo:hi].reset_index(drop=True)
+
+
+# -----------------------------
+# Yahoo Finance (yfinance)
+# -----------------------------
+class YahooProvider(MarketDataProvider):
+    """
+    yfinance com cache bruto opcional (RawCache). Em replay só lê o cache:
+    nunca acessa a rede e usa a resposta mais recente de cada ticker.
+    """
+
+    name = "yahoo"
+
+    def __init__(self, cache: RawCache | None = None, replay: bool = False,
+                 requests_per_minute: float = 120, max_concurrency: int = 4):
+        super().__init__()
+        if not HAS_YF and not replay:
+            raise ImportError("yfinance não instalado. Execute: pip install yfinance")
+        if replay and cache is None:
+            raise ValueError("O modo replay precisa de um cache bruto configurado.")
+        self.cache = cache
+        self.replay = replay
+        self._rate = RateLimit(requests_per_minute, max_concurrency)
+
+    def rate_limit(self) -> RateLimit:
+        return self._rate
+
+    def earliest(self, interval: str) -> pd.Timestamp | None:
+        if interval == "1h":
+            return pd.Timestamp.now("UTC").floor("h") - pd.Timedelta(days=MAX_LOOKBACK_DAYS_1H)
+        return None
+
+    # ---- cache bruto ----
+    def _cache_lookup(self, ticker: str, interval: str, window: tuple[str, str]) -> pd.DataFrame | None:
+        """Resposta bruta em cache: a janela exata (dentro do TTL) ou, no replay, a mais recente."""
+        if self.cache is None:
+            return None
+        if self.replay:
+            return self.cache.latest(ticker, interval)
+        return self.cache.get(ticker, interval, *window)
+
+    def _cache_store(self, ticker: str, interval: str, window: tuple[str, str], raw: pd.DataFrame):
+        if self.cache is not None and not raw.empty:
+            self.cache.put(ticker, interval, *window, raw)
+
+    def _download(self, ticker: str, interval: str, window: tuple[str, str], **yf_kwargs) -> pd.DataFrame:
+        """yf.download passando pelo cache bruto; no replay devolve só o que estiver em disco."""
+        hit = self._cache_lookup(ticker, interval, window)
+        if hit is not None:
+            return hit
+        if self.replay:
+            print(f"[replay] sem resposta em cache para {ticker} ({interval}).")
+            return pd.DataFrame()
+        self._throttle()
+        raw = yf.download(ticker, interval=interval, **yf_kwargs)
+        self._cache_store(ticker, interval, window, raw)
+        return raw
+
+    # ---- janelas ----
+    @staticmethod
+    def _window_1h(days: int) -> tuple[str, str]:
+        """Janela (início, fim) equivalente a period=<days>d, alinhada na hora cheia."""
+        end = pd.Timestamp.now("UTC").floor("h")
+        return (end - pd.Timedelta(days=days)).isoformat(), end.isoformat()
+
+    @staticmethod
+    def _window_1d(start: str) -> tuple[str, str]:
+        return start, pd.Timestamp.now("UTC").date().isoformat()
+
+    @staticmethod
+    def _lookback_days_1h(since: pd.Timestamp | None) -> int:
+        """Dias a pedir no intraday: da última vela até agora, limitado a ~729d."""
+        if since is None:
+            return MAX_LOOKBACK_DAYS_1H
+        now_utc = pd.Timestamp.now("UTC").floor("h")
+        delta_days = max(1, int((now_utc - since).days) + 1)
+        return min(delta_days, MAX_LOOKBACK_DAYS_1H)
+
+    @staticmethod
+    def _daily_start(start_date: str, since: pd.Timestamp | None) -> str:
+        """Data inicial do diário: start_date no primeiro carregamento, senão o dia seguinte ao since."""
+        if since is not None:
+            return (since + timedelta(days=1)).date().isoformat()
+        return start_date
+
+    # ---- interface ----
+    def fetch(self, ticker: str, interval: str, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+        _check_interval(interval)
+        raw = self._download(
+            ticker,
+            interval,
+            (start.isoformat(), end.isoformat()),
+            start=start,
+            end=end,
+            auto_adjust=False,
+            progress=False,
+            group_by=None,
+            threads=False,
+        )
+        if raw.empty:
+            return _empty()
+        df = _normalize_yf(raw)
+        return df[(df["timestamp"] >= start) & (df["timestamp"] < end)].reset_index(drop=True)
+
+    def fetch_since(self, ticker: str, interval: str, since: pd.Timestamp | None, start_daily: str) -> pd.DataFrame:
+        if interval == "1h":
+            return self.download_intraday_1h(ticker, since)
+        if interval == "1d":
+            return self.download_daily_1d(ticker, start_daily, since)
+        raise ValueError("INTERVAL deve ser '1h' ou '1d'.")
+
+    def fetch_many(self, coins: dict, interval: str, since_map: dict, workers: int) -> dict[str, pd.DataFrame]:
+        """
+        Download em lote; se a chamada multi-ticker falhar (ou deixar moedas de fora),
+        as restantes são baixadas individualmente no pool da classe base.
+        """
+        try:
+            frames = self.download_batch(coins, interval, since_map)
+        except Exception as e:
+            print(f"Download em lote falhou ({e}); baixando por ticker.")
+            frames = {}
+        pending = {name: coins[name] for name in coins if name not in frames}
+        if pending:
+            frames.update(super().fetch_many(pending, interval, since_map, workers))
+        return frames
+
+    # ---- downloads do ETL ----
+    def download_intraday_1h(self, ticker: str, since: pd.Timestamp | None) -> pd.DataFrame:
+        """
+        Baixa dados em 1h respeitando o limite de ~729 dias do Yahoo.
+        - Se since is None => últimos 729d
+        - Caso contrário, calcula a janela (since -> now) e cap 729d
+        """
+        days = self._lookback_days_1h(since)
+        raw = self._download(
+            ticker,
+            "1h",
+            self._window_1h(days),
+            period=f"{days}d",
+            auto_adjust=False,
+            progress=False,
+            group_by=None,
+            threads=False,
+        )
+        if raw.empty:
+            return raw
+
+        df = _normalize_yf(raw)
+        # Se since existir, filtra para evitar repetir candles
+        if since is not None:
+            df = df[df["timestamp"] > since]
+        return df
+
+    def download_daily_1d(self, ticker: str, start_date: str, since: pd.Timestamp | None) -> pd.DataFrame:
+        """
+        Baixa dados diários desde start_date. Se já houver dados, baixa a partir do próximo dia do since.
+        """
+        start = self._daily_start(start_date, since)
+        raw = self._download(
+            ticker,
+            "1d",
+            self._window_1d(start),
+            start=start,
+            auto_adjust=False,
+            progress=False,
+            group_by=None,
+        )
+        if raw.empty:
+            return raw
+
+        df = _normalize_yf(raw)
+        if since is not None:
+            df = df[df["timestamp"] > since]
+        return df
+
+    def download_batch(self, coins: dict, interval: str, since_map: dict) -> dict[str, pd.DataFrame]:
+        """
+        Baixa a janela de todas as moedas numa única chamada multi-ticker do yfinance.
+        A janela pedida é a maior entre as moedas; cada uma é depois filtrada pelo próprio since.
+        Retorna {nome: df normalizado}; moedas ausentes da resposta ficam de fora do dict.
+        """
+        common = dict(auto_adjust=False, progress=False, group_by="ticker", threads=True)
+        if interval == "1h":
+            days = max(self._lookback_days_1h(since_map.get(mid)) for (mid, _, _) in coins.values())
+            window = self._window_1h(days)
+            yf_kwargs = dict(period=f"{days}d", **common)
+        elif interval == "1d":
+            start = min(self._daily_start(start, since_map.get(mid)) for (mid, _, start) in coins.values())
+            window = self._window_1d(start)
+            yf_kwargs = dict(start=start, **common)
+        else:
+            raise ValueError("INTERVAL deve ser '1h' ou '1d'.")
+
+        # Respostas brutas por moeda: primeiro o cache, depois uma única chamada para o restante
+        raws: dict[str, pd.DataFrame] = {}
+        for name, (_, ticker, _) in coins.items():
+            hit = self._cache_lookup(ticker, interval, window)
+            if hit is not None:
+                raws[name] = hit
+        missing = [name for name in coins if name not in raws]
+        if missing and not self.replay:
+            self._throttle()
+            raw = yf.download([coins[name][1] for name in missing], interval=interval, **yf_kwargs)
+            if not raw.empty and isinstance(raw.columns, pd.MultiIndex):
+                present = set(raw.columns.get_level_values(0))
+                for name in missing:
+                    ticker = coins[name][1]
+                    if ticker in present:
+                        raws[name] = raw[ticker].copy()
+                        self._cache_store(ticker, interval, window, raws[name])
+
+        out: dict[str, pd.DataFrame] = {}
+        for name, sub in raws.items():
+            mid, _, start = coins[name]
+            df = _normalize_yf(sub)
+            since = since_map.get(mid)
+            if since is not None and not df.empty:
+                df = df[df["timestamp"] > since]
+            elif interval == "1d" and not df.empty:
+                # primeira carga: respeita o start_daily da própria moeda
+                df = df[df["timestamp"] >= pd.Timestamp(start, tz="UTC")]
+            out[name] = df
+        return out
@@ -85,7 +85,16 @@ ICON_HEART   = '<svg xmlns="http://www.w3.org/2000/svg" width="13" height="13" f
 ICON_REPOST  = '<svg xmlns="http://www.w3.org/2000/svg" width="13" height="13" fill="#64748b" viewBox="0 0 16 16"><path d="M11 5.466V4H5a4 4 0 0 0-3.584 5.777.5.5 0 1 1-.896.446A5 5 0 0 1 5 3h6V1.534a.25.25 0 0 1 .41-.192l2.36 1.966c.12.1.12.284 0 .384l-2.36 1.966a.25.25 0 0 1-.41-.192zm3.81 6.069a.5.5 0 0 1 .38.47V13a5 5 0 0 1-5 5H4v1.466a.25.25 0 0 1-.41.192l-2.36-1.966a.25.25 0 0 1 0-.384l2.36-1.966a.25.25 0 0 1 .41.192V13h6a4 4 0 0 0 3.585-5.777.5.5 0 0 1 .896-.447 5.049 5.049 0 0 1 .328 1.76z"/></svg>'
 ICON_CHAT    = '<svg xmlns="http://www.w3.org/2000/svg" width="16" height="16" fill="#9db1cb" viewBox="0 0 16 16"><path d="M2.678 11.894a1 1 0 0 1 .287.801 10.97 10.97 0 0 1-.398 2c1.395-.323 2.247-.697 2.634-.893a1 1 0 0 1 .71-.074A8.06 8.06 0 0 0 8 14c3.996 0 7-2.807 7-6 0-3.192-3.004-6-7-6S1 4.808 1 8c0 1.468.617 2.83 1.678 3.894zm-.493 3.905a21.682 21.682 0 0 1-.713.129c-.2.032-.352-.176-.273-.362a9.68 9.68 0 0 0 .244-.637l.003-.01c.248-.72.45-1.548.524-2.319C.743 11.37 0 9.76 0 8c0-3.866 3.582-7 8-7s8 3.134 8 7-3.582 7-8 7a9.06 9.06 0 0 1-2.347-.306c-.52.263-1.639.742-3.468 1.105z"/></svg>'
 
-def mostrar_feed_social():
+def buscar_feed_social():
+    """Resposta da API do X (ou None), separada da renderização para o prefetch."""
+    return _tentar_api_twitter()
+
+
+_BUSCAR = object()
+
+
+def mostrar_feed_social(dados_api=_BUSCAR):
+    """Feed social; `dados_api` permite passar a resposta da API já buscada (prefetch)."""
     st.markdown(f"""
         <div style='display:flex;align-items:center;gap:10px;margin-bottom:16px;'>
             {ICON_CHAT}
@@ -93,7 +102,8 @@ def mostrar_feed_social():
         </div>
     """, unsafe_allow_html=True)
 
-    dados_api = _tentar_api_twitter()
+    if dados_api is _BUSCAR:
+        dados_api = _tentar_api_twitter()
 
     if dados_api and dados_api.get("data"):
         tweets = dados_api["data"]
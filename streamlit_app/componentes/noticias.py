@@ -159,23 +159,44 @@ def _card(a: dict, fonte: str, emoji_fonte: str):
     """, unsafe_allow_html=True)
 
 
+def tarefas_noticias() -> dict:
+    """Uma tarefa por feed RSS, para a página buscar todos em paralelo (prefetch)."""
+    return {f"rss:{nome}": (lambda url=url: _buscar_rss(url)) for nome, url, _ in RSS_FEEDS}
+
+
+def juntar_noticias(dados) -> list:
+    """Artigos de todos os feeds a partir do resultado do prefetch (feeds com erro ficam de fora)."""
+    todos = []
+    for nome, _, emoji in RSS_FEEDS:
+        arts = dados.get(f"rss:{nome}") or []
+        for a in arts:
+            a["_fonte"] = nome
+            a["_emoji"] = emoji
+        todos += arts
+    return todos
+
+
 def mostrar_noticias_geopoliticas(
     max_articles: int = 6,
     titulo: str = "📰 Notícias",
     escopo: str = "cripto",
     layout_cols: int = 1,
+    artigos: list | None = None,
     **kwargs,
 ):
     st.markdown(f"### {titulo}")
 
-    with st.spinner("Buscando notícias..."):
-        todos = []
-        for nome, url, emoji in RSS_FEEDS:
-            arts = _buscar_rss(url)
-            for a in arts:
-                a["_fonte"] = nome
-                a["_emoji"] = emoji
-            todos += arts
+    if artigos is not None:
+        todos = artigos
+    else:
+        with st.spinner("Buscando notícias..."):
+            todos = []
+            for nome, url, emoji in RSS_FEEDS:
+                arts = _buscar_rss(url)
+                for a in arts:
+                    a["_fonte"] = nome
+                    a["_emoji"] = emoji
+                todos += arts
 
     if not todos:
         st.warning("Não foi possível carregar notícias agora. Verifique sua conexão.")
@@ -0,0 +1,363 @@
+# streamlit_app/database.py
+"""
+Camada única de acesso a dados do app.
+
+Um só engine (pool dimensionado por variáveis de ambiente, ver `consultas`)
+atende todas as páginas; as consultas ficam aqui, parametrizadas e em cache,
+para que páginas diferentes reaproveitem o mesmo resultado. As que não
+dependem do Streamlit moram em `consultas.py` (usado também pelo
+`train_models.py`) e aqui só ganham o cache. As séries de preço usadas pelos
+gráficos vêm do `PriceCache` (PRICE_CACHE_MB, PRICE_CACHE_REFRESH), que só
+busca velas novas.
+Leituras grandes de velas (gráficos e ML) passam pelo COPY binário de
+`pgcopy`, que decodifica direto em arrays NumPy tipados.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from sqlalchemy import text
+
+import consultas
+import indicadores as ind
+import pgcopy
+from consultas import COLUNAS_VELAS, DEFAULT_DB_URL, SELECT_VELAS
+from migrations import coluna_preco, tem_coluna, tem_tabela
+from price_cache import PriceCache
+
+# Cache de séries em memória (por processo): orçamento total e intervalo de refresh
+PRICE_CACHE_MB = float(os.getenv("PRICE_CACHE_MB", "64"))
+PRICE_CACHE_REFRESH = float(os.getenv("PRICE_CACHE_REFRESH", "60"))
+
+# Tabelas de velas por intervalo: 4h/1d vêm prontas dos rollups mantidos pelo ETL
+TABELAS_OHLC = {"1h": "precos", "4h": "precos_4h", "1d": "precos_1d"}
+# View do ETL que une 'precos' às velas diárias consolidadas pela retenção
+VIEW_PRECOS_TODOS = "precos_todos"
+
+
+# =========================
+# Conexão
+# =========================
+def database_url() -> str:
+    """DATABASE_URL do ambiente, depois secrets do Streamlit, depois o padrão local."""
+    url = os.getenv("DATABASE_URL")
+    if url:
+        return url
+    try:
+        if "DATABASE_URL" in st.secrets:
+            return st.secrets["DATABASE_URL"]
+        if "db" in st.secrets:
+            db = st.secrets["db"]
+            host = db.get("host", "localhost")
+            port = db.get("port", 5432)
+            return f"postgresql+psycopg2://{db['user']}:{db['password']}@{host}:{port}/{db['database']}"
+    except Exception:
+        pass
+    return DEFAULT_DB_URL
+
+
+@st.cache_resource(show_spinner=False)
+def get_engine():
+    """Engine compartilhado por todas as sessões do processo."""
+    return consultas.criar_engine(database_url())
+
+
+# =========================
+# Moedas
+# =========================
+@st.cache_data(ttl=60, show_spinner=False)
+def listar_moedas() -> pd.DataFrame:
+    """Moedas ativas com rótulo 'SÍMBOLO (Nome)'; sem tabela 'moedas', usa os ids de 'precos'."""
+    engine = get_engine()
+    try:
+        df = pd.read_sql_query(text("""
+            SELECT id,
+                   CASE
+                     WHEN COALESCE(simbolo,'')<>'' AND COALESCE(nome,'')<>'' THEN UPPER(simbolo)||' ('||nome||')'
+                     WHEN COALESCE(simbolo,'')<>'' THEN UPPER(simbolo)
+                     WHEN COALESCE(nome,'')<>'' THEN nome
+                     ELSE 'Moeda ' || id::text
+                   END AS label
+            FROM moedas
+            WHERE COALESCE(ativo, TRUE)=TRUE
+            ORDER BY UPPER(simbolo) NULLS LAST, nome NULLS LAST, id
+        """), engine)
+        if not df.empty:
+            return df[["id", "label"]]
+    except Exception:
+        pass
+    df = pd.read_sql_query(text("SELECT DISTINCT moeda_id AS id FROM precos ORDER BY 1"), engine)
+    df["label"] = df["id"].apply(lambda i: f"Moeda {int(i)}")
+    return df[["id", "label"]]
+
+
+def mapa_moedas() -> dict[str, int]:
+    """Rótulo -> id, no formato usado pelos selectbox das páginas."""
+    df = listar_moedas()
+    return {str(label): int(i) for i, label in zip(df["id"], df["label"])}
+
+
+# =========================
+# Preços
+# =========================
+@st.cache_data(ttl=30, show_spinner=False)
+def ultimo_preco(moeda_id: int) -> float | None:
+    engine = get_engine()
+    if tem_tabela(engine, "mercado_snapshot"):
+        with engine.connect() as conn:
+            px = conn.execute(text("SELECT preco_atual FROM mercado_snapshot WHERE moeda_id=:m"), {"m": moeda_id}).scalar()
+        if px is not None:
+            return float(px)
+    col = coluna_preco(engine)
+    if not col:
+        return None
+    q = text(f"SELECT {col} AS px FROM precos WHERE moeda_id=:m ORDER BY timestamp DESC LIMIT 1")
+    with engine.connect() as conn:
+        px = conn.execute(q, {"m": moeda_id}).scalar()
+    return float(px) if px is not None else None
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def resumo_moedas(moeda_ids: tuple[int, ...]) -> pd.DataFrame:
+    """
+    Estado de 24h de várias moedas: último preço e sua vela, preço de 24h antes
+    da última vela, variação, volume, máxima, mínima e volatilidade das últimas
+    24h. Vem de 'mercado_snapshot' (uma linha por moeda, mantida pelo ETL); em
+    bases sem o snapshot, calcula numa única consulta em 'precos' (sem volatilidade).
+    """
+    engine = get_engine()
+    colunas = ["moeda_id", "ts", "preco_atual", "preco_24h", "variacao_24h",
+               "volume_24h", "max_24h", "min_24h", "volatilidade_24h"]
+    if not moeda_ids:
+        return pd.DataFrame(columns=colunas).set_index("moeda_id")
+    ids = [int(i) for i in moeda_ids]
+    if tem_tabela(engine, "mercado_snapshot"):
+        q = text("""
+            SELECT m.id AS moeda_id, s.ts_ultima AS ts, s.preco_atual, s.preco_24h, s.variacao_24h,
+                   s.volume_24h, s.max_24h, s.min_24h, s.volatilidade_24h
+            FROM unnest(CAST(:ids AS int[])) AS m(id)
+            LEFT JOIN mercado_snapshot s ON s.moeda_id = m.id
+        """)
+        df = pd.read_sql_query(q, engine, params={"ids": ids})
+        df["ts"] = pd.to_datetime(df["ts"], utc=True, errors="coerce")
+        return df[colunas].set_index("moeda_id")
+    return _resumo_precos(engine, ids, colunas)
+
+
+def _resumo_precos(engine, ids: list[int], colunas: list[str]) -> pd.DataFrame:
+    """
+    Resumo a partir de 'precos'. Cada LATERAL é uma busca curta em
+    ix_precos_cobertura, então o custo não cresce com o histórico.
+    """
+    col = coluna_preco(engine)
+    if col is None:
+        return pd.DataFrame(columns=colunas).set_index("moeda_id")
+    high = "high" if tem_coluna(engine, "precos", "high") else col
+    low = "low" if tem_coluna(engine, "precos", "low") else col
+    volume = "volume" if tem_coluna(engine, "precos", "volume") else "NULL::float8"
+    q = text(f"""
+        SELECT m.id AS moeda_id, u.timestamp AS ts, u.px AS preco_atual, a.px AS preco_24h,
+               u.px / NULLIF(a.px, 0) - 1 AS variacao_24h,
+               j.volume_24h, j.max_24h, j.min_24h, NULL::float8 AS volatilidade_24h
+        FROM unnest(CAST(:ids AS int[])) AS m(id)
+        LEFT JOIN LATERAL (
+            SELECT timestamp, {col} AS px FROM precos
+            WHERE moeda_id = m.id ORDER BY timestamp DESC LIMIT 1
+        ) u ON TRUE
+        LEFT JOIN LATERAL (
+            SELECT {col} AS px FROM precos
+            WHERE moeda_id = m.id AND timestamp <= u.timestamp - INTERVAL '24 hours'
+            ORDER BY timestamp DESC LIMIT 1
+        ) a ON TRUE
+        LEFT JOIN LATERAL (
+            SELECT SUM({volume}) AS volume_24h, MAX({high}) AS max_24h, MIN({low}) AS min_24h
+            FROM precos
+            WHERE moeda_id = m.id AND timestamp > u.timestamp - INTERVAL '24 hours'
+        ) j ON TRUE
+    """)
+    df = pd.read_sql_query(q, engine, params={"ids": ids})
+    df["ts"] = pd.to_datetime(df["ts"], utc=True, errors="coerce")
+    return df[colunas].set_index("moeda_id")
+
+
+def _tabela_ohlc(engine, intervalo: str) -> str:
+    """Tabela do intervalo; para 1h, a view com o histórico consolidado quando existe."""
+    tabela = TABELAS_OHLC[intervalo]
+    if tabela == "precos" and tem_tabela(engine, VIEW_PRECOS_TODOS):
+        return VIEW_PRECOS_TODOS
+    return tabela
+
+
+def _buscar_precos_desde(moeda_id: int, desde_ns: int | None, janela_ns: int | None = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    (epoch ns, close) das velas horárias da moeda a partir de `desde_ns`
+    (inclusive); sem ele, as velas até `janela_ns` antes da última, ou todo o
+    histórico de 'precos'. As velas diárias de 'precos_historico' ficam de
+    fora: a série do cache tem uma só granularidade.
+    """
+    engine = get_engine()
+    col_preco = coluna_preco(engine)
+    if col_preco is None:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+    filtro = ""
+    params = {"m": int(moeda_id)}
+    if desde_ns is not None:
+        filtro = "AND timestamp >= %(desde)s"
+        params["desde"] = pd.Timestamp(desde_ns, tz="UTC").to_pydatetime()
+    elif janela_ns is not None:
+        filtro = f"""AND timestamp >= (SELECT MAX(timestamp) FROM precos WHERE moeda_id = %(m)s)
+                                     - make_interval(secs => %(janela)s)"""
+        params["janela"] = janela_ns / 1e9
+    cols = [("timestamp", "timestamptz"), ("close", "float8")]
+    out = pgcopy.copy_select(engine, f"""
+        SELECT timestamp, {col_preco}::float8 AS close
+        FROM precos
+        WHERE moeda_id = %(m)s AND {col_preco} IS NOT NULL {filtro}
+        ORDER BY timestamp
+    """, params, cols)
+    return out["timestamp"], out["close"]
+
+
+def _versao_historico(moeda_id: int):
+    """
+    Última vela diária consolidada da moeda; muda quando a retenção dobra
+    horas antigas (e as apaga de 'precos'), o que recarrega a série do cache.
+    """
+    engine = get_engine()
+    if not tem_tabela(engine, "precos_historico"):
+        return None
+    with engine.connect() as conn:
+        return conn.execute(
+            text("SELECT MAX(timestamp) FROM precos_historico WHERE moeda_id = :m"), {"m": int(moeda_id)}
+        ).scalar()
+
+
+@st.cache_resource(show_spinner=False)
+def get_price_cache() -> PriceCache:
+    """Cache de séries do processo (refresh incremental, LRU por memória)."""
+    return PriceCache(
+        _buscar_precos_desde,
+        max_bytes=int(PRICE_CACHE_MB * 1024 * 1024),
+        refresh_seconds=PRICE_CACHE_REFRESH,
+        versao=_versao_historico,
+    )
+
+
+def carregar_serie_preco(moeda_id: int, janela: pd.Timedelta | None = None) -> pd.DataFrame:
+    """
+    Série horária (timestamp, close) da moeda vinda do cache de preços; com
+    `janela`, só o trecho até a última vela.
+    """
+    janela_ns = pd.Timedelta(janela).value if janela is not None else None
+    ts, close = get_price_cache().get(int(moeda_id), janela_ns)
+    return pd.DataFrame({"timestamp": pd.to_datetime(ts, utc=True), "close": close})
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def ultimas_velas(moeda_id: int, limit: int = 2000) -> pd.DataFrame:
+    """Últimas `limit` velas OHLCV (ordem cronológica), buscadas só nas partições recentes."""
+    return consultas.ultimas_velas(get_engine(), moeda_id, limit)
+
+
+def iterar_velas(moeda_id: int, dt_ini, dt_fim, passo: pd.Timedelta = pd.Timedelta(days=31)):
+    """Velas 1h de [dt_ini, dt_fim) em blocos de `passo` (ver `consultas.iterar_velas`)."""
+    return consultas.iterar_velas(get_engine(), moeda_id, dt_ini, dt_fim, passo)
+
+
+def _resample_ohlc(df: pd.DataFrame, regra: str) -> pd.DataFrame:
+    if regra == "1h":
+        return df
+    rule = "4h" if regra == "4h" else "1D"
+    dfi = df.set_index("timestamp")
+    agg = {"open":"first","high":"max","low":"min","close":"last","volume":"sum"}
+    out = dfi.resample(rule).agg(agg).dropna(subset=["open","high","low","close"]).reset_index()
+    return out
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def carregar_ohlc(moeda_id: int, dt_ini: pd.Timestamp, dt_fim: pd.Timestamp, intervalo: str = "1h") -> pd.DataFrame:
+    """
+    Velas de [dt_ini, dt_fim] no intervalo pedido; sem rollup no banco, reamostra
+    as de 1h. Em 1h, trechos já consolidados pela retenção vêm como velas diárias.
+    """
+    engine = get_engine()
+    tabela = _tabela_ohlc(engine, intervalo)
+    if tabela not in ("precos", VIEW_PRECOS_TODOS) and not tem_tabela(engine, tabela):
+        return _resample_ohlc(carregar_ohlc(moeda_id, dt_ini, dt_fim), intervalo)
+    out = pgcopy.copy_select(engine, f"""
+        SELECT {SELECT_VELAS}
+        FROM {tabela}
+        WHERE moeda_id = %(m)s
+          AND timestamp BETWEEN %(ini)s AND %(fim)s
+          AND open IS NOT NULL AND high IS NOT NULL AND low IS NOT NULL AND close IS NOT NULL
+        ORDER BY timestamp
+    """, {"m": int(moeda_id), "ini": pd.Timestamp(dt_ini).to_pydatetime(), "fim": pd.Timestamp(dt_fim).to_pydatetime()},
+        COLUNAS_VELAS)
+    return pgcopy.to_frame(out, COLUNAS_VELAS)
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def carregar_indicadores(moeda_id: int, dt_ini: pd.Timestamp, dt_fim: pd.Timestamp,
+                         indicadores: tuple[str, ...], intervalo: str = "1h") -> pd.DataFrame:
+    """
+    timestamp + os indicadores pedidos (ver `indicadores.py`) em [dt_ini, dt_fim],
+    calculados no banco com funções de janela. Em 1h lê só 'precos' (nunca a
+    view com as velas diárias consolidadas, que misturaria granularidades nas
+    janelas). Sem rollup para o intervalo, calcula em pandas sobre as velas
+    reamostradas.
+    """
+    engine = get_engine()
+    nomes = list(indicadores)
+    tabela = TABELAS_OHLC[intervalo]
+    if tabela != "precos" and not tem_tabela(engine, tabela):
+        # Aquecimento folgado (2x) em tempo para as primeiras janelas
+        passo = {"4h": pd.Timedelta(hours=4), "1d": pd.Timedelta(days=1)}[intervalo]
+        ini = pd.Timestamp(dt_ini)
+        velas = carregar_ohlc(moeda_id, ini - 2 * ind.aquecimento(nomes) * passo, dt_fim, intervalo)
+        df = ind.calcular_pandas(velas, nomes)
+        return df[df["timestamp"] >= ini].reset_index(drop=True)
+    cols = [("timestamp", "timestamptz")] + [(n, "float8") for n in nomes]
+    out = pgcopy.copy_select(
+        engine, ind.montar_sql(tabela, nomes),
+        {"m": int(moeda_id), "ini": pd.Timestamp(dt_ini).to_pydatetime(), "fim": pd.Timestamp(dt_fim).to_pydatetime()},
+        cols,
+    )
+    return pgcopy.to_frame(out, cols)
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def ultimo_indicador(moeda_id: int, nome: str) -> float | None:
+    """Valor do indicador (1h) na última vela com valor das últimas 24h; usado pelos alertas."""
+    dt_fim = pd.Timestamp.now(tz="UTC")
+    df = carregar_indicadores(int(moeda_id), dt_fim - pd.Timedelta(days=1), dt_fim, (nome,))
+    valores = df[nome].dropna()
+    return float(valores.iloc[-1]) if not valores.empty else None
+
+
+# =========================
+# Eventos geopolíticos
+# =========================
+@st.cache_data(ttl=30, show_spinner=False)
+def carregar_eventos(limit: int = 500) -> pd.DataFrame:
+    """Eventos mais recentes; sem a tabela, um frame vazio com as mesmas colunas."""
+    return consultas.carregar_eventos(get_engine(), limit)
+
+
+# =========================
+# Previsões
+# =========================
+@st.cache_data(ttl=60, show_spinner=False)
+def carregar_previsoes(moeda_id: int, limit: int = 20) -> pd.DataFrame:
+    return consultas.carregar_previsoes(get_engine(), moeda_id, limit)
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def ultima_previsao(moeda_id: int, horizonte_h: int) -> float | None:
+    return consultas.ultima_previsao(get_engine(), moeda_id, horizonte_h)
+
+
+def limpar_cache_previsoes():
+    """Invalida as leituras de 'previsoes' depois de gravar novas previsões."""
+    carregar_previsoes.clear()
+    ultima_previsao.clear()
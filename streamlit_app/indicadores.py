@@ -0,0 +1,221 @@
+# streamlit_app/indicadores.py
+"""
+Indicadores técnicos calculados no Postgres com funções de janela, para
+páginas que só precisam de poucas colunas (sem trazer o OHLCV inteiro).
+
+Nomes e fórmulas seguem o `ml.features.FeatureEngine`, por linha (vela):
+
+    return_{N}d       close / close[-N] - 1                 (pct_change(N))
+    log_return_{N}d   ln(close / close[-N])
+    sma_{N}           média de close em N linhas            (rolling(N).mean())
+    std_{N}           desvio amostral de close em N linhas  (rolling(N).std())
+    volatility_{N}d   desvio amostral de return_1d em N linhas
+    {col}_min_{N}     mínimo de col em N linhas, ex. low_min_14
+    {col}_max_{N}     máximo de col em N linhas, ex. high_max_14
+
+Como no pandas, a janela só tem valor com N observações não nulas; antes
+disso sai NaN. As colunas base (open, high, low, close, volume) também
+podem ser pedidas. `calcular_pandas` é a referência em pandas usada quando
+não há tabela para o intervalo pedido.
+
+Paridade com o banco: `python indicadores.py [moeda_id ...]` compara o SQL
+de `montar_sql` com `calcular_pandas` e com o `FeatureEngine` em cada moeda
+(histórico inteiro e últimos 30 dias) e sai com 1 se algo divergir.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+COLUNAS_BASE = ("open", "high", "low", "close", "volume")
+
+_PADROES = [
+    ("return", re.compile(r"^return_(\d+)d$")),
+    ("log_return", re.compile(r"^log_return_(\d+)d$")),
+    ("sma", re.compile(r"^sma_(\d+)$")),
+    ("std", re.compile(r"^std_(\d+)$")),
+    ("volatility", re.compile(r"^volatility_(\d+)d$")),
+    ("min", re.compile(r"^(open|high|low|close|volume)_min_(\d+)$")),
+    ("max", re.compile(r"^(open|high|low|close|volume)_max_(\d+)$")),
+]
+
+
+def parse(nome: str) -> tuple[str, str, int]:
+    """(tipo, coluna, N) do indicador; ValueError se o nome não é suportado."""
+    if nome in COLUNAS_BASE:
+        return "base", nome, 0
+    for tipo, padrao in _PADROES:
+        m = padrao.match(nome)
+        if m:
+            if tipo in ("min", "max"):
+                col, n = m.group(1), int(m.group(2))
+            else:
+                col, n = "close", int(m.group(1))
+            if n < 1:
+                break
+            return tipo, col, n
+    raise ValueError(f"indicador não suportado: {nome}")
+
+
+def aquecimento(indicadores: list[str]) -> int:
+    """Linhas anteriores ao início do intervalo necessárias para a primeira janela."""
+    linhas = 0
+    for nome in indicadores:
+        tipo, _, n = parse(nome)
+        if tipo in ("return", "log_return", "volatility"):
+            linhas = max(linhas, n)
+        elif tipo != "base":
+            linhas = max(linhas, n - 1)
+    return linhas
+
+
+def _janela(n: int) -> str:
+    return f"(ORDER BY timestamp ROWS BETWEEN {n - 1} PRECEDING AND CURRENT ROW)"
+
+
+def _expr(nome: str) -> str:
+    tipo, col, n = parse(nome)
+    if tipo == "base":
+        return col
+    if tipo == "return":
+        return f"close / LAG(close, {n}) OVER (ORDER BY timestamp) - 1"
+    if tipo == "log_return":
+        return f"LN(close / LAG(close, {n}) OVER (ORDER BY timestamp))"
+    w = _janela(n)
+    if tipo == "volatility":
+        return f"CASE WHEN COUNT(_r1) OVER {w} = {n} THEN STDDEV_SAMP(_r1) OVER {w} END"
+    agg = {"sma": "AVG", "std": "STDDEV_SAMP", "min": "MIN", "max": "MAX"}[tipo]
+    return f"CASE WHEN COUNT({col}) OVER {w} = {n} THEN {agg}({col}) OVER {w} END"
+
+
+def montar_sql(tabela: str, indicadores: list[str]) -> str:
+    """
+    SELECT (parâmetros psycopg2 %(m)s, %(ini)s, %(fim)s) com timestamp e os
+    indicadores pedidos para [ini, fim]. As linhas de aquecimento antes de
+    `ini` entram nas janelas mas não no resultado (se houver menos que o
+    necessário, entram todas); NULL sai como NaN, pronto para o COPY binário.
+    `tabela` deve ter uma só granularidade de vela (não a view 'precos_todos').
+    """
+    aquec = aquecimento(indicadores)
+    inicio = "%(ini)s"
+    if aquec:
+        inicio = f"""COALESCE((
+                SELECT timestamp FROM {tabela}
+                WHERE moeda_id = %(m)s AND timestamp < %(ini)s
+                ORDER BY timestamp DESC OFFSET {aquec - 1} LIMIT 1
+            ), '-infinity')"""
+    calc = ",\n               ".join(f"({_expr(nome)})::float8 AS {nome}" for nome in indicadores)
+    saida = ", ".join(f"COALESCE({nome}, 'NaN') AS {nome}" for nome in indicadores)
+    return f"""
+        WITH base AS (
+            SELECT timestamp, open::float8, high::float8, low::float8, close::float8, volume::float8,
+                   close::float8 / LAG(close::float8) OVER (ORDER BY timestamp) - 1 AS _r1
+            FROM {tabela}
+            WHERE moeda_id = %(m)s AND timestamp <= %(fim)s AND timestamp >= {inicio}
+        ), ind AS (
+            SELECT timestamp,
+               {calc}
+            FROM base
+        )
+        SELECT timestamp, {saida}
+        FROM ind
+        WHERE timestamp >= %(ini)s
+        ORDER BY timestamp
+    """
+
+
+def calcular_pandas(df: pd.DataFrame, indicadores: list[str]) -> pd.DataFrame:
+    """Mesmos indicadores a partir de um OHLCV em pandas (ordem cronológica)."""
+    out = pd.DataFrame({"timestamp": df["timestamp"].to_numpy()})
+    close = df["close"].astype("float64").reset_index(drop=True)
+    for nome in indicadores:
+        tipo, col, n = parse(nome)
+        serie = df[col].astype("float64").reset_index(drop=True)
+        if tipo == "base":
+            out[nome] = serie
+        elif tipo == "return":
+            out[nome] = close.pct_change(n)
+        elif tipo == "log_return":
+            out[nome] = np.log(close / close.shift(n))
+        elif tipo == "volatility":
+            out[nome] = close.pct_change(1).rolling(n).std()
+        elif tipo == "sma":
+            out[nome] = serie.rolling(n).mean()
+        elif tipo == "std":
+            out[nome] = serie.rolling(n).std()
+        elif tipo == "min":
+            out[nome] = serie.rolling(n).min()
+        else:
+            out[nome] = serie.rolling(n).max()
+    return out
+
+
+def verificar_paridade(engine, moeda_id: int, indicadores: list[str], ini, fim,
+                       tabela: str = "precos", rtol: float = 1e-9) -> list[str]:
+    """
+    Roda `montar_sql` no banco e compara com `calcular_pandas` e com o
+    `FeatureEngine` sobre todas as velas da moeda até `fim`. Devolve as
+    divergências encontradas (lista vazia = paridade).
+    """
+    import pgcopy
+    from ml.features import FeatureEngine
+
+    params = {"m": int(moeda_id), "ini": pd.Timestamp(ini).to_pydatetime(), "fim": pd.Timestamp(fim).to_pydatetime()}
+    cols = [("timestamp", "timestamptz")] + [(n, "float8") for n in indicadores]
+    sql = pgcopy.to_frame(pgcopy.copy_select(engine, montar_sql(tabela, indicadores), params, cols), cols)
+
+    cols_velas = [("timestamp", "timestamptz")] + [(c, "float8") for c in COLUNAS_BASE]
+    velas = pgcopy.to_frame(pgcopy.copy_select(engine, f"""
+        SELECT timestamp, {", ".join(f"COALESCE({c}::float8, 'NaN') AS {c}" for c in COLUNAS_BASE)}
+        FROM {tabela}
+        WHERE moeda_id = %(m)s AND timestamp <= %(fim)s
+        ORDER BY timestamp
+    """, params, cols_velas), cols_velas)
+
+    erros = []
+    ref = calcular_pandas(velas, indicadores)
+    ref = ref[ref["timestamp"] >= pd.Timestamp(ini)].reset_index(drop=True)
+    if len(ref) != len(sql) or not (ref["timestamp"].to_numpy() == sql["timestamp"].to_numpy()).all():
+        return [f"moeda {moeda_id}: {len(sql)} linha(s) no SQL, {len(ref)} no pandas"]
+    for nome in indicadores:
+        a, b = sql[nome].to_numpy(), ref[nome].to_numpy()
+        if not np.allclose(a, b, rtol=rtol, atol=0, equal_nan=True):
+            erros.append(f"moeda {moeda_id}: {nome} diverge do pandas em {int((~np.isclose(a, b, rtol=rtol, atol=0, equal_nan=True)).sum())} linha(s)")
+
+    # Contra o FeatureEngine, nas colunas que ele também gera (linhas que sobram do dropna)
+    fe = FeatureEngine().create_all_features(velas)
+    comuns = [n for n in indicadores if n in fe.columns and n not in COLUNAS_BASE]
+    m = sql.merge(fe[["timestamp"] + comuns], on="timestamp", suffixes=("", "_fe"))
+    for nome in comuns:
+        if not np.allclose(m[nome], m[f"{nome}_fe"], rtol=rtol, atol=0, equal_nan=True):
+            erros.append(f"moeda {moeda_id}: {nome} diverge do FeatureEngine")
+    return erros
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+
+    from sqlalchemy import create_engine, text
+
+    from migrations import DEFAULT_DB_URL
+
+    nomes = ["close", "return_1d", "return_7d", "log_return_1d", "log_return_7d", "sma_7", "sma_200",
+             "std_20", "volatility_7d", "volatility_30d", "low_min_14", "high_max_14"]
+    eng = create_engine(os.getenv("DATABASE_URL", DEFAULT_DB_URL), pool_pre_ping=True)
+    with eng.connect() as conn:
+        faixas = conn.execute(text(
+            "SELECT moeda_id, MIN(timestamp), MAX(timestamp) FROM precos GROUP BY moeda_id ORDER BY moeda_id"
+        )).all()
+    pedidas = {int(a) for a in sys.argv[1:]}
+    falhas = []
+    for moeda_id, primeira, ultima in faixas:
+        if pedidas and moeda_id not in pedidas:
+            continue
+        # Histórico inteiro (aquecimento incompleto no início) e últimos 30 dias
+        for ini in (primeira, max(primeira, ultima - pd.Timedelta(days=30))):
+            falhas += verificar_paridade(eng, moeda_id, nomes, ini, ultima)
+    for f in falhas:
+        print(f)
+    print("paridade ok" if not falhas else f"{len(falhas)} divergência(s)")
+    sys.exit(1 if falhas else 0)
@@ -0,0 +1,111 @@
+"""
+Leitura do dataset Parquet exportado por scripts/export_parquet.py
+Caminho de leitura para treino offline (histórico completo, sem o Postgres)
+"""
+import os
+import pandas as pd
+
+try:
+    import duckdb
+    HAS_DUCKDB = True
+except ImportError:
+    HAS_DUCKDB = False
+
+import pyarrow.dataset as ds
+
+DEFAULT_DATASET_DIR = os.getenv(
+    "PARQUET_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data", "parquet"),
+)
+
+PRICE_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+
+
+def _utc(ts):
+    ts = pd.Timestamp(ts)
+    return ts.tz_localize('UTC') if ts.tzinfo is None else ts.tz_convert('UTC')
+
+
+def _month_bounds(start, end):
+    """Faixa de partições 'mes=YYYY-MM' que cobre [start, end)"""
+    lo = _utc(start).strftime('%Y-%m') if start is not None else None
+    hi = _utc(end).strftime('%Y-%m') if end is not None else None
+    return lo, hi
+
+
+def load_prices(moeda_id: int, start=None, end=None, root: str = DEFAULT_DATASET_DIR,
+                engine: str = 'auto', table: str = 'precos') -> pd.DataFrame:
+    """
+    Carrega OHLCV de uma moeda do dataset particionado, no formato esperado
+    pelo FeatureEngine (timestamp, open, high, low, close, volume, moeda_id).
+
+    Os filtros de moeda_id e mês podam as partições e o de timestamp é
+    empurrado para a leitura dos row groups.
+
+    Args:
+        moeda_id: ID da moeda
+        start, end: intervalo [start, end) opcional
+        root: diretório raiz do dataset
+        engine: 'duckdb', 'pyarrow' ou 'auto' (DuckDB se instalado)
+        table: 'precos' (velas horárias) ou 'precos_historico' (velas diárias
+            dos períodos já consolidados pela retenção; não é misturada às horárias)
+
+    Returns:
+        DataFrame ordenado por timestamp
+    """
+    path = os.path.join(root, table)
+    if not os.path.isdir(path):
+        return pd.DataFrame(columns=PRICE_COLUMNS + ['moeda_id'])
+    lo, hi = _month_bounds(start, end)
+
+    if engine == 'duckdb' or (engine == 'auto' and HAS_DUCKDB):
+        where = ["moeda_id = ?"]
+        params = [int(moeda_id)]
+        if lo is not None:
+            where += ["mes >= ?", "timestamp >= ?"]
+            params += [lo, _utc(start).to_pydatetime()]
+        if hi is not None:
+            where += ["mes <= ?", "timestamp < ?"]
+            params += [hi, _utc(end).to_pydatetime()]
+        glob = os.path.join(path, '**', '*.parquet')
+        q = f"""
+            SELECT {', '.join(PRICE_COLUMNS)}, moeda_id
+            FROM read_parquet(?, hive_partitioning = true)
+            WHERE {' AND '.join(where)}
+            ORDER BY timestamp
+        """
+        con = duckdb.connect()
+        try:
+            df = con.execute(q, [glob] + params).df()
+        finally:
+            con.close()
+    else:
+        dataset = ds.dataset(path, format='parquet', partitioning='hive')
+        expr = ds.field('moeda_id') == int(moeda_id)
+        if lo is not None:
+            expr = expr & (ds.field('mes') >= lo) & (ds.field('timestamp') >= _utc(start))
+        if hi is not None:
+            expr = expr & (ds.field('mes') <= hi) & (ds.field('timestamp') < _utc(end))
+        df = dataset.to_table(columns=PRICE_COLUMNS + ['moeda_id'], filter=expr).to_pandas().sort_values('timestamp')
+
+    df['timestamp'] = pd.to_datetime(df['timestamp'], utc=True)
+    df['moeda_id'] = df['moeda_id'].astype('int64')
+    return df.reset_index(drop=True)
+
+
+def load_events(start=None, end=None, root: str = DEFAULT_DATASET_DIR) -> pd.DataFrame:
+    """Carrega eventos geopolíticos do dataset (poda por mês, filtro por timestamp)"""
+    path = os.path.join(root, 'eventos_geopoliticos')
+    if not os.path.isdir(path):
+        return pd.DataFrame()
+    lo, hi = _month_bounds(start, end)
+    dataset = ds.dataset(path, format='parquet', partitioning='hive')
+    expr = None
+    if lo is not None:
+        expr = (ds.field('mes') >= lo) & (ds.field('timestamp') >= _utc(start))
+    if hi is not None:
+        cond = (ds.field('mes') <= hi) & (ds.field('timestamp') < _utc(end))
+        expr = cond if expr is None else expr & cond
+    df = dataset.to_table(filter=expr).to_pandas().drop(columns=['mes'], errors='ignore')
+    df['timestamp'] = pd.to_datetime(df['timestamp'], utc=True)
+    return df.sort_values('timestamp', ascending=False).reset_index(drop=True)
@@ -2,15 +2,291 @@
 Engenharia de Features Avançada para Previsão de Criptomoedas
 Inclui features técnicas, de volatilidade, tendência e momentum
 """
+import tracemalloc
 import numpy as np
 import pandas as pd
-from typing import Tuple
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+
+def _as_ns(ts: pd.Series) -> np.ndarray:
+    """Timestamps (naive ou tz-aware) como epoch em ns (int64; NaT vira o mínimo de int64)."""
+    return pd.DatetimeIndex(ts).asi8
+
+
+class _FeatureBlock:
+    """
+    Destino das features no modo compacto: cada coluna nova é gravada direto
+    num bloco pré-alocado (float32, ordem Fortran, uma coluna contígua por
+    feature) em vez de ser inserida no DataFrame. Colunas já gravadas são lidas
+    de volta como Series float64 alinhadas ao frame base; as marcadas com
+    float64 no registro (entradas de contas com cancelamento, como distância
+    das médias, MACD e Bollinger) guardam também uma cópia float64, para não
+    herdar o arredondamento float32.
+    """
+
+    def __init__(self, base: pd.DataFrame, names: list, dtype=np.float32):
+        self.base = base
+        self.names = list(names)
+        self.pos = {n: i for i, n in enumerate(self.names)}
+        self.block = np.full((len(base), len(self.names)), np.nan, dtype=dtype, order='F')
+        self.exact = {n: None for n in self.names if n in FEATURES and FEATURES[n].float64}
+
+    def __getitem__(self, name: str) -> pd.Series:
+        if self.exact.get(name) is not None:
+            return pd.Series(self.exact[name], index=self.base.index)
+        if name in self.pos:
+            return pd.Series(self.block[:, self.pos[name]], index=self.base.index, dtype='float64')
+        return self.base[name]
+
+    def __setitem__(self, name: str, values):
+        values = np.asarray(values, dtype='float64')
+        self.block[:, self.pos[name]] = values
+        if name in self.exact:
+            self.exact[name] = values
+
+
+class _Panel:
+    """
+    Painel (tempo x moeda) para o cálculo em lote: cada coluna é um DataFrame
+    L x C (uma coluna por moeda), então os rolling/ewm/shift do pipeline rodam
+    em todas as moedas de uma vez. As séries ficam alinhadas à direita (a
+    última vela de cada moeda na última linha, NaN antes do início), de modo
+    que as janelas por linha enxergam exatamente as mesmas velas do cálculo
+    por moeda.
+    """
+
+    def __init__(self, df: pd.DataFrame, fields=('open', 'high', 'low', 'close', 'volume')):
+        ids = df['moeda_id'].to_numpy()
+        self.moedas, col, counts = np.unique(ids, return_inverse=True, return_counts=True)
+        self.length = int(counts.max()) if len(counts) else 0
+        # df já vem ordenado por (moeda_id, timestamp): posição dentro da moeda, alinhada à direita
+        start = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        row = np.arange(len(df)) - start[col] + (self.length - counts[col])
+        self.rows, self.cols = row, col
+        self.valid = np.zeros((self.length, len(self.moedas)), dtype=bool)
+        self.valid[row, col] = True
+        self.data = {}
+        for f in fields:
+            arr = np.full((self.length, len(self.moedas)), np.nan)
+            arr[row, col] = df[f].to_numpy(dtype='float64')
+            self.data[f] = pd.DataFrame(arr, columns=self.moedas)
+
+    def __getitem__(self, name: str) -> pd.DataFrame:
+        return self.data[name]
+
+    def __setitem__(self, name: str, values):
+        self.data[name] = values
+
+    def long(self, name: str) -> np.ndarray:
+        """Coluna no formato longo, na ordem (moeda_id, timestamp) do df de entrada"""
+        return self.data[name].to_numpy()[self.rows, self.cols]
+
+
+class FeatureSpec(NamedTuple):
+    """
+    Declaração de uma feature do pipeline.
+
+    group: grupo do create_all_features (returns, volatility, technical, momentum, volume, temporal, geo)
+    deps: colunas base ou outras features (nomes com '_' são intermediários que não viram coluna)
+    window: linhas próprias de aquecimento, além do aquecimento das dependências
+    fn: fn(d) -> valores, lendo as dependências de d; None nas geopolíticas, calculadas em bloco
+    cumulative: depende de todo o histórico desde a primeira vela (OBV, VWAP)
+    float64: entra em contas com cancelamento (diferenças entre valores próximos, EMA do OBV que
+        cruza zero); no modo compacto é lida de volta em float64
+    """
+    group: str
+    deps: Tuple[str, ...]
+    window: int
+    fn: Optional[Callable]
+    cumulative: bool = False
+    float64: bool = False
+
+
+# EMAs não têm janela finita: o aquecimento declarado é o número de linhas até o
+# peso de tudo o que veio antes (a semente) cair abaixo de EMA_TOL. O erro da EMA
+# nesse ponto é no máximo EMA_TOL x |semente - EMA do histórico completo|
+EMA_TOL = 1e-4
+
+
+def _ema_warmup(span: int) -> int:
+    """Linhas até (1 - alpha)^k < EMA_TOL, com alpha = 2 / (span + 1) como no ewm(adjust=False)"""
+    return int(np.ceil(np.log(EMA_TOL) / np.log(1 - 2 / (span + 1))))
+
+GROUPS = ('returns', 'volatility', 'technical', 'momentum', 'volume', 'temporal', 'geo')
+
+# Registro na ordem das colunas do create_all_features
+FEATURES: Dict[str, FeatureSpec] = {}
+
+
+def _feature(name: str, group: str, deps: Tuple[str, ...], window: int, fn: Optional[Callable],
+             cumulative: bool = False, float64: bool = False):
+    FEATURES[name] = FeatureSpec(group, tuple(deps), window, fn, cumulative, float64)
+
+
+def _true_range(d):
+    high_low = d['high'] - d['low']
+    high_close = np.abs(d['high'] - d['close'].shift())
+    low_close = np.abs(d['low'] - d['close'].shift())
+    return np.fmax(np.fmax(high_low, high_close), low_close)  # máximo ignorando NaN, elemento a elemento
+
+
+# Retornos simples e log (mais estáveis)
+for _p in [1, 3, 7, 14, 30]:
+    _feature(f'return_{_p}d', 'returns', ('close',), _p, lambda d, p=_p: d['close'].pct_change(p))
+for _p in [1, 7]:
+    _feature(f'log_return_{_p}d', 'returns', ('close',), _p,
+             lambda d, p=_p: np.log(d['close'] / d['close'].shift(p)))
+
+# Volatilidade histórica, ATR e amplitude intradiária
+for _w in [7, 14, 30]:
+    _feature(f'volatility_{_w}d', 'volatility', ('return_1d',), _w - 1,
+             lambda d, w=_w: d['return_1d'].rolling(w).std())
+_feature('_tr', 'volatility', ('high', 'low', 'close'), 0, _true_range)
+_feature('atr_14', 'volatility', ('_tr',), 13, lambda d: d['_tr'].rolling(14).mean())
+_feature('daily_range', 'volatility', ('high', 'low', 'close'), 0, lambda d: (d['high'] - d['low']) / d['close'])
+_feature('avg_range_7d', 'volatility', ('daily_range',), 6, lambda d: d['daily_range'].rolling(7).mean())
+
+# Médias móveis e distância das médias (tendência)
+for _w in [7, 14, 21, 50, 200]:
+    _feature(f'sma_{_w}', 'technical', ('close',), _w - 1, lambda d, w=_w: d['close'].rolling(w).mean(),
+             float64=_w in (7, 21, 50))
+    _feature(f'ema_{_w}', 'technical', ('close',), _ema_warmup(_w),
+             lambda d, w=_w: d['close'].ewm(span=w, adjust=False).mean())
+for _w in [7, 21, 50]:
+    _feature(f'distance_sma{_w}', 'technical', ('close', f'sma_{_w}'), 0,
+             lambda d, w=_w: (d['close'] - d[f'sma_{w}']) / d[f'sma_{w}'])
+
+# MACD
+_feature('_ema12', 'technical', ('close',), _ema_warmup(12), lambda d: d['close'].ewm(span=12, adjust=False).mean())
+_feature('_ema26', 'technical', ('close',), _ema_warmup(26), lambda d: d['close'].ewm(span=26, adjust=False).mean())
+_feature('macd', 'technical', ('_ema12', '_ema26'), 0, lambda d: d['_ema12'] - d['_ema26'], float64=True)
+_feature('macd_signal', 'technical', ('macd',), _ema_warmup(9), lambda d: d['macd'].ewm(span=9, adjust=False).mean(),
+         float64=True)
+_feature('macd_histogram', 'technical', ('macd', 'macd_signal'), 0, lambda d: d['macd'] - d['macd_signal'])
+
+# RSI
+_feature('_delta', 'technical', ('close',), 1, lambda d: d['close'].diff())
+_feature('_gain', 'technical', ('_delta',), 13, lambda d: (d['_delta'].where(d['_delta'] > 0, 0)).rolling(window=14).mean())
+_feature('_loss', 'technical', ('_delta',), 13, lambda d: (-d['_delta'].where(d['_delta'] < 0, 0)).rolling(window=14).mean())
+_feature('rsi_14', 'technical', ('_gain', '_loss'), 0, lambda d: 100 - (100 / (1 + d['_gain'] / d['_loss'])))
+
+# Bollinger Bands
+_feature('_sma20', 'technical', ('close',), 19, lambda d: d['close'].rolling(20).mean())
+_feature('_std20', 'technical', ('close',), 19, lambda d: d['close'].rolling(20).std())
+_feature('bb_upper', 'technical', ('_sma20', '_std20'), 0, lambda d: d['_sma20'] + (d['_std20'] * 2), float64=True)
+_feature('bb_lower', 'technical', ('_sma20', '_std20'), 0, lambda d: d['_sma20'] - (d['_std20'] * 2), float64=True)
+_feature('bb_width', 'technical', ('bb_upper', 'bb_lower', '_sma20'), 0,
+         lambda d: (d['bb_upper'] - d['bb_lower']) / d['_sma20'])
+_feature('bb_position', 'technical', ('close', 'bb_upper', 'bb_lower'), 0,
+         lambda d: (d['close'] - d['bb_lower']) / (d['bb_upper'] - d['bb_lower']))
+
+# Rate of change e estocástico
+for _p in [3, 7, 14]:
+    _feature(f'roc_{_p}', 'momentum', ('close',), _p,
+             lambda d, p=_p: (d['close'] - d['close'].shift(p)) / d['close'].shift(p))
+_feature('_low_14', 'momentum', ('low',), 13, lambda d: d['low'].rolling(14).min())
+_feature('_high_14', 'momentum', ('high',), 13, lambda d: d['high'].rolling(14).max())
+_feature('stoch_k', 'momentum', ('close', '_low_14', '_high_14'), 0,
+         lambda d: 100 * (d['close'] - d['_low_14']) / (d['_high_14'] - d['_low_14']))
+_feature('stoch_d', 'momentum', ('stoch_k',), 2, lambda d: d['stoch_k'].rolling(3).mean())
+
+# Volume relativo, OBV (On-Balance Volume) e VWAP (Volume Weighted Average Price)
+for _w in [7, 30]:
+    _feature(f'volume_ratio_{_w}d', 'volume', ('volume',), _w - 1,
+             lambda d, w=_w: d['volume'] / d['volume'].rolling(w).mean())
+_feature('obv', 'volume', ('close', 'volume'), 0,
+         lambda d: (np.sign(d['close'].diff()) * d['volume']).fillna(0).cumsum(), cumulative=True, float64=True)
+_feature('obv_ema', 'volume', ('obv',), _ema_warmup(20), lambda d: d['obv'].ewm(span=20, adjust=False).mean(),
+         cumulative=True)
+_feature('vwap', 'volume', ('high', 'low', 'close', 'volume'), 0,
+         lambda d: (d['volume'] * (d['high'] + d['low'] + d['close']) / 3).cumsum() / d['volume'].cumsum(),
+         cumulative=True)
+
+# Temporais, com encoding cíclico para preservar continuidade
+_feature('_ts', 'temporal', ('timestamp',), 0, lambda d: pd.to_datetime(d['timestamp']))
+_feature('day_of_week', 'temporal', ('_ts',), 0, lambda d: d['_ts'].dt.dayofweek)
+_feature('day_of_month', 'temporal', ('_ts',), 0, lambda d: d['_ts'].dt.day)
+_feature('month', 'temporal', ('_ts',), 0, lambda d: d['_ts'].dt.month)
+_feature('quarter', 'temporal', ('_ts',), 0, lambda d: d['_ts'].dt.quarter)
+_feature('day_of_week_sin', 'temporal', ('day_of_week',), 0, lambda d: np.sin(2 * np.pi * d['day_of_week'] / 7))
+_feature('day_of_week_cos', 'temporal', ('day_of_week',), 0, lambda d: np.cos(2 * np.pi * d['day_of_week'] / 7))
+_feature('month_sin', 'temporal', ('month',), 0, lambda d: np.sin(2 * np.pi * d['month'] / 12))
+_feature('month_cos', 'temporal', ('month',), 0, lambda d: np.cos(2 * np.pi * d['month'] / 12))
+
+# Geopolíticas: saem juntas de _add_geopolitical_features, que usa close e volatility_7d
+for _name in ['events_last_7d', 'events_last_30d', 'avg_sentiment_7d', 'avg_sentiment_30d',
+              'high_severity_events_7d', 'high_severity_events_30d', 'positive_events_7d',
+              'negative_events_7d', 'days_since_last_event', 'last_event_sentiment',
+              'economic_events_30d', 'political_events_30d', 'innovation_events_30d',
+              'price_x_sentiment_7d', 'volatility_x_events_7d']:
+    _feature(_name, 'geo', ('timestamp', 'close', 'volatility_7d'), 0, None)
+del _p, _w, _name
+
+
+def feature_closure(feature_names) -> list:
+    """
+    Features do registro necessárias para calcular feature_names (fecho
+    transitivo das dependências, incluindo intermediários), na ordem do
+    registro. Colunas base (timestamp, OHLCV) ficam de fora.
+    """
+    needed = set()
+    stack = [n for n in feature_names if n in FEATURES]
+    while stack:
+        name = stack.pop()
+        if name in needed:
+            continue
+        needed.add(name)
+        stack.extend(d for d in FEATURES[name].deps if d in FEATURES)
+    return [n for n in FEATURES if n in needed]
+
+
+def min_history(feature_names) -> int | None:
+    """
+    Velas mínimas para que a última linha tenha todas as feature_names
+    definidas: maior aquecimento acumulado do fecho + 1. None quando o fecho
+    tem uma feature cumulativa (obv, obv_ema, vwap): o valor depende de onde
+    a série começa, então o histórico tem de ser o mesmo usado no treino.
+
+    Só as features de janela finita (retornos, SMAs, desvios, RSI, Bollinger,
+    estocástico...) saem iguais às do histórico completo com esse número de
+    velas. As derivadas de EMA (ema_*, macd*) são aproximadas: o resíduo da
+    semente pesa menos que EMA_TOL, mas numa diferença de EMAs (MACD) o erro
+    relativo pode ser maior que isso.
+    """
+    warm = {}
+    for name in feature_closure(feature_names):  # ordem do registro: dependências antes
+        spec = FEATURES[name]
+        if spec.cumulative:
+            return None
+        warm[name] = spec.window + max((warm[d] for d in spec.deps if d in warm), default=0)
+    return max(warm.values(), default=0) + 1
+
+
+class _Scope:
+    """Vista de um frame (ou sink) que guarda os intermediários ('_nome') fora dele"""
+
+    def __init__(self, df):
+        self.df = df
+        self.local = {}
+
+    def __getitem__(self, name: str):
+        if name in self.local:
+            return self.local[name]
+        return self.df[name]
+
+    def __setitem__(self, name: str, values):
+        if name.startswith('_'):
+            self.local[name] = values
+        else:
+            self.df[name] = values
+
 
 class FeatureEngine:
     """Cria features técnicas avançadas para ML"""
     
     def __init__(self):
         self.feature_names = []
+        self.memory_report = {}
     
     def create_all_features(self, df: pd.DataFrame, events_df: pd.DataFrame = None) -> pd.DataFrame:
         """
@@ -23,8 +299,7 @@ class FeatureEngine:
         Returns:
             DataFrame com todas as features
         """
-        df = df.copy()
-        df = df.sort_values('timestamp').reset_index(drop=True)
+        df = df.sort_values('timestamp', ignore_index=True)
 
         # Features básicas de retorno
         df = self._add_return_features(df)
@@ -53,119 +328,175 @@ class FeatureEngine:
 
         return df
     
+    def create_features_compact(self, df: pd.DataFrame, events_df: pd.DataFrame = None,
+                                dtype=np.float32, report_memory: bool = False) -> pd.DataFrame:
+        """
+        Mesmas features de create_all_features, em modo enxuto de memória: as
+        colunas calculadas vão para um único bloco float32 pré-alocado (sem
+        inserir coluna a coluna no frame), o timestamp é convertido uma vez e
+        não há cópias intermediárias do frame. Contagens e componentes de data
+        também saem como float32.
+
+        Args:
+            df: DataFrame com colunas [timestamp, open, high, low, close, volume]
+            events_df: DataFrame opcional com eventos geopolíticos
+            dtype: dtype do bloco de features (padrão float32)
+            report_memory: mede o pico de memória com tracemalloc e guarda em
+                self.memory_report (peak_mb, output_mb, rows, features)
+
+        Returns:
+            DataFrame com as colunas originais seguidas das features, sem NaN
+        """
+        if report_memory:
+            tracemalloc.start()
+        try:
+            base = df.sort_values('timestamp', ignore_index=True)
+            base['timestamp'] = pd.to_datetime(base['timestamp'])
+            with_events = events_df is not None and not events_df.empty
+
+            # Nomes e ordem das features a partir de uma execução em poucas linhas
+            names = self._feature_order(base.head(2), events_df if with_events else None)
+
+            sink = _FeatureBlock(base, names, dtype)
+            self._add_return_features(sink)
+            self._add_volatility_features(sink)
+            self._add_technical_features(sink)
+            self._add_momentum_features(sink)
+            self._add_volume_features(sink)
+            self._add_temporal_features(sink)
+            if with_events:
+                self._add_geopolitical_features(sink, events_df)
+
+            # Remove as linhas com NaN (aquecimento); fatia sem cópia quando são só as primeiras
+            keep = ~np.isnan(sink.block).any(axis=1) & base.notna().all(axis=1).to_numpy()
+            first = int(np.argmax(keep)) if keep.any() else len(keep)
+            if keep[first:].all():
+                rows, block = slice(first, None), sink.block[first:]
+            else:
+                rows, block = keep, sink.block[keep]
+            out = pd.concat(
+                [base.iloc[rows].reset_index(drop=True), pd.DataFrame(block, columns=names, copy=False)],
+                axis=1, copy=False,
+            )
+            if report_memory:
+                _, peak = tracemalloc.get_traced_memory()
+                self.memory_report = {
+                    'rows': len(out),
+                    'features': len(names),
+                    'peak_mb': peak / 2**20,
+                    'output_mb': out.memory_usage(deep=False).sum() / 2**20,
+                }
+            return out
+        finally:
+            if report_memory:
+                tracemalloc.stop()
+
+    def create_panel_features(self, df: pd.DataFrame, events_df: pd.DataFrame = None) -> pd.DataFrame:
+        """
+        Cria as features de todas as moedas numa passada vetorizada sobre um
+        painel (tempo x moeda), em vez de uma chamada por moeda.
+
+        Args:
+            df: DataFrame longo com [moeda_id, timestamp, open, high, low, close, volume]
+            events_df: DataFrame opcional com eventos geopolíticos (os mesmos para todas as moedas)
+
+        Returns:
+            DataFrame longo ordenado por (moeda_id, timestamp); as linhas de cada
+            moeda são as mesmas de create_all_features sobre o frame só daquela moeda
+        """
+        base = df.sort_values(['moeda_id', 'timestamp'], ignore_index=True)
+        panel = _Panel(base)
+        for step in (self._add_return_features, self._add_volatility_features, self._add_technical_features,
+                     self._add_momentum_features, self._add_volume_features):
+            step(panel)
+
+        # Do painel para o formato longo, já na ordem de 'base'
+        names = [n for n in panel.data if n not in base.columns]
+        out = pd.concat([base, pd.DataFrame({n: panel.long(n) for n in names})], axis=1)
+
+        # Temporais e geopolíticas dependem só da própria linha
+        out = self._add_temporal_features(out)
+        if events_df is not None and not events_df.empty:
+            out = self._add_geopolitical_features(out, events_df)
+        return out.dropna().reset_index(drop=True)
+
+    def create_selected_features(self, df: pd.DataFrame, feature_names, events_df: pd.DataFrame = None) -> pd.DataFrame:
+        """
+        Calcula só as features pedidas e suas dependências (fecho do registro
+        FEATURES), ex. as feature_names de um CryptoPredictor salvo. Os valores
+        são os mesmos de create_all_features sobre o mesmo frame; as linhas
+        descartadas são só as com NaN nas colunas devolvidas. Com
+        min_history(feature_names) velas a última linha sai definida (igual à do
+        histórico completo nas features de janela finita; com cumulativas, use
+        a mesma janela do treino; ver min_history).
+
+        Args:
+            df: DataFrame com colunas [timestamp, open, high, low, close, volume]
+            feature_names: features desejadas (colunas já presentes em df são mantidas)
+            events_df: DataFrame com eventos geopolíticos, obrigatório se alguma for geopolítica
+
+        Returns:
+            DataFrame com as colunas originais seguidas das features pedidas, na
+            ordem do create_all_features
+        """
+        unknown = [n for n in feature_names if n not in FEATURES and n not in df.columns]
+        if unknown:
+            raise ValueError(f"Features desconhecidas: {unknown}")
+        needed = set(feature_closure(feature_names))
+        wanted = [n for n in FEATURES if n in set(feature_names)]
+
+        df = df.sort_values('timestamp', ignore_index=True)
+        for group in GROUPS[:-1]:
+            self._run_group(df, group, needed)
+        if any(FEATURES[n].group == 'geo' for n in needed):
+            if events_df is None or events_df.empty:
+                raise ValueError("Features geopolíticas pedidas sem events_df")
+            df = self._add_geopolitical_features(df, events_df)
+
+        base = [c for c in df.columns if c not in FEATURES]
+        return df[base + wanted].dropna().reset_index(drop=True)
+
+    def _feature_order(self, sample: pd.DataFrame, events_df: pd.DataFrame = None) -> list:
+        """Nomes das colunas criadas pelo pipeline, na ordem do create_all_features"""
+        df = sample.copy()
+        for step in (self._add_return_features, self._add_volatility_features, self._add_technical_features,
+                     self._add_momentum_features, self._add_volume_features, self._add_temporal_features):
+            df = step(df)
+        if events_df is not None:
+            df = self._add_geopolitical_features(df, events_df)
+        return [c for c in df.columns if c not in sample.columns]
+
+    def _run_group(self, df, group: str, names=None):
+        """Calcula as features do grupo declaradas no registro (só as de names, se dado)"""
+        scope = _Scope(df)
+        for name, spec in FEATURES.items():
+            if spec.group == group and (names is None or name in names):
+                scope[name] = spec.fn(scope)
+        return df
+
     def _add_return_features(self, df: pd.DataFrame) -> pd.DataFrame:
         """Features de retorno simples e log"""
-        # Retorno simples
-        df['return_1d'] = df['close'].pct_change(1)
-        df['return_3d'] = df['close'].pct_change(3)
-        df['return_7d'] = df['close'].pct_change(7)
-        df['return_14d'] = df['close'].pct_change(14)
-        df['return_30d'] = df['close'].pct_change(30)
-        
-        # Log returns (mais estáveis)
-        df['log_return_1d'] = np.log(df['close'] / df['close'].shift(1))
-        df['log_return_7d'] = np.log(df['close'] / df['close'].shift(7))
-        
-        return df
-    
+        return self._run_group(df, 'returns')
+
     def _add_volatility_features(self, df: pd.DataFrame) -> pd.DataFrame:
         """Features de volatilidade"""
-        # Volatilidade histórica
-        for window in [7, 14, 30]:
-            df[f'volatility_{window}d'] = df['return_1d'].rolling(window).std()
-        
-        # ATR (Average True Range)
-        high_low = df['high'] - df['low']
-        high_close = np.abs(df['high'] - df['close'].shift())
-        low_close = np.abs(df['low'] - df['close'].shift())
-        tr = pd.concat([high_low, high_close, low_close], axis=1).max(axis=1)
-        df['atr_14'] = tr.rolling(14).mean()
-        
-        # Amplitude intradiária
-        df['daily_range'] = (df['high'] - df['low']) / df['close']
-        df['avg_range_7d'] = df['daily_range'].rolling(7).mean()
-        
-        return df
-    
+        return self._run_group(df, 'volatility')
+
     def _add_technical_features(self, df: pd.DataFrame) -> pd.DataFrame:
         """Indicadores técnicos clássicos"""
-        # Médias móveis
-        for window in [7, 14, 21, 50, 200]:
-            df[f'sma_{window}'] = df['close'].rolling(window).mean()
-            df[f'ema_{window}'] = df['close'].ewm(span=window, adjust=False).mean()
-        
-        # Distância das médias móveis (features de tendência)
-        df['distance_sma7'] = (df['close'] - df['sma_7']) / df['sma_7']
-        df['distance_sma21'] = (df['close'] - df['sma_21']) / df['sma_21']
-        df['distance_sma50'] = (df['close'] - df['sma_50']) / df['sma_50']
-        
-        # MACD
-        ema12 = df['close'].ewm(span=12, adjust=False).mean()
-        ema26 = df['close'].ewm(span=26, adjust=False).mean()
-        df['macd'] = ema12 - ema26
-        df['macd_signal'] = df['macd'].ewm(span=9, adjust=False).mean()
-        df['macd_histogram'] = df['macd'] - df['macd_signal']
-        
-        # RSI
-        delta = df['close'].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-        rs = gain / loss
-        df['rsi_14'] = 100 - (100 / (1 + rs))
-        
-        # Bollinger Bands
-        sma20 = df['close'].rolling(20).mean()
-        std20 = df['close'].rolling(20).std()
-        df['bb_upper'] = sma20 + (std20 * 2)
-        df['bb_lower'] = sma20 - (std20 * 2)
-        df['bb_width'] = (df['bb_upper'] - df['bb_lower']) / sma20
-        df['bb_position'] = (df['close'] - df['bb_lower']) / (df['bb_upper'] - df['bb_lower'])
-        
-        return df
-    
+        return self._run_group(df, 'technical')
+
     def _add_momentum_features(self, df: pd.DataFrame) -> pd.DataFrame:
         """Features de momentum"""
-        # Rate of change
-        for period in [3, 7, 14]:
-            df[f'roc_{period}'] = (df['close'] - df['close'].shift(period)) / df['close'].shift(period)
-        
-        # Stochastic
-        low_14 = df['low'].rolling(14).min()
-        high_14 = df['high'].rolling(14).max()
-        df['stoch_k'] = 100 * (df['close'] - low_14) / (high_14 - low_14)
-        df['stoch_d'] = df['stoch_k'].rolling(3).mean()
-        
-        return df
-    
+        return self._run_group(df, 'momentum')
+
     def _add_volume_features(self, df: pd.DataFrame) -> pd.DataFrame:
         """Features de volume"""
-        # Volume relativo
-        df['volume_ratio_7d'] = df['volume'] / df['volume'].rolling(7).mean()
-        df['volume_ratio_30d'] = df['volume'] / df['volume'].rolling(30).mean()
-        
-        # OBV (On-Balance Volume)
-        df['obv'] = (np.sign(df['close'].diff()) * df['volume']).fillna(0).cumsum()
-        df['obv_ema'] = df['obv'].ewm(span=20, adjust=False).mean()
-        
-        # Volume Weighted Average Price
-        df['vwap'] = (df['volume'] * (df['high'] + df['low'] + df['close']) / 3).cumsum() / df['volume'].cumsum()
-        
-        return df
-    
+        return self._run_group(df, 'volume')
+
     def _add_temporal_features(self, df: pd.DataFrame) -> pd.DataFrame:
         """Features temporais (dia da semana, mês, etc)"""
-        df['day_of_week'] = pd.to_datetime(df['timestamp']).dt.dayofweek
-        df['day_of_month'] = pd.to_datetime(df['timestamp']).dt.day
-        df['month'] = pd.to_datetime(df['timestamp']).dt.month
-        df['quarter'] = pd.to_datetime(df['timestamp']).dt.quarter
-
-        # Encoding cíclico para preservar continuidade
-        df['day_of_week_sin'] = np.sin(2 * np.pi * df['day_of_week'] / 7)
-        df['day_of_week_cos'] = np.cos(2 * np.pi * df['day_of_week'] / 7)
-        df['month_sin'] = np.sin(2 * np.pi * df['month'] / 12)
-        df['month_cos'] = np.cos(2 * np.pi * df['month'] / 12)
-
-        return df
+        return self._run_group(df, 'temporal')
 
     def _add_geopolitical_features(self, df: pd.DataFrame, events_df: pd.DataFrame) -> pd.DataFrame:
         """
@@ -176,80 +507,81 @@ class FeatureEngine:
         - Sentimento agregado de eventos recentes
         - Severidade de eventos recentes
         - Contagem de eventos por categoria
+
+        Os eventos são ordenados uma vez; as janelas (t-7d, t] e (t-30d, t] de
+        cada vela saem de searchsorted e as contagens/somas de somas acumuladas,
+        em O((velas + eventos) log eventos). O "último evento" é, como antes, o
+        último na ordem original de events_df entre os com timestamp <= t.
         """
-        df = df.copy()
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
+        if isinstance(df, pd.DataFrame):
+            df = df.copy()
+            df['timestamp'] = pd.to_datetime(df['timestamp'])
         events_df['timestamp'] = pd.to_datetime(events_df['timestamp'])
 
-        # Inicializa features
-        df['events_last_7d'] = 0
-        df['events_last_30d'] = 0
-        df['avg_sentiment_7d'] = 0.0
-        df['avg_sentiment_30d'] = 0.0
-        df['high_severity_events_7d'] = 0
-        df['high_severity_events_30d'] = 0
-        df['positive_events_7d'] = 0
-        df['negative_events_7d'] = 0
-        df['days_since_last_event'] = 999  # valor alto padrão
-        df['last_event_sentiment'] = 0.0
-        df['economic_events_30d'] = 0
-        df['political_events_30d'] = 0
-        df['innovation_events_30d'] = 0
-
         # Mapeia sentimentos para valores numéricos
         sentiment_map = {'Positivo': 1, 'Neutro': 0, 'Negativo': -1}
         events_df['sentiment_score'] = events_df['sentimento'].map(sentiment_map).fillna(0)
 
-        # Para cada data nos preços, calcula features de eventos
-        for idx, row in df.iterrows():
-            current_date = row['timestamp']
-
-            # Eventos nos últimos 7 dias
-            events_7d = events_df[
-                (events_df['timestamp'] <= current_date) &
-                (events_df['timestamp'] > current_date - pd.Timedelta(days=7))
-            ]
-
-            # Eventos nos últimos 30 dias
-            events_30d = events_df[
-                (events_df['timestamp'] <= current_date) &
-                (events_df['timestamp'] > current_date - pd.Timedelta(days=30))
-            ]
-
-            # Contagens
-            df.at[idx, 'events_last_7d'] = len(events_7d)
-            df.at[idx, 'events_last_30d'] = len(events_30d)
-
-            # Sentimento médio
-            if len(events_7d) > 0:
-                df.at[idx, 'avg_sentiment_7d'] = events_7d['sentiment_score'].mean()
-                df.at[idx, 'positive_events_7d'] = (events_7d['sentimento'] == 'Positivo').sum()
-                df.at[idx, 'negative_events_7d'] = (events_7d['sentimento'] == 'Negativo').sum()
-                df.at[idx, 'high_severity_events_7d'] = (events_7d['severidade'] == 'Alto').sum()
-
-            if len(events_30d) > 0:
-                df.at[idx, 'avg_sentiment_30d'] = events_30d['sentiment_score'].mean()
-                df.at[idx, 'high_severity_events_30d'] = (events_30d['severidade'] == 'Alto').sum()
-
-                # Eventos por categoria
-                df.at[idx, 'economic_events_30d'] = (events_30d['categoria'] == 'Econômico').sum()
-                df.at[idx, 'political_events_30d'] = (events_30d['categoria'] == 'Político').sum()
-                df.at[idx, 'innovation_events_30d'] = (events_30d['categoria'] == 'Inovação').sum()
-
-            # Dias desde o último evento
-            past_events = events_df[events_df['timestamp'] <= current_date]
-            if len(past_events) > 0:
-                last_event = past_events.iloc[-1]
-                days_diff = (current_date - last_event['timestamp']).days
-                df.at[idx, 'days_since_last_event'] = min(days_diff, 999)
-                df.at[idx, 'last_event_sentiment'] = last_event['sentiment_score']
+        if (df['timestamp'].dt.tz is None) != (events_df['timestamp'].dt.tz is None):
+            raise TypeError("Invalid comparison between tz-naive and tz-aware timestamps")
+
+        # Eventos com timestamp válido, ordenados (estável) por timestamp
+        ev_ts = _as_ns(events_df['timestamp'])
+        pos = np.flatnonzero(events_df['timestamp'].notna().to_numpy())
+        order = pos[np.argsort(ev_ts[pos], kind='stable')]
+        sorted_ts = ev_ts[order]
+
+        def _cum(values) -> np.ndarray:
+            """Soma acumulada na ordem de sorted_ts, com 0 na frente."""
+            return np.concatenate(([0.0], np.cumsum(np.asarray(values, dtype='float64')[order])))
+
+        score = events_df['sentiment_score'].to_numpy(dtype='float64')
+        sentimento = events_df['sentimento'].to_numpy()
+        severidade = events_df['severidade'].to_numpy()
+        categoria = events_df['categoria'].to_numpy()
+
+        # Janelas por vela: eventos em sorted_ts[lo:hi]
+        t = _as_ns(df['timestamp'])
+        hi = np.searchsorted(sorted_ts, t, side='right')
+        lo7 = np.searchsorted(sorted_ts, t - pd.Timedelta(days=7).value, side='right')
+        lo30 = np.searchsorted(sorted_ts, t - pd.Timedelta(days=30).value, side='right')
+
+        def _janela(values, lo: np.ndarray) -> np.ndarray:
+            c = _cum(values)
+            return c[hi] - c[lo]
+
+        n7 = hi - lo7
+        n30 = hi - lo30
+        c_score = _cum(score)
+
+        df['events_last_7d'] = n7.astype('int64')
+        df['events_last_30d'] = n30.astype('int64')
+        df['avg_sentiment_7d'] = np.where(n7 > 0, (c_score[hi] - c_score[lo7]) / np.maximum(n7, 1), 0.0)
+        df['avg_sentiment_30d'] = np.where(n30 > 0, (c_score[hi] - c_score[lo30]) / np.maximum(n30, 1), 0.0)
+        df['high_severity_events_7d'] = _janela(severidade == 'Alto', lo7).astype('int64')
+        df['high_severity_events_30d'] = _janela(severidade == 'Alto', lo30).astype('int64')
+        df['positive_events_7d'] = _janela(sentimento == 'Positivo', lo7).astype('int64')
+        df['negative_events_7d'] = _janela(sentimento == 'Negativo', lo7).astype('int64')
+
+        # Dias desde o último evento: maior posição original entre os eventos com timestamp <= t
+        df['days_since_last_event'] = 999  # valor alto padrão
+        df['last_event_sentiment'] = 0.0
+        if len(order):
+            last_pos = np.maximum.accumulate(order)[np.maximum(hi, 1) - 1]
+            days = np.minimum((t - ev_ts[last_pos]) // pd.Timedelta(days=1).value, 999)
+            df['days_since_last_event'] = np.where(hi > 0, days, 999).astype('int64')
+            df['last_event_sentiment'] = np.where(hi > 0, score[last_pos], 0.0)
+
+        df['economic_events_30d'] = _janela(categoria == 'Econômico', lo30).astype('int64')
+        df['political_events_30d'] = _janela(categoria == 'Político', lo30).astype('int64')
+        df['innovation_events_30d'] = _janela(categoria == 'Inovação', lo30).astype('int64')
 
         # Features de interação (preço x eventos)
         df['price_x_sentiment_7d'] = df['close'] * df['avg_sentiment_7d']
         df['volatility_x_events_7d'] = df['volatility_7d'] * df['events_last_7d']
 
         return df
-    
+
     def create_target(self, df: pd.DataFrame, horizon: int = 1, 
                      target_type: str = 'regression') -> Tuple[pd.DataFrame, pd.Series]:
         """
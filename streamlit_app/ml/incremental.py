@@ -0,0 +1,346 @@
+"""
+Features incrementais para velas ao vivo
+Mantém o estado dos indicadores do FeatureEngine e gera o vetor de features
+de uma vela nova em O(1), sem recalcular o frame inteiro
+"""
+import math
+from collections import deque
+from typing import Dict, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+
+
+def _div(a: float, b: float) -> float:
+    """Divisão com a semântica do NumPy (x/0 -> inf, 0/0 -> NaN)"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return float(np.float64(a) / np.float64(b))
+
+
+class _Janela:
+    """
+    Média e desvio amostral de uma janela deslizante de n valores (Welford com
+    remoção). Como no pandas, só há valor com a janela cheia e sem NaN.
+    """
+    __slots__ = ('n', 'buf', 'mean', 'm2', 'nan', 'k')
+
+    def __init__(self, n: int):
+        self.n = n
+        self.buf = deque()
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.nan = 0
+        self.k = 0
+
+    def push(self, x: float):
+        v = 0.0 if x != x else x
+        self.nan += x != x
+        if len(self.buf) == self.n:
+            old = self.buf.popleft()
+            o = 0.0 if old != old else old
+            self.nan -= old != old
+            mean = self.mean + (v - o) / self.n
+            self.m2 += (v - o) * (v - mean + o - self.mean)
+            self.mean = mean
+        else:
+            d = v - self.mean
+            self.mean += d / (len(self.buf) + 1)
+            self.m2 += d * (v - self.mean)
+        self.buf.append(x)
+        # Recalcula do zero de tempos em tempos para não acumular erro de arredondamento
+        self.k += 1
+        if self.k % (8 * self.n) == 0:
+            vals = np.nan_to_num(np.fromiter(self.buf, dtype='float64'), nan=0.0)
+            self.mean = float(vals.mean())
+            self.m2 = float(((vals - self.mean) ** 2).sum())
+
+    @property
+    def cheia(self) -> bool:
+        return len(self.buf) == self.n and self.nan == 0
+
+    def media(self) -> float:
+        return self.mean if self.cheia else np.nan
+
+    def std(self) -> float:
+        if not self.cheia or self.n < 2:
+            return np.nan
+        return math.sqrt(max(self.m2, 0.0) / (self.n - 1))
+
+
+class _Extremo:
+    """Mínimo ou máximo de uma janela deslizante com deque monotônica"""
+    __slots__ = ('n', 'maior', 'dq', 'i', 'nans')
+
+    def __init__(self, n: int, maior: bool):
+        self.n = n
+        self.maior = maior
+        self.dq = deque()  # (posição, valor), valores monotônicos
+        self.i = -1
+        self.nans = deque()  # posições de NaN dentro da janela
+
+    def push(self, x: float):
+        self.i += 1
+        while self.dq and self.dq[0][0] <= self.i - self.n:
+            self.dq.popleft()
+        while self.nans and self.nans[0] <= self.i - self.n:
+            self.nans.popleft()
+        if x != x:
+            self.nans.append(self.i)
+            return
+        while self.dq and (self.dq[-1][1] <= x if self.maior else self.dq[-1][1] >= x):
+            self.dq.pop()
+        self.dq.append((self.i, x))
+
+    def valor(self) -> float:
+        if self.i + 1 < self.n or self.nans or not self.dq:
+            return np.nan
+        return self.dq[0][1]
+
+
+class _Ema:
+    """EMA com adjust=False (mesma recursão do pandas ewm)"""
+    __slots__ = ('alpha', 'valor')
+
+    def __init__(self, span: int):
+        self.alpha = 2.0 / (span + 1.0)
+        self.valor = None
+
+    def push(self, x: float) -> float:
+        self.valor = x if self.valor is None else (1.0 - self.alpha) * self.valor + self.alpha * x
+        return self.valor
+
+
+class _Eventos:
+    """
+    Features geopolíticas de velas em ordem crescente de tempo, com a mesma
+    semântica de FeatureEngine._add_geopolitical_features. Os eventos são
+    ordenados uma vez, com somas acumuladas por indicador; cada vela só avança
+    os ponteiros das janelas (t-30d, t], (t-7d, t] e do fim (t), em O(1)
+    amortizado.
+    """
+    DIA = pd.Timedelta(days=1).value
+
+    def __init__(self, events_df: pd.DataFrame):
+        ts = pd.to_datetime(events_df['timestamp'])
+        self.tz = ts.dt.tz is not None
+        ev_ts = pd.DatetimeIndex(ts).asi8
+        pos = np.flatnonzero(ts.notna().to_numpy())
+        order = pos[np.argsort(ev_ts[pos], kind='stable')]
+        self.ts = ev_ts[order]
+
+        sentimento = events_df['sentimento'].to_numpy()
+        severidade = events_df['severidade'].to_numpy()
+        categoria = events_df['categoria'].to_numpy()
+        score = events_df['sentimento'].map({'Positivo': 1, 'Neutro': 0, 'Negativo': -1}).fillna(0)
+        score = score.to_numpy(dtype='float64')
+
+        def _cum(values) -> np.ndarray:
+            return np.concatenate(([0.0], np.cumsum(np.asarray(values, dtype='float64')[order])))
+
+        self.c_score = _cum(score)
+        self.c_alto = _cum(severidade == 'Alto')
+        self.c_pos = _cum(sentimento == 'Positivo')
+        self.c_neg = _cum(sentimento == 'Negativo')
+        self.c_econ = _cum(categoria == 'Econômico')
+        self.c_pol = _cum(categoria == 'Político')
+        self.c_inov = _cum(categoria == 'Inovação')
+        # Último evento entre os com timestamp <= t: maior posição original (como no batch)
+        ultimo = np.maximum.accumulate(order) if len(order) else order
+        self.ultimo_ts = ev_ts[ultimo]
+        self.ultimo_score = score[ultimo]
+        self.hi = self.lo7 = self.lo30 = 0
+
+    def _avanca(self, i: int, limite: int) -> int:
+        while i < len(self.ts) and self.ts[i] <= limite:
+            i += 1
+        return i
+
+    def update(self, o: Dict) -> Dict:
+        """Acrescenta ao dict da vela as features geopolíticas (mesma ordem do batch)"""
+        ts = pd.Timestamp(o['timestamp'])
+        if (ts.tzinfo is not None) != self.tz:
+            raise TypeError("Invalid comparison between tz-naive and tz-aware timestamps")
+        t = ts.value
+        self.hi = hi = self._avanca(self.hi, t)
+        self.lo7 = lo7 = self._avanca(self.lo7, t - 7 * self.DIA)
+        self.lo30 = lo30 = self._avanca(self.lo30, t - 30 * self.DIA)
+        n7, n30 = hi - lo7, hi - lo30
+
+        def _janela(c: np.ndarray, lo: int) -> int:
+            return int(c[hi] - c[lo])
+
+        o['events_last_7d'] = n7
+        o['events_last_30d'] = n30
+        o['avg_sentiment_7d'] = (self.c_score[hi] - self.c_score[lo7]) / n7 if n7 > 0 else 0.0
+        o['avg_sentiment_30d'] = (self.c_score[hi] - self.c_score[lo30]) / n30 if n30 > 0 else 0.0
+        o['high_severity_events_7d'] = _janela(self.c_alto, lo7)
+        o['high_severity_events_30d'] = _janela(self.c_alto, lo30)
+        o['positive_events_7d'] = _janela(self.c_pos, lo7)
+        o['negative_events_7d'] = _janela(self.c_neg, lo7)
+        if hi > 0:
+            o['days_since_last_event'] = int(min((t - self.ultimo_ts[hi - 1]) // self.DIA, 999))
+            o['last_event_sentiment'] = float(self.ultimo_score[hi - 1])
+        else:
+            o['days_since_last_event'] = 999
+            o['last_event_sentiment'] = 0.0
+        o['economic_events_30d'] = _janela(self.c_econ, lo30)
+        o['political_events_30d'] = _janela(self.c_pol, lo30)
+        o['innovation_events_30d'] = _janela(self.c_inov, lo30)
+        o['price_x_sentiment_7d'] = float(o['close']) * o['avg_sentiment_7d']
+        o['volatility_x_events_7d'] = o['volatility_7d'] * n7
+        return o
+
+
+class IncrementalFeatures:
+    """
+    Estado incremental dos indicadores do FeatureEngine (retornos, volatilidade,
+    técnicos, momentum, volume e temporais), alimentado vela a vela.
+
+    Uso:
+        state = IncrementalFeatures.from_history(df_historico, events_df)
+        features = state.update(nova_vela)   # pd.Series na ordem das colunas do batch
+
+    O resultado de update() bate, dentro de tolerância numérica, com a linha
+    da mesma vela em FeatureEngine.create_all_features sobre o histórico
+    completo. Janelas ainda incompletas saem NaN (o batch descartaria a linha).
+    As EMAs dependem de todo o histórico, por isso o estado deve ser semeado
+    com a mesma série usada no treino.
+    """
+
+    SMA_WINDOWS = [7, 14, 21, 50, 200]
+    RETURN_PERIODS = [1, 3, 7, 14, 30]
+    ROC_PERIODS = [3, 7, 14]
+
+    def __init__(self, events_df: Optional[pd.DataFrame] = None):
+        self.eventos = _Eventos(events_df) if events_df is not None and not events_df.empty else None
+        self.closes = deque(maxlen=max(self.RETURN_PERIODS) + 1)
+        self.n = 0
+
+        self.vol = {w: _Janela(w) for w in [7, 14, 30]}
+        self.tr = _Janela(14)
+        self.range7 = _Janela(7)
+        self.sma = {w: _Janela(w) for w in self.SMA_WINDOWS}
+        self.ema = {w: _Ema(w) for w in self.SMA_WINDOWS}
+        self.ema12, self.ema26, self.ema_signal = _Ema(12), _Ema(26), _Ema(9)
+        self.gain, self.loss = _Janela(14), _Janela(14)
+        self.bb = _Janela(20)
+        self.low14, self.high14 = _Extremo(14, maior=False), _Extremo(14, maior=True)
+        self.stoch_d = _Janela(3)
+        self.vol7, self.vol30 = _Janela(7), _Janela(30)
+        self.obv = 0.0
+        self.obv_ema = _Ema(20)
+        self.cum_pv = 0.0
+        self.cum_v = 0.0
+
+    @classmethod
+    def from_history(cls, df: pd.DataFrame, events_df: Optional[pd.DataFrame] = None) -> 'IncrementalFeatures':
+        """Semeia o estado com o histórico OHLCV (qualquer ordem; é ordenado por timestamp)"""
+        state = cls(events_df)
+        df = df.sort_values('timestamp')
+        for row in df.to_dict('records'):
+            state._advance(row)
+        return state
+
+    def update(self, candle: Mapping) -> pd.Series:
+        """Incorpora uma vela nova (posterior às anteriores) e devolve suas features"""
+        out = self._advance(candle)
+        if self.eventos is not None:
+            out = self.eventos.update(out)
+        return pd.Series(out)
+
+    def _advance(self, candle: Mapping) -> Dict:
+        o = dict(candle)
+        c = float(candle['close'])
+        h = float(candle['high'])
+        l = float(candle['low'])
+        v = float(candle['volume']) if candle['volume'] is not None else np.nan
+        prev = self.closes[-1] if self.closes else np.nan
+        self.closes.append(c)
+        self.n += 1
+
+        def lag(p: int) -> float:
+            return self.closes[-1 - p] if len(self.closes) > p else np.nan
+
+        # Retornos
+        for p in self.RETURN_PERIODS:
+            o[f'return_{p}d'] = _div(c, lag(p)) - 1
+        o['log_return_1d'] = float(np.log(_div(c, lag(1))))
+        o['log_return_7d'] = float(np.log(_div(c, lag(7))))
+
+        # Volatilidade
+        r1 = o['return_1d']
+        for w, jan in self.vol.items():
+            jan.push(r1)
+            o[f'volatility_{w}d'] = jan.std()
+        tr = h - l if prev != prev else max(h - l, abs(h - prev), abs(l - prev))
+        self.tr.push(tr)
+        o['atr_14'] = self.tr.media()
+        o['daily_range'] = _div(h - l, c)
+        self.range7.push(o['daily_range'])
+        o['avg_range_7d'] = self.range7.media()
+
+        # Técnicos
+        for w in self.SMA_WINDOWS:
+            self.sma[w].push(c)
+            o[f'sma_{w}'] = self.sma[w].media()
+            o[f'ema_{w}'] = self.ema[w].push(c)
+        o['distance_sma7'] = _div(c - o['sma_7'], o['sma_7'])
+        o['distance_sma21'] = _div(c - o['sma_21'], o['sma_21'])
+        o['distance_sma50'] = _div(c - o['sma_50'], o['sma_50'])
+        macd = self.ema12.push(c) - self.ema26.push(c)
+        o['macd'] = macd
+        o['macd_signal'] = self.ema_signal.push(macd)
+        o['macd_histogram'] = macd - o['macd_signal']
+
+        delta = c - prev
+        self.gain.push(delta if delta > 0 else 0.0)
+        self.loss.push(-delta if delta < 0 else 0.0)
+        rs = _div(self.gain.media(), self.loss.media())
+        o['rsi_14'] = 100 - _div(100, 1 + rs)
+
+        self.bb.push(c)
+        sma20, std20 = self.bb.media(), self.bb.std()
+        o['bb_upper'] = sma20 + std20 * 2
+        o['bb_lower'] = sma20 - std20 * 2
+        o['bb_width'] = _div(o['bb_upper'] - o['bb_lower'], sma20)
+        o['bb_position'] = _div(c - o['bb_lower'], o['bb_upper'] - o['bb_lower'])
+
+        # Momentum
+        for p in self.ROC_PERIODS:
+            o[f'roc_{p}'] = _div(c - lag(p), lag(p))
+        self.low14.push(l)
+        self.high14.push(h)
+        low_14, high_14 = self.low14.valor(), self.high14.valor()
+        o['stoch_k'] = 100 * _div(c - low_14, high_14 - low_14)
+        self.stoch_d.push(o['stoch_k'])
+        o['stoch_d'] = self.stoch_d.media()
+
+        # Volume
+        self.vol7.push(v)
+        self.vol30.push(v)
+        o['volume_ratio_7d'] = _div(v, self.vol7.media())
+        o['volume_ratio_30d'] = _div(v, self.vol30.media())
+        obv_step = float(np.sign(delta)) * v
+        if obv_step == obv_step:
+            self.obv += obv_step
+        o['obv'] = self.obv
+        o['obv_ema'] = self.obv_ema.push(self.obv)
+        pv = v * (h + l + c) / 3
+        if pv == pv:
+            self.cum_pv += pv
+        if v == v:
+            self.cum_v += v
+        o['vwap'] = _div(self.cum_pv, self.cum_v) if pv == pv and v == v else np.nan
+
+        # Temporais
+        ts = pd.Timestamp(candle['timestamp'])
+        o['day_of_week'] = ts.dayofweek
+        o['day_of_month'] = ts.day
+        o['month'] = ts.month
+        o['quarter'] = ts.quarter
+        o['day_of_week_sin'] = float(np.sin(2 * np.pi * o['day_of_week'] / 7))
+        o['day_of_week_cos'] = float(np.cos(2 * np.pi * o['day_of_week'] / 7))
+        o['month_sin'] = float(np.sin(2 * np.pi * o['month'] / 12))
+        o['month_cos'] = float(np.cos(2 * np.pi * o['month'] / 12))
+        return o
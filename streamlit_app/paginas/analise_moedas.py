@@ -1,38 +1,11 @@
 # streamlit_app/paginas/analise_moedas.py
-import os
 import pandas as pd
 import streamlit as st
 import plotly.graph_objects as go
-from sqlalchemy import create_engine, text
 
-# =========================
-# Conexão
-# =========================
-@st.cache_resource(show_spinner=False)
-def get_engine():
-    url = os.getenv("DATABASE_URL")
-    if not url:
-        try:
-            if "DATABASE_URL" in st.secrets:
-                url = st.secrets["DATABASE_URL"]
-            elif "db" in st.secrets:
-                db = st.secrets["db"]
-                host = db.get("host", "localhost")
-                port = db.get("port", 5432)
-                url = (
-                    f"postgresql+psycopg2://{db['user']}:{db['password']}"
-                    f"@{host}:{port}/{db['database']}"
-                )
-        except Exception:
-            pass
-    if not url:
-        st.error("Conexão com o banco não configurada (DATABASE_URL ou secrets).")
-        st.stop()
-    return create_engine(url, pool_pre_ping=True)
+from database import get_engine, mapa_moedas as _mapa_moedas_db, carregar_ohlc, resumo_moedas
+from migrations import garantir_esquema
 
-# =========================
-# Helper: garantir tabela 'moedas'
-# =========================
 # id -> (símbolo, nome)
 COINS_MAP = {
     1: ("BTC", "Bitcoin"),
@@ -41,94 +14,16 @@ COINS_MAP = {
     4: ("SOL", "Solana"),
 }
 
-def ensure_moedas(engine):
-    """Cria a tabela 'moedas' se faltar e faz upsert dos registros base."""
-    with engine.begin() as conn:
-        conn.execute(text("""
-            CREATE TABLE IF NOT EXISTS moedas(
-              id      INTEGER PRIMARY KEY,
-              simbolo TEXT,
-              nome    TEXT,
-              ativo   BOOLEAN DEFAULT TRUE
-            );
-        """))
-        # monta VALUES parametrizado
-        values_sql = ",".join(f"(:id{i}, :sym{i}, :name{i}, TRUE)" for i in COINS_MAP)
-        params = {}
-        for i, (sym, name) in COINS_MAP.items():
-            params[f"id{i}"] = i
-            params[f"sym{i}"] = sym
-            params[f"name{i}"] = name
-
-        conn.execute(
-            text(f"""
-              INSERT INTO moedas (id, simbolo, nome, ativo) VALUES {values_sql}
-              ON CONFLICT (id) DO UPDATE
-                SET simbolo=EXCLUDED.simbolo, nome=EXCLUDED.nome, ativo=TRUE;
-            """),
-            params
-        )
-
 # =========================
 # Dados
 # =========================
-@st.cache_data(ttl=60, show_spinner=False)
-def listar_moedas(_engine):
-    # garante a tabela/população antes de ler
-    ensure_moedas(_engine)
-
-    q = text("""
-        SELECT
-            id,
-            CASE
-                WHEN COALESCE(simbolo, '') <> '' AND COALESCE(nome, '') <> ''
-                    THEN UPPER(simbolo) || ' (' || nome || ')'
-                WHEN COALESCE(simbolo, '') <> ''
-                    THEN UPPER(simbolo)
-                WHEN COALESCE(nome, '') <> ''
-                    THEN nome
-                ELSE 'Moeda ' || id::text
-            END AS label
-        FROM moedas
-        WHERE COALESCE(ativo, TRUE) = TRUE
-        ORDER BY UPPER(simbolo) NULLS LAST, nome NULLS LAST, id;
-    """)
-    df = pd.read_sql_query(q, _engine)
-    if not df.empty:
-        return {row["label"]: int(row["id"]) for _, row in df.iterrows()}
-
+def listar_moedas() -> dict[str, int]:
+    mapa = _mapa_moedas_db()
+    if mapa:
+        return mapa
     # fallback extremo: se por algum motivo não houver nada, usa COINS_MAP
     return {f"{sym} ({name})": i for i, (sym, name) in COINS_MAP.items()}
 
-@st.cache_data(ttl=60, show_spinner=False)
-def carregar_ohlc(_engine, moeda_id: int, dt_ini: pd.Timestamp, dt_fim: pd.Timestamp):
-    q = text("""
-        SELECT timestamp, open, high, low, close, volume
-        FROM precos
-        WHERE moeda_id = :m
-          AND timestamp BETWEEN :ini AND :fim
-        ORDER BY timestamp
-    """)
-    df = pd.read_sql_query(
-        q, _engine,
-        params={"m": moeda_id, "ini": dt_ini, "fim": dt_fim},
-        dtype={"open":"float64","high":"float64","low":"float64","close":"float64","volume":"float64"}
-    )
-    if df.empty:
-        return df
-    df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce", utc=True)
-    df = df.dropna(subset=["timestamp","open","high","low","close"])
-    return df
-
-def _resample_ohlc(df: pd.DataFrame, regra: str) -> pd.DataFrame:
-    if regra == "1h":
-        return df
-    rule = "4h" if regra == "4h" else "1D"
-    dfi = df.set_index("timestamp")
-    agg = {"open":"first","high":"max","low":"min","close":"last","volume":"sum"}
-    out = dfi.resample(rule).agg(agg).dropna(subset=["open","high","low","close"]).reset_index()
-    return out
-
 # =========================
 # UI
 # =========================
@@ -158,9 +53,10 @@ def show():
     """, unsafe_allow_html=True)
 
     engine = get_engine()
+    garantir_esquema(engine)
 
     # Select de moedas (com nomes reais)
-    mapa_moedas = listar_moedas(engine)
+    mapa_moedas = listar_moedas()
     if not mapa_moedas:
         st.warning("Nenhuma moeda encontrada na base.")
         return
@@ -180,22 +76,28 @@ def show():
     dt_fim = pd.Timestamp.now(tz="UTC").floor("h")
     dt_ini = dt_fim - WINDOWS[intervalo]
 
-    df = carregar_ohlc(engine, moeda_id, dt_ini, dt_fim)
-    if df.empty:
+    ohlc = carregar_ohlc(moeda_id, dt_ini, dt_fim, intervalo)
+    if ohlc.empty:
         st.info("Sem dados no período selecionado.")
         return
 
-    ohlc = _resample_ohlc(df, intervalo)
-
     # Métricas
     last = ohlc.iloc[-1]
     ts_ref = ohlc["timestamp"].max() - pd.Timedelta(days=1)
     prev = ohlc.loc[ohlc["timestamp"] <= ts_ref, "close"]
     ref_close = float(prev.iloc[-1]) if not prev.empty else float(ohlc["close"].iloc[0])
     var_pct = ((float(last["close"]) / ref_close) - 1.0) * 100 if ref_close else 0.0
-    volume_24h = float(df[df["timestamp"] >= (df["timestamp"].max() - pd.Timedelta(hours=24))]["volume"].sum() or 0)
-    vol_win = min(10, max(2, len(ohlc)//20))
-    volatilidade = (ohlc["close"].pct_change().rolling(vol_win).std().iloc[-1] * 100) if len(ohlc) > vol_win else 0.0
+    # Estado de 24h da moeda (snapshot mantido pelo ETL): volume e, em 1h, a volatilidade
+    snap = resumo_moedas((moeda_id,)).loc[moeda_id]
+    volume_24h = float(snap["volume_24h"]) if pd.notna(snap["volume_24h"]) else 0.0
+    vol_24h = snap["volatilidade_24h"]
+
+    # A do snapshot é a das velas horárias; em 4h/1d vale a das N velas do intervalo
+    if intervalo == "1h" and pd.notna(vol_24h):
+        volatilidade = float(vol_24h) * 100
+    else:
+        vol_win = min(10, max(2, len(ohlc)//20))
+        volatilidade = (ohlc["close"].pct_change().rolling(vol_win).std().iloc[-1] * 100) if len(ohlc) > vol_win else 0.0
 
     col1, col2, col3, col4 = st.columns(4)
     col1.markdown(f"""
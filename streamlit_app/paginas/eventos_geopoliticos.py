@@ -1,33 +1,12 @@
 # streamlit_app/paginas/eventos_geopoliticos.py
-import os
 import math
 import pandas as pd
 import streamlit as st
-from sqlalchemy import create_engine, text
 from datetime import datetime, timezone
 from componentes.noticias import mostrar_noticias_geopoliticas
+from database import carregar_eventos as carregar_eventos_db
 
 
-# ---------- conexão ----------
-@st.cache_resource(show_spinner=False)
-def get_engine():
-    url = os.getenv("DATABASE_URL")
-    if not url:
-        try:
-            if "DATABASE_URL" in st.secrets:
-                url = st.secrets["DATABASE_URL"]
-            elif "db" in st.secrets:
-                db = st.secrets["db"]
-                host = db.get("host", "localhost")
-                port = db.get("port", 5432)
-                url = f"postgresql+psycopg2://{db['user']}:{db['password']}@{host}:{port}/{db['database']}"
-        except Exception:
-            pass
-    if not url:
-        st.error("Conexão com o banco não configurada (DATABASE_URL ou secrets).")
-        st.stop()
-    return create_engine(url, pool_pre_ping=True)
-
 # ---------- utils ----------
 def flag_emoji(country_code: str) -> str:
     """Transforma 'US' -> 🇺🇸 ; 'CN' -> 🇨🇳"""
@@ -75,32 +54,12 @@ def sent_badge(sent: str) -> str:
     return badge(sent, bg, fg)
 
 # ---------- dados ----------
-@st.cache_data(ttl=30, show_spinner=False)
-def carregar_eventos(_engine) -> pd.DataFrame:
-    try:
-        q = text("""
-            SELECT
-                id, timestamp, pais_codigo, pais_nome, instituicao,
-                titulo, descricao, categoria, severidade, sentimento,
-                impacto_pct, confianca_pct, moedas
-            FROM eventos_geopoliticos
-            ORDER BY timestamp DESC
-            LIMIT 500
-        """)
-        df = pd.read_sql_query(q, _engine)
-        if not df.empty:
-            df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True, errors="coerce")
-            df["moedas"] = df["moedas"].fillna("").apply(lambda s: [m.strip() for m in s.split(",") if m.strip()])
-            return df
-    except Exception:
-        pass
-
-    # >>> sem MOCK: retorna DF vazio
-    return pd.DataFrame(columns=[
-        "id","timestamp","pais_codigo","pais_nome","instituicao",
-        "titulo","descricao","categoria","severidade","sentimento",
-        "impacto_pct","confianca_pct","moedas"
-    ])
+def carregar_eventos() -> pd.DataFrame:
+    df = carregar_eventos_db(500)
+    # >>> sem MOCK: sem tabela/eventos, segue com o DF vazio
+    if not df.empty:
+        df["moedas"] = df["moedas"].fillna("").apply(lambda s: [m.strip() for m in s.split(",") if m.strip()])
+    return df
 
 
 # ---------- render ----------
@@ -163,8 +122,7 @@ def show():
         </div>
     """, unsafe_allow_html=True)
 
-    engine = get_engine()
-    df = carregar_eventos(engine)
+    df = carregar_eventos()
 
     # Linha de controles
     left, right = st.columns([3, 2])
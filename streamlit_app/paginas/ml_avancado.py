@@ -16,7 +16,8 @@ sys.path.append(str(Path(__file__).parent.parent))
 
 # Imports locais
 try:
-    from database import get_db_connection
+    from database import ultimas_velas, carregar_eventos
+    from prefetch import prefetch
     from ml.models import CryptoPredictor, ModelComparator
     from ml.features import FeatureEngine, prepare_train_test_split
     from ml.walk_forward import WalkForwardAnalyzer
@@ -27,37 +28,8 @@ except ImportError as e:
 
 
 def load_data(moeda_id: int, limit: int = 2000):
-    """Carrega dados de preços do banco"""
-    conn = get_db_connection()
-    query = f"""
-        SELECT timestamp, open, high, low, close, volume, moeda_id
-        FROM precos
-        WHERE moeda_id = {moeda_id}
-        ORDER BY timestamp DESC
-        LIMIT {limit}
-    """
-    df = pd.read_sql(query, conn)
-    conn.close()
-    return df.sort_values('timestamp').reset_index(drop=True)
-
-
-def load_events():
-    """Carrega eventos geopolíticos"""
-    try:
-        conn = get_db_connection()
-        query = """
-            SELECT timestamp, categoria, severidade, sentimento, titulo,
-                   pais_nome, impacto_estimado_pct
-            FROM eventos_geopoliticos
-            ORDER BY timestamp DESC
-            LIMIT 200
-        """
-        df = pd.read_sql(query, conn)
-        conn.close()
-        return df
-    except Exception as e:
-        st.warning(f"Eventos geopolíticos não disponíveis: {e}")
-        return pd.DataFrame()
+    """Carrega dados de preços do banco (consulta parametrizada e em cache)"""
+    return ultimas_velas(moeda_id, limit)
 
 
 def prepare_features(df, events_df=None):
@@ -144,8 +116,14 @@ def show():
 
             if st.button("Treinar e Comparar Modelos", type="primary"):
                 with st.spinner("Carregando dados..."):
-                    df = load_data(moeda_id)
-                    events_df = load_events() if use_geopolitical else None
+                    tarefas = {"precos": lambda: load_data(moeda_id)}
+                    if use_geopolitical:
+                        tarefas["eventos"] = lambda: carregar_eventos(200)
+                    dados = prefetch(tarefas)
+                    df = dados["precos"]
+                    events_df = dados["eventos"] if use_geopolitical else None
+                    if events_df is not None and events_df.empty:
+                        st.warning("Eventos geopolíticos não disponíveis.")
 
                     if len(df) < 100:
                         st.error("Dados insuficientes para treinamento")
@@ -400,8 +378,12 @@ def show():
 
         if st.button("Analisar Impacto", type="primary"):
             with st.spinner("Carregando dados..."):
-                df = load_data(moeda_id)
-                events_df = load_events()
+                dados = prefetch({
+                    "precos": lambda: load_data(moeda_id),
+                    "eventos": lambda: carregar_eventos(200),
+                })
+                df = dados["precos"]
+                events_df = dados["eventos"]
 
                 if events_df.empty:
                     st.warning("""
@@ -5,11 +5,14 @@ import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 import streamlit as st
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 from joblib import dump, load
 
+from database import get_engine, mapa_moedas, carregar_serie_preco, carregar_previsoes, limpar_cache_previsoes
+from migrations import garantir_esquema
+
 # =========================
 # Paleta e estilos
 # =========================
@@ -41,80 +44,14 @@ def _style_fig(fig, title_text: str, height: int = 380):
     )
     return fig
 
-# =========================
-# Conexão
-# =========================
-@st.cache_resource(show_spinner=False)
-def get_engine():
-    url = os.getenv("DATABASE_URL")
-    if not url:
-        try:
-            if "DATABASE_URL" in st.secrets:
-                url = st.secrets["DATABASE_URL"]
-            elif "db" in st.secrets:
-                db = st.secrets["db"]
-                host = db.get("host", "localhost")
-                port = db.get("port", 5432)
-                url = f"postgresql+psycopg2://{db['user']}:{db['password']}@{host}:{port}/{db['database']}"
-        except Exception:
-            pass
-    if not url:
-        st.error("Conexão com o banco não configurada (DATABASE_URL ou secrets).")
-        st.stop()
-    return create_engine(url, pool_pre_ping=True)
-
 # =========================
 # Utilitários de dados
 # =========================
-def _coluna_existe(_engine, tabela: str, coluna: str) -> bool:
-    q = text("""
-        SELECT 1
-        FROM information_schema.columns
-        WHERE table_name = :tabela AND column_name = :coluna
-        AND (table_schema = current_schema() OR table_schema = 'public')
-        LIMIT 1
-    """)
-    with _engine.connect() as conn:
-        return conn.execute(q, {"tabela": tabela, "coluna": coluna}).first() is not None
-
-@st.cache_data(ttl=60, show_spinner=False)
-def listar_moedas(_engine):
-    try:
-        df = pd.read_sql_query(text("""
-            SELECT id,
-                   CASE
-                     WHEN COALESCE(simbolo,'')<>'' AND COALESCE(nome,'')<>'' THEN UPPER(simbolo)||' ('||nome||')'
-                     WHEN COALESCE(simbolo,'')<>'' THEN UPPER(simbolo)
-                     WHEN COALESCE(nome,'')<>'' THEN nome
-                     ELSE id::text
-                   END AS label
-            FROM moedas
-            WHERE COALESCE(ativo, TRUE)=TRUE
-            ORDER BY UPPER(simbolo) NULLS LAST, nome NULLS LAST, id
-        """), _engine)
-        if not df.empty:
-            return {row["label"]: int(row["id"]) for _, row in df.iterrows()}
-    except Exception:
-        pass
-    df = pd.read_sql_query(text("SELECT DISTINCT moeda_id AS id FROM precos ORDER BY 1;"), _engine)
-    return {f"Moeda {int(i)}": int(i) for i in df["id"].tolist()}
-
-@st.cache_data(ttl=60, show_spinner=False)
-def carregar_serie(_engine, moeda_id: int) -> pd.Series:
-    tem_close = _coluna_existe(_engine, "precos", "close")
-    tem_preco = _coluna_existe(_engine, "precos", "preco")
-    if not tem_close and not tem_preco:
-        return pd.Series(dtype="float64")
-    col_preco = "close" if tem_close else "preco"
-    df = pd.read_sql_query(text(f"""
-        SELECT timestamp, {col_preco} AS close
-        FROM precos WHERE moeda_id=:m ORDER BY timestamp
-    """), _engine, params={"m": moeda_id})
+def carregar_serie(moeda_id: int) -> pd.Series:
+    df = carregar_serie_preco(moeda_id)
     if df.empty:
         return pd.Series(dtype="float64")
-    df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True, errors="coerce")
-    df = df.dropna(subset=["timestamp","close"]).set_index("timestamp").sort_index()
-    return df["close"].astype("float64")
+    return df.set_index("timestamp").sort_index()["close"].astype("float64")
 
 # =========================
 # Engenharia de atributos
@@ -165,25 +102,6 @@ def forecast_recursive_with_pi(model, history: pd.Series, steps: int) -> pd.Data
 # =========================
 # Persistência 'previsoes'
 # =========================
-def ensure_schema_previsoes(engine):
-    with engine.begin() as conn:
-        conn.execute(text("""
-        CREATE TABLE IF NOT EXISTS previsoes(
-          id SERIAL PRIMARY KEY,
-          moeda_id     INT NOT NULL,
-          trained_at   TIMESTAMPTZ NOT NULL DEFAULT NOW(),
-          horizonte_h  INT NOT NULL,
-          ts_previsto  TIMESTAMPTZ NOT NULL,
-          valor        DOUBLE PRECISION,
-          low          DOUBLE PRECISION,
-          high         DOUBLE PRECISION,
-          rmse         DOUBLE PRECISION,
-          mae          DOUBLE PRECISION,
-          r2           DOUBLE PRECISION
-        );
-        CREATE INDEX IF NOT EXISTS ix_prev_moeda_h on previsoes(moeda_id, horizonte_h, ts_previsto DESC);
-        """))
-
 def salvar_previsao(engine, moeda_id: int, horizonte_h: int, fc: pd.DataFrame, rmse: float, mae: float, r2: float):
     if fc.empty: return 0
     payload = []
@@ -202,19 +120,9 @@ def salvar_previsao(engine, moeda_id: int, horizonte_h: int, fc: pd.DataFrame, r
             INSERT INTO previsoes (moeda_id, horizonte_h, ts_previsto, valor, low, high, rmse, mae, r2)
             VALUES (:moeda_id, :horizonte_h, :ts_previsto, :valor, :low, :high, :rmse, :mae, :r2)
         """), payload)
+    limpar_cache_previsoes()
     return len(payload)
 
-@st.cache_data(ttl=60, show_spinner=False)
-def listar_previsoes_recentes(_engine, moeda_id: int, limit: int = 20):
-    q = text("""
-        SELECT ts_previsto, horizonte_h, valor, low, high, rmse, mae, r2
-        FROM previsoes
-        WHERE moeda_id=:m
-        ORDER BY ts_previsto DESC
-        LIMIT :n
-    """)
-    return pd.read_sql_query(q, _engine, params={"m": moeda_id, "n": limit})
-
 # =========================
 # UI principal
 # =========================
@@ -232,9 +140,9 @@ def show():
     """, unsafe_allow_html=True)
 
     engine = get_engine()
-    ensure_schema_previsoes(engine)
+    garantir_esquema(engine)
 
-    mapa = listar_moedas(engine)
+    mapa = mapa_moedas()
     if not mapa:
         st.info("Nenhuma moeda na base. Rode o ETL.")
         return
@@ -245,7 +153,7 @@ def show():
     with left:
         moeda_label = st.selectbox("Moeda", list(mapa.keys()))
         moeda_id = mapa[moeda_label]
-        serie = carregar_serie(engine, moeda_id)
+        serie = carregar_serie(moeda_id)
         if serie.empty:
             st.warning("Sem dados para essa moeda (tabela 'precos').")
             return
@@ -341,7 +249,7 @@ def show():
                 st.success(f"Salvo {inserted} timestamp(s) previsto(s) para {moeda_label} ({horizonte}).")
         with colb2:
             if st.button("Ver previsões recentes"):
-                df_prev = listar_previsoes_recentes(engine, moeda_id)
+                df_prev = carregar_previsoes(moeda_id)
                 if df_prev.empty:
                     st.info("Ainda não há previsões salvas para esta moeda.")
                 else:
@@ -0,0 +1,97 @@
+# streamlit_app/pgcopy.py
+"""
+Leitura em massa via `COPY (SELECT ...) TO STDOUT WITH (FORMAT binary)`.
+
+O formato binário do Postgres é decodificado direto em arrays NumPy com um
+dtype estruturado big-endian, sem passar tupla a tupla pelo cursor nem
+converter timestamps texto -> datetime. Só tipos de tamanho fixo são
+suportados e nenhuma coluna pode vir NULL (a linha precisa ter tamanho
+constante): use COALESCE(col, 'NaN') nos floats.
+
+Os SELECTs usam parâmetros no estilo do psycopg2 (`%(nome)s`).
+"""
+import io
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+
+SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+# microssegundos entre 1970-01-01 e 2000-01-01 (época do Postgres)
+PG_EPOCH_US = 946_684_800_000_000
+
+# tipo -> código NumPy (sem ordem de bytes)
+TIPOS = {"timestamptz": "i8", "timestamp": "i8", "float8": "f8", "int8": "i8", "int4": "i4"}
+
+
+def _dtype(colunas: list[tuple[str, str]]) -> np.dtype:
+    campos = [("_n", ">i2")]
+    for i, (nome, tipo) in enumerate(colunas):
+        campos += [(f"_l{i}", ">i4"), (nome, ">" + TIPOS[tipo])]
+    return np.dtype(campos)
+
+
+def decode(buf, colunas: list[tuple[str, str]]) -> dict[str, np.ndarray]:
+    """
+    Decodifica um COPY binário completo. Timestamps saem como epoch em ns
+    (int64, UTC); os demais no tipo nativo correspondente.
+    """
+    mv = memoryview(buf)
+    if bytes(mv[:11]) != SIGNATURE:
+        raise ValueError("COPY binário sem assinatura PGCOPY")
+    ext = int.from_bytes(mv[15:19], "big")
+    body = mv[19 + ext:len(mv) - 2]  # remove cabeçalho e o trailer (-1 em int16)
+    dt = _dtype(colunas)
+    if len(body) % dt.itemsize:
+        raise ValueError("COPY binário com linhas de tamanho variável (coluna NULL?)")
+    rows = np.frombuffer(body, dtype=dt)
+
+    out = {}
+    for i, (nome, tipo) in enumerate(colunas):
+        if len(rows) and (rows[f"_l{i}"] < 0).any():
+            raise ValueError(f"coluna {nome} veio NULL no COPY binário")
+        col = rows[nome]
+        if tipo in ("timestamptz", "timestamp"):
+            out[nome] = (col.astype(np.int64) + PG_EPOCH_US) * 1000
+        else:
+            out[nome] = col.astype(col.dtype.newbyteorder("="))
+    return out
+
+
+def copy_select(engine, select_sql: str, params: dict, colunas: list[tuple[str, str]]) -> dict[str, np.ndarray]:
+    """Executa o SELECT via COPY binário numa conexão do pool do engine."""
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        sql = cur.mogrify(select_sql, params).decode()
+        buf = io.BytesIO()
+        cur.copy_expert(f"COPY ({sql}) TO STDOUT WITH (FORMAT binary)", buf)
+        raw.rollback()
+    finally:
+        raw.close()
+    return decode(buf.getbuffer(), colunas)
+
+
+def to_frame(arrays: dict[str, np.ndarray], colunas: list[tuple[str, str]]) -> pd.DataFrame:
+    """DataFrame com timestamps tz-aware (UTC) a partir dos arrays decodificados."""
+    data = {}
+    for nome, tipo in colunas:
+        v = arrays[nome]
+        data[nome] = pd.to_datetime(v, utc=True) if tipo in ("timestamptz", "timestamp") else v
+    return pd.DataFrame(data)
+
+
+def copy_chunks(engine, select_sql: str, params: dict, colunas: list[tuple[str, str]],
+                inicio: pd.Timestamp, fim: pd.Timestamp, passo: pd.Timedelta) -> Iterator[dict[str, np.ndarray]]:
+    """
+    Variante em streaming para intervalos grandes: um COPY por janela
+    [ini, fim) de tamanho `passo`. O SELECT deve filtrar por %(ini)s e %(fim)s.
+    A memória fica limitada a uma janela por vez.
+    """
+    ini = pd.Timestamp(inicio)
+    fim = pd.Timestamp(fim)
+    passo = pd.Timedelta(passo)
+    while ini < fim:
+        prox = min(ini + passo, fim)
+        yield copy_select(engine, select_sql, {**params, "ini": ini.to_pydatetime(), "fim": prox.to_pydatetime()}, colunas)
+        ini = prox
@@ -0,0 +1,104 @@
+# streamlit_app/prefetch.py
+"""
+Carga concorrente das fontes independentes de uma página.
+
+    dados = prefetch({"precos": lambda: ..., "eventos": carregar_eventos})
+    df = dados["precos"]          # relança a exceção da fonte, se houve
+    dados.tempos                  # {"precos": 0.12, "eventos": 0.40} em segundos
+
+Todas as fontes começam juntas num pool limitado (PREFETCH_WORKERS, padrão 8)
+compartilhado pelo processo e são aguardadas antes de renderizar; a latência
+da página passa a ser a da fonte mais lenta. As threads recebem o contexto
+da sessão do Streamlit durante a tarefa (e o perdem ao terminar), então
+funções com st.cache_data funcionam nelas.
+Só carregamento de dados deve ir para o prefetch: chamadas de renderização
+(st.markdown, st.columns...) continuam na thread da página, e uma tarefa
+não deve chamar prefetch de novo (o pool é limitado).
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable
+
+try:
+    from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+except ImportError:  # fora do runtime do Streamlit (scripts/treino)
+    add_script_run_ctx = get_script_run_ctx = None
+
+# Atributo privado onde o Streamlit guarda o contexto na thread; se mudar de
+# lugar numa versão nova, o contexto só deixa de ser retirado ao fim da tarefa
+# (a próxima tarefa da thread sobrescreve o dela)
+try:
+    from streamlit.runtime.scriptrunner_utils.script_run_context import SCRIPT_RUN_CONTEXT_ATTR_NAME
+except ImportError:
+    SCRIPT_RUN_CONTEXT_ATTR_NAME = None
+
+log = logging.getLogger(__name__)
+
+MAX_WORKERS = int(os.getenv("PREFETCH_WORKERS", "8"))
+
+_pool: ThreadPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="prefetch")
+        return _pool
+
+
+class Prefetch:
+    """Resultados, erros e tempos (s) por fonte, mais o tempo total de parede."""
+
+    def __init__(self):
+        self.resultados: dict[str, Any] = {}
+        self.erros: dict[str, BaseException] = {}
+        self.tempos: dict[str, float] = {}
+        self.total: float = 0.0
+
+    def __getitem__(self, nome: str) -> Any:
+        if nome in self.erros:
+            raise self.erros[nome]
+        return self.resultados[nome]
+
+    def get(self, nome: str, padrao: Any = None) -> Any:
+        """Resultado da fonte, ou `padrao` se ela falhou."""
+        return self.resultados.get(nome, padrao)
+
+
+def prefetch(tarefas: dict[str, Callable[[], Any]]) -> Prefetch:
+    """Roda as tarefas (sem argumentos) em paralelo e espera todas terminarem."""
+    out = Prefetch()
+    ctx = get_script_run_ctx() if get_script_run_ctx else None
+
+    def _rodar(nome: str, fn: Callable[[], Any]):
+        thread = threading.current_thread()
+        if ctx is not None:
+            add_script_run_ctx(thread, ctx)
+        t0 = time.perf_counter()
+        try:
+            out.resultados[nome] = fn()
+        except Exception as e:
+            out.erros[nome] = e
+        finally:
+            out.tempos[nome] = time.perf_counter() - t0
+            # A thread volta ao pool: tira o contexto desta sessão (não há API pública para isso)
+            if ctx is not None and SCRIPT_RUN_CONTEXT_ATTR_NAME:
+                thread.__dict__.pop(SCRIPT_RUN_CONTEXT_ATTR_NAME, None)
+
+    t0 = time.perf_counter()
+    pool = _get_pool()
+    wait([pool.submit(_rodar, nome, fn) for nome, fn in tarefas.items()])
+    out.total = time.perf_counter() - t0
+
+    log.debug(
+        "prefetch %.3fs | %s", out.total,
+        ", ".join(f"{n}={t:.3f}s" for n, t in sorted(out.tempos.items(), key=lambda kv: -kv[1])),
+    )
+    for nome, erro in out.erros.items():
+        log.warning("prefetch: fonte %s falhou: %s", nome, erro)
+    return out
@@ -0,0 +1,151 @@
+# streamlit_app/price_cache.py
+"""
+Cache de séries de preço por moeda, compartilhado pelo processo do Streamlit.
+
+Cada moeda fica em dois arrays NumPy (epoch em ns como int64 e close em
+float64). Passado o intervalo de refresh, só as linhas a partir da última vela
+guardada (a marca d'água) são buscadas no banco e emendadas no fim; a própria
+última vela volta na busca porque o ETL ainda pode corrigi-la. Um orçamento de
+memória limita o total, removendo as moedas usadas há mais tempo (LRU).
+
+Numa moeda ainda fora do cache, só a janela pedida é buscada (o trecho antes
+dela vem depois, se alguém pedir uma janela maior). Cada moeda tem seu lock:
+a busca no banco de uma moeda não bloqueia leituras das outras. Quando a
+versão do histórico muda (a retenção consolidou horas antigas em velas
+diárias), a moeda é recarregada do zero.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+import numpy as np
+
+# fetch(moeda_id, desde_ns | None, janela_ns | None) -> (ts_ns int64, close float64), em ordem
+# crescente; sem desde_ns, janela_ns limita a busca às velas até janela_ns antes da última
+FetchFn = Callable[[int, int | None, int | None], tuple[np.ndarray, np.ndarray]]
+# versao(moeda_id) -> valor que muda quando velas antigas da moeda são reescritas
+VersaoFn = Callable[[int], Hashable]
+
+
+class _Serie:
+    """Arrays com folga no fim (append amortizado) + instante da última checagem."""
+
+    __slots__ = ("ts", "close", "n", "checked_at", "desde", "versao", "lock")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.ts = np.empty(0, dtype=np.int64)
+        self.close = np.empty(0, dtype=np.float64)
+        self.n = 0
+        self.checked_at = 0.0
+        self.desde = None  # início do trecho carregado; None = histórico inteiro
+        self.versao = None
+
+    @property
+    def nbytes(self) -> int:
+        return self.ts.nbytes + self.close.nbytes
+
+    def merge(self, ts: np.ndarray, close: np.ndarray):
+        """Sobrescreve a cauda a partir de ts[0] e anexa o resto."""
+        if len(ts) == 0:
+            return
+        keep = int(np.searchsorted(self.ts[:self.n], ts[0], side="left"))
+        need = keep + len(ts)
+        if need > len(self.ts):
+            cap = max(need, int(len(self.ts) * 1.5), 1024)
+            new_ts = np.empty(cap, dtype=np.int64)
+            new_close = np.empty(cap, dtype=np.float64)
+            new_ts[:keep] = self.ts[:keep]
+            new_close[:keep] = self.close[:keep]
+            self.ts, self.close = new_ts, new_close
+        self.ts[keep:need] = ts
+        self.close[keep:need] = close
+        self.n = need
+
+
+class PriceCache:
+    """Séries (epoch ns, close) por moeda com refresh incremental e LRU por memória."""
+
+    def __init__(self, fetch: FetchFn, max_bytes: int = 64 * 1024 * 1024, refresh_seconds: float = 60,
+                 versao: VersaoFn | None = None):
+        self.fetch = fetch
+        self.versao = versao
+        self.max_bytes = max_bytes
+        self.refresh_seconds = refresh_seconds
+        self._series: OrderedDict[int, _Serie] = OrderedDict()
+        self._lock = threading.Lock()  # só o dicionário e o LRU; as buscas usam o lock da moeda
+
+    def get(self, moeda_id: int, janela_ns: int | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Cópias de (ts_ns, close) da moeda; com `janela_ns`, só as velas até
+        janela_ns antes da última. Atualiza a série antes se o último refresh
+        passou do intervalo.
+        """
+        with self._lock:
+            serie = self._series.get(moeda_id)
+            if serie is None:
+                serie = self._series[moeda_id] = _Serie()
+            self._series.move_to_end(moeda_id)
+
+        with serie.lock:
+            if time.monotonic() - serie.checked_at >= self.refresh_seconds:
+                self._refresh(moeda_id, serie, janela_ns)
+
+            # Janela maior que o trecho carregado: recarrega a partir do início pedido
+            n = serie.n
+            if serie.desde is not None and (janela_ns is None or (n and serie.ts[n - 1] - janela_ns < serie.desde)):
+                self._carregar(moeda_id, serie, janela_ns)
+                n = serie.n
+
+            ini = 0
+            if janela_ns is not None and n:
+                ini = int(np.searchsorted(serie.ts[:n], serie.ts[n - 1] - janela_ns, side="left"))
+            out = serie.ts[ini:n].copy(), serie.close[ini:n].copy()
+
+        with self._lock:
+            self._evict()
+        return out
+
+    def _refresh(self, moeda_id: int, serie: _Serie, janela_ns: int | None):
+        versao = self.versao(moeda_id) if self.versao else None
+        if serie.n and versao != serie.versao:
+            serie.reset()
+        if serie.n:
+            ts, close = self.fetch(moeda_id, int(serie.ts[serie.n - 1]), None)
+            serie.merge(ts, close)
+        else:
+            self._carregar(moeda_id, serie, janela_ns)
+        serie.versao = versao
+        serie.checked_at = time.monotonic()
+
+    def _carregar(self, moeda_id: int, serie: _Serie, janela_ns: int | None):
+        """Carga do zero: a janela pedida (até a última vela) ou o histórico inteiro."""
+        ts, close = self.fetch(moeda_id, None, janela_ns)
+        versao, checked_at = serie.versao, serie.checked_at
+        serie.reset()
+        serie.versao, serie.checked_at = versao, checked_at
+        serie.merge(ts, close)
+        serie.desde = int(ts[-1]) - janela_ns if janela_ns is not None and len(ts) else None
+
+    def invalidate(self, moeda_id: int | None = None):
+        """Descarta uma moeda (ou todas); a próxima leitura recarrega do zero."""
+        with self._lock:
+            if moeda_id is None:
+                self._series.clear()
+            else:
+                self._series.pop(moeda_id, None)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(s.nbytes for s in self._series.values())
+
+    def _evict(self):
+        # Mantém ao menos a moeda recém-usada (última do OrderedDict)
+        total = self.nbytes
+        while total > self.max_bytes and len(self._series) > 1:
+            _, serie = self._series.popitem(last=False)
+            total -= serie.nbytes
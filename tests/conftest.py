@@ -0,0 +1,13 @@
+# tests/conftest.py
+"""
+Os módulos do app e dos scripts usam imports planos (`import pgcopy`,
+`from ml.features import ...`), como quando rodam de dentro das pastas.
+"""
+import os
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for pasta in ("streamlit_app", "scripts"):
+    caminho = os.path.join(RAIZ, pasta)
+    if caminho not in sys.path:
+        sys.path.insert(0, caminho)
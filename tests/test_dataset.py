@@ -0,0 +1,59 @@
+# tests/test_dataset.py
+import numpy as np
+import pandas as pd
+import pytest
+
+import export_parquet as ex
+from ml import dataset
+
+
+def _velas(ini: str, n: int, freq: str = "h") -> pd.DataFrame:
+    ts = pd.date_range(ini, periods=n, freq=freq, tz="UTC")
+    close = np.arange(n, dtype="float64") + 100
+    return pd.DataFrame({"timestamp": ts, "open": close, "high": close + 1, "low": close - 1,
+                         "close": close, "volume": np.ones(n)})
+
+
+def _gravar(root, table: str, moeda_id: int, df: pd.DataFrame):
+    """Particiona por mês como export_precos."""
+    for mes, parte in df.groupby(df["timestamp"].dt.strftime("%Y-%m")):
+        ex._write_partition(parte.reset_index(drop=True), ex._partition_dir(str(root), table, mes, moeda_id))
+
+
+@pytest.fixture
+def raiz(tmp_path):
+    _gravar(tmp_path, "precos", 1, _velas("2024-01-30", 96))
+    _gravar(tmp_path, "precos", 2, _velas("2024-01-30", 24))
+    _gravar(tmp_path, "precos_historico", 1, _velas("2023-11-01", 60, freq="D").assign(velas=24))
+    return tmp_path
+
+
+def test_exported_months(raiz):
+    assert ex.exported_months(str(raiz), "precos", 1) == ["2024-01", "2024-02"]
+    assert ex.exported_months(str(raiz), "precos_historico", 1) == ["2023-11", "2023-12"]
+    assert ex.exported_months(str(raiz), "precos", 3) == []
+
+
+def test_load_prices_pyarrow(raiz):
+    df = dataset.load_prices(1, root=str(raiz), engine="pyarrow")
+    assert len(df) == 96 and (df["moeda_id"] == 1).all()
+    assert df["timestamp"].is_monotonic_increasing and str(df["timestamp"].dt.tz) == "UTC"
+    assert list(df.columns) == dataset.PRICE_COLUMNS + ["moeda_id"]
+
+
+def test_load_prices_intervalo(raiz):
+    ini, fim = pd.Timestamp("2024-01-31 22:00", tz="UTC"), pd.Timestamp("2024-02-01 03:00", tz="UTC")
+    df = dataset.load_prices(1, ini, fim, root=str(raiz), engine="pyarrow")
+    assert df["timestamp"].min() == ini and df["timestamp"].max() == fim - pd.Timedelta(hours=1)
+    assert len(df) == 5
+
+
+def test_load_prices_historico_separado(raiz):
+    df = dataset.load_prices(1, root=str(raiz), engine="pyarrow", table="precos_historico")
+    assert len(df) == 60
+    assert (df["timestamp"].diff().dropna() == pd.Timedelta(days=1)).all()
+
+
+def test_load_prices_sem_dataset(tmp_path):
+    df = dataset.load_prices(1, root=str(tmp_path), engine="pyarrow")
+    assert df.empty and list(df.columns) == dataset.PRICE_COLUMNS + ["moeda_id"]
@@ -0,0 +1,87 @@
+# tests/test_etl_cache.py
+import os
+import time
+
+import pandas as pd
+import pytest
+
+import etl_cache
+from etl_cache import RawCache
+
+
+def _raw(n: int = 50) -> pd.DataFrame:
+    idx = pd.date_range("2024-01-01", periods=n, freq="h", tz="UTC")
+    return pd.DataFrame({"Close": range(n), "Volume": range(n)}, index=idx, dtype="float64")
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    """time.time controlado pelo teste (created_at e expiração)."""
+    agora = [1_700_000_000.0]
+    monkeypatch.setattr(etl_cache.time, "time", lambda: agora[0])
+    return agora
+
+
+def _tocar(cache: RawCache, key: str, instante: float):
+    """Último acesso da entrada (mtime do Parquet, base do LRU)."""
+    data_path, _ = cache._paths(key)
+    os.utime(data_path, (instante, instante))
+
+
+def test_get_respeita_ttl(tmp_path, relogio):
+    cache = RawCache(str(tmp_path), ttl_seconds=60)
+    cache.put("BTC-USD", "1h", "a", "b", _raw())
+
+    pd.testing.assert_frame_equal(cache.get("BTC-USD", "1h", "a", "b"), _raw(), check_freq=False)
+    assert cache.get("BTC-USD", "1h", "a", "c") is None  # outra janela, outra chave
+
+    relogio[0] += 61
+    assert cache.get("BTC-USD", "1h", "a", "b") is None
+    # O replay ignora o TTL
+    assert cache.latest("BTC-USD", "1h") is not None
+
+
+def test_latest_pega_a_mais_recente(tmp_path, relogio):
+    cache = RawCache(str(tmp_path))
+    cache.put("ETH-USD", "1h", "a", "b", _raw(10))
+    relogio[0] += 1
+    cache.put("ETH-USD", "1h", "b", "c", _raw(20))
+    assert len(cache.latest("ETH-USD", "1h")) == 20
+    assert cache.latest("ETH-USD", "1d") is None
+
+
+def test_evict_lru(tmp_path, relogio):
+    cache = RawCache(str(tmp_path), ttl_seconds=3600, max_bytes=10**9)
+    keys = [cache.put("BTC-USD", "1h", i, i + 1, _raw()) for i in range(3)]
+    for i, key in enumerate(keys):
+        _tocar(cache, key, time.time() - 100 + i)
+    _tocar(cache, keys[0], time.time())  # a primeira passa a ser a mais recente
+
+    por_entrada = max(e["bytes"] for e in cache.entries())
+    cache.max_bytes = 2 * por_entrada
+    assert cache.evict() == 1
+
+    restantes = {e["key"] for e in cache.entries()}
+    assert restantes == {keys[0], keys[2]}
+
+
+def test_evict_expiradas_primeiro(tmp_path, relogio):
+    cache = RawCache(str(tmp_path), ttl_seconds=60, max_bytes=10**9)
+    velha = cache.put("BTC-USD", "1h", 0, 1, _raw())
+    relogio[0] += 120  # 'velha' expira
+    nova1 = cache.put("BTC-USD", "1h", 1, 2, _raw())
+    nova2 = cache.put("BTC-USD", "1h", 2, 3, _raw())
+    # A expirada foi a última acessada, mas sai antes das válidas
+    _tocar(cache, nova1, time.time() - 50)
+    _tocar(cache, nova2, time.time() - 40)
+    _tocar(cache, velha, time.time())
+
+    cache.max_bytes = 2 * max(e["bytes"] for e in cache.entries())
+    assert cache.evict() == 1
+    assert {e["key"] for e in cache.entries()} == {nova1, nova2}
+
+
+def test_put_aplica_limite(tmp_path, relogio):
+    cache = RawCache(str(tmp_path), max_bytes=1)
+    cache.put("BTC-USD", "1h", 0, 1, _raw())
+    assert cache.entries() == []
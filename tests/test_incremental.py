@@ -0,0 +1,76 @@
+# tests/test_incremental.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from ml.features import FeatureEngine
+from ml.incremental import IncrementalFeatures
+
+
+def _velas(n: int = 500, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    ts = pd.date_range("2024-01-01", periods=n, freq="h", tz="UTC")
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    return pd.DataFrame({
+        "timestamp": ts,
+        "open": close * (1 + rng.normal(0, 0.002, n)),
+        "high": close * (1 + rng.uniform(0, 0.01, n)),
+        "low": close * (1 - rng.uniform(0, 0.01, n)),
+        "close": close,
+        "volume": rng.uniform(1, 10, n),
+        "moeda_id": 1,
+    })
+
+
+def _eventos(velas: pd.DataFrame, n: int = 80, seed: int = 1) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    ini = velas["timestamp"].iloc[0] - pd.Timedelta(days=40)
+    fim = velas["timestamp"].iloc[-1]
+    ts = pd.to_datetime(rng.integers(ini.value, fim.value, n), utc=True)
+    return pd.DataFrame({
+        "timestamp": ts,
+        "sentimento": rng.choice(["Positivo", "Neutro", "Negativo", None], n),
+        "severidade": rng.choice(["Alto", "Médio", "Baixo"], n),
+        "categoria": rng.choice(["Econômico", "Político", "Inovação", "Tecnológico"], n),
+    })
+
+
+def _comparar(velas: pd.DataFrame, eventos, semente: int):
+    batch = FeatureEngine().create_all_features(velas, eventos.copy() if eventos is not None else None)
+    state = IncrementalFeatures.from_history(velas.iloc[:semente], eventos)
+    inc = pd.DataFrame([state.update(v) for v in velas.iloc[semente:].to_dict("records")])
+
+    inc = inc.set_index("timestamp")
+    batch = batch.set_index("timestamp")
+    comuns = batch.index.intersection(inc.index)
+    assert len(comuns) == len(velas) - semente  # a semente cobre o aquecimento do batch
+    inc, batch = inc.loc[comuns], batch.loc[comuns]
+
+    assert list(inc.columns) == list(batch.columns)
+    np.testing.assert_allclose(inc.to_numpy(dtype="float64"), batch.to_numpy(dtype="float64"),
+                               rtol=1e-9, atol=1e-9)
+
+
+def test_igual_ao_batch():
+    _comparar(_velas(), None, semente=250)
+
+
+def test_igual_ao_batch_com_eventos():
+    velas = _velas()
+    _comparar(velas, _eventos(velas), semente=250)
+
+
+def test_eventos_sem_timestamp_e_antes_das_velas():
+    velas = _velas(300)
+    eventos = _eventos(velas, n=30)
+    eventos.loc[3, "timestamp"] = pd.NaT
+    _comparar(velas, eventos, semente=220)
+
+
+def test_fuso_incompativel():
+    velas = _velas(240)
+    eventos = _eventos(velas)
+    eventos["timestamp"] = eventos["timestamp"].dt.tz_localize(None)
+    state = IncrementalFeatures.from_history(velas.iloc[:230], eventos)
+    with pytest.raises(TypeError):
+        state.update(velas.iloc[230].to_dict())
@@ -0,0 +1,73 @@
+# tests/test_pgcopy.py
+import struct
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import pgcopy
+
+COLUNAS = [("timestamp", "timestamptz"), ("close", "float8"), ("n", "int4")]
+
+
+def _copy_binario(linhas, colunas=COLUNAS) -> bytes:
+    """COPY binário como o Postgres envia: cabeçalho, tuplas e trailer (-1)."""
+    out = bytearray(pgcopy.SIGNATURE + struct.pack(">ii", 0, 0))
+    fmt = {"timestamptz": ">q", "timestamp": ">q", "float8": ">d", "int8": ">q", "int4": ">i"}
+    for linha in linhas:
+        out += struct.pack(">h", len(colunas))
+        for valor, (_, tipo) in zip(linha, colunas):
+            if valor is None:
+                out += struct.pack(">i", -1)
+                continue
+            campo = struct.pack(fmt[tipo], valor)
+            out += struct.pack(">i", len(campo)) + campo
+    out += struct.pack(">h", -1)
+    return bytes(out)
+
+
+def _us_pg(ts: str) -> int:
+    """Microssegundos desde 2000-01-01 (época do Postgres)."""
+    return pd.Timestamp(ts).value // 1000 - pgcopy.PG_EPOCH_US
+
+
+def test_decode_tipos_e_timestamps():
+    buf = _copy_binario([
+        (_us_pg("2024-01-01 00:00:00+00:00"), 42000.5, 1),
+        (_us_pg("2024-01-01 01:00:00+00:00"), float("nan"), -7),
+    ])
+    out = pgcopy.decode(buf, COLUNAS)
+
+    assert out["timestamp"].dtype == np.int64
+    assert out["timestamp"].tolist() == [
+        pd.Timestamp("2024-01-01 00:00:00+00:00").value,
+        pd.Timestamp("2024-01-01 01:00:00+00:00").value,
+    ]
+    assert out["close"].dtype == np.float64 and out["close"].dtype.isnative
+    assert out["close"][0] == 42000.5 and np.isnan(out["close"][1])
+    assert out["n"].tolist() == [1, -7]
+
+
+def test_decode_vazio():
+    out = pgcopy.decode(_copy_binario([]), COLUNAS)
+    assert all(len(v) == 0 for v in out.values())
+
+
+def test_to_frame_timestamps_utc():
+    buf = _copy_binario([(_us_pg("2024-03-10 12:00:00+00:00"), 1.0, 0)])
+    df = pgcopy.to_frame(pgcopy.decode(buf, COLUNAS), COLUNAS)
+    assert list(df.columns) == ["timestamp", "close", "n"]
+    assert df["timestamp"].iloc[0] == pd.Timestamp("2024-03-10 12:00:00", tz="UTC")
+
+
+def test_decode_recusa_null():
+    # NULL muda o tamanho da tupla; com uma só linha o resto não fecha no dtype
+    buf = _copy_binario([(_us_pg("2024-01-01"), None, 1)])
+    with pytest.raises(ValueError):
+        pgcopy.decode(buf, COLUNAS)
+
+
+def test_decode_recusa_sem_assinatura():
+    buf = _copy_binario([(_us_pg("2024-01-01"), 1.0, 1)])
+    with pytest.raises(ValueError, match="PGCOPY"):
+        pgcopy.decode(b"XXXXXXXXXXX" + buf[11:], COLUNAS)
@@ -0,0 +1,140 @@
+# tests/test_price_cache.py
+import numpy as np
+import pytest
+
+from price_cache import PriceCache, _Serie
+
+H = 3_600_000_000_000  # 1h em ns
+
+
+class FakeBanco:
+    """fetch do PriceCache sobre uma série em memória, registrando as chamadas."""
+
+    def __init__(self, n: int = 100, moedas=(1,)):
+        self.series = {m: (np.arange(n, dtype=np.int64) * H, np.arange(n, dtype=np.float64) + 1000 * m)
+                       for m in moedas}
+        self.chamadas = []
+        self.versoes = {m: 0 for m in moedas}
+
+    def fetch(self, moeda_id, desde_ns, janela_ns):
+        self.chamadas.append((moeda_id, desde_ns, janela_ns))
+        ts, close = self.series[moeda_id]
+        if desde_ns is not None:
+            m = ts >= desde_ns
+        elif janela_ns is not None:
+            m = ts >= ts[-1] - janela_ns
+        else:
+            m = np.ones(len(ts), dtype=bool)
+        return ts[m].copy(), close[m].copy()
+
+    def anexar(self, moeda_id, close_ultima: float, novas: int):
+        """Corrige a última vela e acrescenta `novas` velas."""
+        ts, close = self.series[moeda_id]
+        close = close.copy()
+        close[-1] = close_ultima
+        extra_ts = ts[-1] + H * np.arange(1, novas + 1, dtype=np.int64)
+        extra_close = close[-1] + np.arange(1, novas + 1, dtype=np.float64)
+        self.series[moeda_id] = np.concatenate([ts, extra_ts]), np.concatenate([close, extra_close])
+
+
+def test_merge_sobrescreve_cauda():
+    s = _Serie()
+    s.merge(np.array([0, 1, 2], dtype=np.int64), np.array([10.0, 11.0, 12.0]))
+    s.merge(np.array([2, 3], dtype=np.int64), np.array([99.0, 13.0]))
+    assert s.ts[:s.n].tolist() == [0, 1, 2, 3]
+    assert s.close[:s.n].tolist() == [10.0, 11.0, 99.0, 13.0]
+    s.merge(np.empty(0, dtype=np.int64), np.empty(0))
+    assert s.n == 4
+
+
+def test_refresh_incremental():
+    banco = FakeBanco()
+    cache = PriceCache(banco.fetch, refresh_seconds=0)
+    ts, close = cache.get(1)
+    assert len(ts) == 100 and banco.chamadas == [(1, None, None)]
+
+    banco.anexar(1, close_ultima=-1.0, novas=3)
+    ts, close = cache.get(1)
+    # Só busca a partir da última vela guardada, que volta corrigida
+    assert banco.chamadas[-1] == (1, 99 * H, None)
+    np.testing.assert_array_equal(ts, banco.series[1][0])
+    np.testing.assert_array_equal(close, banco.series[1][1])
+
+
+def test_sem_refresh_dentro_do_intervalo():
+    banco = FakeBanco()
+    cache = PriceCache(banco.fetch, refresh_seconds=3600)
+    cache.get(1)
+    banco.anexar(1, close_ultima=0.0, novas=5)
+    ts, _ = cache.get(1)
+    assert len(ts) == 100 and len(banco.chamadas) == 1
+
+
+def test_janela_e_janela_maior():
+    banco = FakeBanco()
+    cache = PriceCache(banco.fetch, refresh_seconds=3600)
+    ts, _ = cache.get(1, 10 * H)
+    assert ts.tolist() == list(np.arange(89, 100) * H)
+    assert banco.chamadas == [(1, None, 10 * H)]
+
+    # Cabe no trecho carregado: sem nova busca
+    ts, _ = cache.get(1, 5 * H)
+    assert len(ts) == 6 and len(banco.chamadas) == 1
+
+    # Maior que o trecho carregado: recarrega a partir do início pedido
+    ts, _ = cache.get(1, 50 * H)
+    assert len(ts) == 51 and banco.chamadas[-1] == (1, None, 50 * H)
+    ts, _ = cache.get(1)
+    assert len(ts) == 100 and banco.chamadas[-1] == (1, None, None)
+
+
+def test_versao_recarrega_do_zero():
+    banco = FakeBanco()
+    cache = PriceCache(banco.fetch, refresh_seconds=0, versao=lambda m: banco.versoes[m])
+    cache.get(1)
+    # Retenção apagou as horas antigas e mudou a versão do histórico
+    ts, close = banco.series[1]
+    banco.series[1] = ts[50:], close[50:]
+    banco.versoes[1] = 1
+
+    ts, _ = cache.get(1)
+    assert banco.chamadas[-1] == (1, None, None)
+    assert ts[0] == 50 * H and len(ts) == 50
+
+
+def test_lru_por_memoria():
+    banco = FakeBanco(n=100, moedas=(1, 2, 3))
+    por_moeda = 100 * 16
+    cache = PriceCache(banco.fetch, max_bytes=2 * 1024 * 16, refresh_seconds=3600)
+    for m in (1, 2, 3):
+        cache.get(m)
+    # Capacidade mínima de 1024 linhas por moeda: cabem duas
+    assert por_moeda <= cache.nbytes <= cache.max_bytes
+    assert list(cache._series) == [2, 3]
+
+    cache.get(2)  # 2 passa a ser a mais recente; 3 sai na próxima
+    cache.get(1)
+    assert list(cache._series) == [2, 1]
+
+
+def test_invalidate():
+    banco = FakeBanco(moedas=(1, 2))
+    cache = PriceCache(banco.fetch, refresh_seconds=3600)
+    cache.get(1)
+    cache.get(2)
+    cache.invalidate(1)
+    assert list(cache._series) == [2]
+    cache.get(1)
+    assert banco.chamadas[-1] == (1, None, None)
+    cache.invalidate()
+    assert cache.nbytes == 0
+
+
+@pytest.mark.parametrize("janela", [None, 20 * H])
+def test_devolve_copias(janela):
+    banco = FakeBanco()
+    cache = PriceCache(banco.fetch, refresh_seconds=3600)
+    ts, close = cache.get(1, janela)
+    close[:] = -1
+    _, close2 = cache.get(1, janela)
+    assert (close2 >= 0).all()